@@ -37,6 +37,10 @@ const statusConfig: Record<BatchStatus, { label: string; className: string }> =
     label: 'Reprocessing',
     className: 'bg-orange-100 text-orange-800 border-orange-200',
   },
+  deleting: {
+    label: 'Deleting',
+    className: 'bg-gray-100 text-gray-500 border-gray-200',
+  },
 };
 
 export function BatchStatusBadge({ status, className = '' }: BatchStatusBadgeProps) {
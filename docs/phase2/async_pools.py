@@ -0,0 +1,256 @@
+"""
+Shared async Redis and MySQL pools
+
+Process-wide pools for the batches API: one BlockingConnectionPool behind
+every async Redis client (progress publishing, SSE streams, upload
+sessions) and one aiomysql pool behind AsyncDatabase, so a slow query never
+stalls SSE streams or chunk uploads. The open/close functions are the
+router's startup and shutdown hooks; get_async_redis and get_async_db double
+as route dependencies.
+"""
+
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, List, Optional
+
+import aiomysql
+import redis.asyncio as aioredis
+
+from src.api.dependencies import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Process-wide async Redis pool shared by progress publishing and SSE streams.
+# BlockingConnectionPool waits (up to the timeout) for a free connection
+# instead of opening more than BATCH_REDIS_MAX_CONNECTIONS.
+BATCH_REDIS_MAX_CONNECTIONS = int(
+    os.getenv("BATCH_REDIS_MAX_CONNECTIONS", "50"))
+BATCH_REDIS_POOL_TIMEOUT = float(os.getenv("BATCH_REDIS_POOL_TIMEOUT", "5"))
+
+_async_redis_pool: Optional[aioredis.BlockingConnectionPool] = None
+
+
+def _get_async_redis_pool() -> aioredis.BlockingConnectionPool:
+    """Return the shared async Redis pool, creating it on first use"""
+    global _async_redis_pool
+
+    if _async_redis_pool is None:
+        settings = get_settings()
+        _async_redis_pool = aioredis.BlockingConnectionPool(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            password=settings.redis_password or None,
+            decode_responses=True,
+            max_connections=BATCH_REDIS_MAX_CONNECTIONS,
+            timeout=BATCH_REDIS_POOL_TIMEOUT
+        )
+        logger.info(
+            f"Async Redis pool created (max {BATCH_REDIS_MAX_CONNECTIONS} connections)")
+
+    return _async_redis_pool
+
+
+async def open_async_redis_pool() -> None:
+    """Startup hook: create the pool before the first request arrives"""
+    _get_async_redis_pool()
+
+
+async def close_async_redis_pool() -> None:
+    """Shutdown hook: disconnect every pooled connection"""
+    global _async_redis_pool
+
+    if _async_redis_pool is not None:
+        await _async_redis_pool.disconnect()
+        _async_redis_pool = None
+        logger.info("Async Redis pool closed")
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Dependency: async Redis client backed by the shared pool"""
+    return aioredis.Redis(connection_pool=_get_async_redis_pool())
+
+
+def _pool_connection_counts(pool: aioredis.BlockingConnectionPool) -> Optional[tuple]:
+    """Return (in_use, idle) for the pool, or None if redis-py's internals changed
+
+    redis-py exposes no public utilisation API, so this reads the pool's
+    private bookkeeping and degrades gracefully instead of failing /stats.
+    """
+    try:
+        in_use = len(pool._in_use_connections)
+        # Available slots may hold None placeholders until a connection is made
+        idle = sum(1 for conn in pool._available_connections if conn is not None)
+    except (AttributeError, TypeError):
+        return None
+    return in_use, idle
+
+
+def get_async_redis_pool_stats() -> dict:
+    """Report utilisation of the shared async Redis pool"""
+    pool = _async_redis_pool
+    if pool is None:
+        return {
+            "initialized": False,
+            "max_connections": BATCH_REDIS_MAX_CONNECTIONS,
+            "in_use": 0,
+            "idle": 0,
+            "utilization": 0.0
+        }
+
+    counts = _pool_connection_counts(pool)
+    if counts is None:
+        return {
+            "initialized": True,
+            "max_connections": pool.max_connections,
+            "in_use": None,
+            "idle": None,
+            "utilization": None
+        }
+    in_use, idle = counts
+
+    return {
+        "initialized": True,
+        "max_connections": pool.max_connections,
+        "in_use": in_use,
+        "idle": idle,
+        "utilization": round(in_use / pool.max_connections, 3)
+    }
+
+
+# Native async MySQL pool for the batches API's own queries, so a slow query
+# (e.g. a large omr_sheets scan) never stalls SSE streams or chunk uploads
+BATCH_DB_POOL_MIN = int(os.getenv("BATCH_DB_POOL_MIN", "1"))
+BATCH_DB_POOL_MAX = int(os.getenv("BATCH_DB_POOL_MAX", "20"))
+
+_async_db_pool: Optional[aiomysql.Pool] = None
+_async_db_pool_lock = asyncio.Lock()
+
+
+class AsyncDatabase:
+    """
+    Async counterpart of BaseDatabaseService on a shared aiomysql pool
+
+    execute_query keeps the same %s placeholders and dict rows, so queries
+    move over unchanged; each call borrows a pooled connection.
+    """
+
+    def __init__(self, pool: aiomysql.Pool):
+        self._pool = pool
+
+    async def execute_query(
+        self,
+        query: str,
+        params: Optional[tuple] = None,
+        fetch_one: bool = False,
+        fetch_all: bool = False
+    ):
+        """
+        Execute a query on a pooled connection
+
+        Returns:
+            One row (fetch_one), all rows (fetch_all), else affected row count
+        """
+        async with self._pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params)
+                if fetch_one:
+                    return await cursor.fetchone()
+                if fetch_all:
+                    return await cursor.fetchall()
+                return cursor.rowcount
+
+    async def keyset_pages(
+        self,
+        query: str,
+        params: Optional[tuple],
+        keys: List[tuple],
+        page_rows: int = 500
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Yield the rows of a query in pages, ordered by a unique key
+
+        Each page is its own LIMIT query continuing after the last key seen,
+        so a pooled connection is borrowed only while a page is fetched and
+        never held while the consumer (e.g. a slow HTTP client) catches up.
+
+        Args:
+            query: SELECT ending in its WHERE clause (no ORDER BY/LIMIT); the
+                selected columns must include every key field
+            keys: (SQL expression, row field) pairs whose combination is
+                unique, e.g. [("id", "id")]
+            page_rows: Rows per page
+        """
+        expressions = ", ".join(expression for expression, _ in keys)
+        after = None
+        while True:
+            page_query = query
+            page_params = list(params or ())
+            if after is not None:
+                page_query += (f" AND ({expressions}) > "
+                               f"({', '.join(['%s'] * len(keys))})")
+                page_params.extend(after)
+            page_query += f" ORDER BY {expressions} LIMIT %s"
+            page_params.append(page_rows)
+
+            rows = await self.execute_query(
+                page_query, tuple(page_params), fetch_all=True) or []
+            if rows:
+                yield rows
+            if len(rows) < page_rows:
+                break
+            after = [rows[-1][field] for _, field in keys]
+
+    def stats(self) -> dict:
+        """Report pool utilisation"""
+        return {
+            "size": self._pool.size,
+            "free": self._pool.freesize,
+            "max_connections": self._pool.maxsize
+        }
+
+
+async def _get_async_db_pool() -> aiomysql.Pool:
+    """Return the shared async MySQL pool, creating it on first use"""
+    global _async_db_pool
+
+    async with _async_db_pool_lock:
+        if _async_db_pool is None:
+            settings = get_settings()
+            _async_db_pool = await aiomysql.create_pool(
+                host=settings.mysql_host,
+                port=settings.mysql_port,
+                user=settings.mysql_user,
+                password=settings.mysql_password,
+                db=settings.mysql_database,
+                minsize=BATCH_DB_POOL_MIN,
+                maxsize=BATCH_DB_POOL_MAX,
+                autocommit=True,
+                charset="utf8mb4"
+            )
+            logger.info(
+                f"Async MySQL pool created (max {BATCH_DB_POOL_MAX} connections)")
+
+    return _async_db_pool
+
+
+async def open_async_db_pool() -> None:
+    """Startup hook: create the pool before the first request arrives"""
+    await _get_async_db_pool()
+
+
+async def close_async_db_pool() -> None:
+    """Shutdown hook: close every pooled connection"""
+    global _async_db_pool
+
+    if _async_db_pool is not None:
+        _async_db_pool.close()
+        await _async_db_pool.wait_closed()
+        _async_db_pool = None
+        logger.info("Async MySQL pool closed")
+
+
+async def get_async_db() -> AsyncDatabase:
+    """Dependency: async database access backed by the shared pool"""
+    return AsyncDatabase(await _get_async_db_pool())
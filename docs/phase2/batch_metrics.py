@@ -0,0 +1,139 @@
+"""
+Batch pipeline and API metrics
+
+Prometheus histograms and counters for batch stages and submission phases,
+sheet throughput, chunk-upload bandwidth and batches API latency. They are
+exported by GET /api/batches/metrics (admins only) and, when
+BATCH_METRICS_PORT is set, by an internal listener on BATCH_METRICS_ADDR
+for scrapers that hold no API token. Under a multi-process server set
+PROMETHEUS_MULTIPROC_DIR so every worker's samples are aggregated.
+
+prometheus_client is optional: without it every metric is a no-op and
+METRICS_AVAILABLE is False. Per-batch submission phase durations are also
+kept in Redis for GET /api/batches/{batch_id}/progress.
+"""
+
+import logging
+import os
+from typing import Dict, Tuple
+
+import redis.asyncio as aioredis
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess as prometheus_multiprocess
+except ImportError:  # metrics are no-ops without the optional prometheus_client
+    prometheus_client = None
+
+from src.api.services.sheet_dispatch import PHASE_TIMINGS_TTL_SECONDS, phase_timings_key
+
+logger = logging.getLogger(__name__)
+
+METRICS_AVAILABLE = prometheus_client is not None
+BATCH_METRICS_PORT = int(os.getenv("BATCH_METRICS_PORT", "0"))
+BATCH_METRICS_ADDR = os.getenv("BATCH_METRICS_ADDR", "127.0.0.1")
+_STAGE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+
+class _NoopMetric:
+    """Stands in for a metric when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+
+def _metric(kind: str, name: str, documentation: str, **kwargs):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, **kwargs)
+
+
+STAGE_DURATION = _metric(
+    "Histogram", "omr_batch_stage_duration_seconds",
+    "Time a batch spent in each processing stage",
+    labelnames=["stage"], buckets=_STAGE_BUCKETS)
+PHASE_DURATION = _metric(
+    "Histogram", "omr_batch_phase_duration_seconds",
+    "Duration of batch submission phases (sheet record creation, dispatch, ...)",
+    labelnames=["phase"], buckets=_STAGE_BUCKETS)
+SHEET_THROUGHPUT = _metric(
+    "Histogram", "omr_batch_sheets_per_second",
+    "Sheets per second over a completed batch",
+    buckets=(0.5, 1, 2, 5, 10, 20, 50, 100, 200))
+SHEETS_FINISHED = _metric(
+    "Counter", "omr_sheets_finished_total",
+    "Sheets reaching a final processing status, counted when their batch finishes",
+    labelnames=["status"])
+CHUNK_BYTES = _metric(
+    "Counter", "omr_chunk_upload_bytes_total",
+    "Bytes received through chunked uploads")
+CHUNK_WRITE_RATE = _metric(
+    "Histogram", "omr_chunk_write_bytes_per_second",
+    "Per-chunk staging write bandwidth",
+    buckets=(1e6, 5e6, 1e7, 5e7, 1e8, 2.5e8, 5e8, 1e9, 2e9))
+ROUTER_LATENCY = _metric(
+    "Histogram", "omr_batches_request_duration_seconds",
+    "Batches API latency until the response starts (SSE/streams: until headers)",
+    labelnames=["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+
+def metrics_registry():
+    """Registry to export: aggregated across workers under multiprocess mode"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = prometheus_client.CollectorRegistry()
+        prometheus_multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def generate_metrics() -> Tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, and its content type"""
+    return (prometheus_client.generate_latest(metrics_registry()),
+            prometheus_client.CONTENT_TYPE_LATEST)
+
+
+async def start_metrics_listener() -> None:
+    """Startup hook: serve /metrics on the internal port, if configured"""
+    if not BATCH_METRICS_PORT or prometheus_client is None:
+        return
+    try:
+        prometheus_client.start_http_server(
+            BATCH_METRICS_PORT, addr=BATCH_METRICS_ADDR, registry=metrics_registry())
+        logger.info(f"Metrics listening on {BATCH_METRICS_ADDR}:{BATCH_METRICS_PORT}")
+    except OSError:
+        # Another worker of this server already serves the port
+        pass
+
+
+# Per-batch submission phase durations, reported by GET /{batch_id}/progress.
+# Worker-side phases are recorded by sheet_dispatch.phase_timer.
+async def record_phase_timing(
+    async_redis: aioredis.Redis,
+    batch_uuid: str,
+    phase: str,
+    seconds: float
+) -> None:
+    """Record a phase duration; failures are logged, never raised"""
+    logger.info(f"Batch {batch_uuid}: {phase} took {seconds:.2f}s")
+    PHASE_DURATION.labels(phase).observe(seconds)
+    key = phase_timings_key(batch_uuid)
+    try:
+        async with async_redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, phase, round(seconds, 3))
+            pipe.expire(key, PHASE_TIMINGS_TTL_SECONDS)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record {phase} timing for {batch_uuid}: {e}")
+
+
+async def read_phase_timings(async_redis: aioredis.Redis, batch_uuid: str) -> Dict[str, float]:
+    """Recorded phase durations of a batch, in seconds"""
+    timings = await async_redis.hgetall(phase_timings_key(batch_uuid))
+    return {phase: float(seconds) for phase, seconds in timings.items()}
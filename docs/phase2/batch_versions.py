@@ -0,0 +1,52 @@
+"""
+Batch version stamps for conditional polling
+
+Every published progress event, sheet counter change, delete or reprocess
+bumps the batch's version (and the global one used by list_batches).
+Polling endpoints derive their ETag from it in Redis alone, so an unchanged
+poll gets 304 without a database query. Shared by the batches router, the
+progress publisher and the sheet workers.
+"""
+
+import time
+
+import redis.asyncio as aioredis
+
+BATCH_VERSION_TTL_SECONDS = 30 * 24 * 3600
+BATCHES_VERSION_KEY = "batches:version"
+
+
+def batch_version_key(batch_id: str) -> str:
+    return f"batch:{batch_id}:version"
+
+
+def bump_batch_version_sync(redis_client, batch_uuid: str) -> None:
+    """
+    Invalidate cached polling responses of a batch (sync callers)
+
+    Call after changing a batch outside the progress publisher, e.g. when
+    reprocessing starts.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.incr(batch_version_key(batch_uuid))
+    pipe.expire(batch_version_key(batch_uuid), BATCH_VERSION_TTL_SECONDS)
+    pipe.incr(BATCHES_VERSION_KEY)
+    pipe.execute()
+
+
+async def bump_batch_version(async_redis: aioredis.Redis, batch_uuid: str) -> None:
+    """Invalidate cached polling responses of a batch"""
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.incr(batch_version_key(batch_uuid))
+        pipe.expire(batch_version_key(batch_uuid), BATCH_VERSION_TTL_SECONDS)
+        pipe.incr(BATCHES_VERSION_KEY)
+        await pipe.execute()
+
+
+async def read_version(async_redis: aioredis.Redis, key: str) -> str:
+    """Current version at key; a missing key starts from a fresh stamp"""
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.set(key, time.time_ns(), nx=True, ex=BATCH_VERSION_TTL_SECONDS)
+        pipe.get(key)
+        _, version = await pipe.execute()
+    return version
@@ -6,43 +6,397 @@ Wraps existing proven jobs.py functionality with better API structure.
 """
 
 import asyncio
+import base64
+import hashlib
 import json
 import logging
 import os
-from typing import List, Optional
+import time
+import uuid
+import zlib
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
 
+import redis.asyncio as aioredis
 from fastapi import (
     APIRouter,
     BackgroundTasks,
     Depends,
     File,
     Form,
+    Header,
     HTTPException,
     Query,
     UploadFile,
 )
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
 from sse_starlette.sse import EventSourceResponse
 
 from src.api.dependencies import Settings, get_db, get_redis, get_settings
 from src.api.models.responses import (
-    BatchProgressEvent,
     ChunkUploadResponse,
     JobStatusResponse,
     JobSubmitResponse,
     ProcessingStage,
 )
-from src.api.services.chunked_upload import ChunkedUploadService, ChunkMetadata
-from src.api.services.progress_publisher import ProgressPublisher
-from src.domains.auth.dependencies import get_current_user
-from src.domains.users.models import User
+from src.api.services.async_pools import (
+    AsyncDatabase,
+    close_async_db_pool,
+    close_async_redis_pool,
+    get_async_db,
+    get_async_redis,
+    get_async_redis_pool_stats,
+    open_async_db_pool,
+    open_async_redis_pool,
+)
+from src.api.services.batch_metrics import (
+    CHUNK_BYTES,
+    CHUNK_WRITE_RATE,
+    METRICS_AVAILABLE,
+    ROUTER_LATENCY,
+    generate_metrics,
+    read_phase_timings,
+    record_phase_timing,
+    start_metrics_listener,
+)
+from src.api.services.chunked_upload import (
+    PositionalChunkUploadService,
+    StreamingImageIngest,
+    get_staging_usage,
+    open_extracted_images,
+    run_staging_janitor,
+    upload_composite_digest,
+)
+from src.api.services.batch_versions import (
+    BATCHES_VERSION_KEY,
+    batch_version_key,
+    bump_batch_version,
+    read_version,
+)
+from src.api.services.editor_derivatives import (
+    BATCH_DERIVATIVE_SPECS,
+    DERIVATIVE_DIR,
+    derivative_media_type,
+    derivatives_key,
+    find_derivative,
+    start_derivative_trigger,
+    stop_derivative_trigger,
+)
+from src.api.services.progress_fanout import (
+    end_stage,
+    progress_fanout,
+    start_progress_fanout,
+    start_progress_observer,
+    stop_progress_fanout,
+    stop_progress_observer,
+)
+from src.api.services.progress_publisher import (
+    TERMINAL_SSE_EVENTS,
+    ProgressPublisher,
+    sse_event_type,
+    stream_id_key,
+)
+from src.api.services.sheet_counters import (
+    BatchSheetCounters,
+    start_counter_reconciliation,
+    stop_counter_reconciliation,
+)
+from src.api.services.sheet_scheduler import SheetScheduler
+from src.domains.auth.user_cache import (
+    CachedUser,
+    get_cached_current_user,
+    listen_for_invalidations,
+    user_cache,
+)
 from src.services.base_database_service import BaseDatabaseService
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/batches", tags=["Batches"])
 
-# Initialize chunked upload service
-_chunked_upload_service = ChunkedUploadService()
+class _TimedRoute(APIRoute):
+    """APIRoute recording ROUTER_LATENCY per route template"""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        route = self.path
+
+        async def timed_handler(request) -> Response:
+            started = time.perf_counter()
+            status_code = 500
+            try:
+                response = await handler(request)
+                status_code = response.status_code
+                return response
+            except HTTPException as e:
+                status_code = e.status_code
+                raise
+            except RequestValidationError:
+                status_code = 422
+                raise
+            finally:
+                ROUTER_LATENCY.labels(request.method, route, status_code).observe(
+                    time.perf_counter() - started)
+
+        return timed_handler
+
+
+router = APIRouter(prefix="/api/batches", tags=["Batches"], route_class=_TimedRoute)
+
+# Whole-file digest -> batch UUID, for linking re-uploads to existing batches
+BATCH_DEDUP_TTL_SECONDS = int(
+    os.getenv("BATCH_DEDUP_TTL_SECONDS", str(30 * 24 * 3600)))
+
+
+def _file_digest_key(
+    file_digest: str,
+    user_id: Any,
+    upload_type: str,
+    task_id: Optional[str]
+) -> str:
+    """
+    Dedup key for one user's upload of identical content
+
+    Identical bytes submitted as a different upload_type, against another
+    task or by another user produce a different batch, so all of them are
+    part of the key alongside the content digest.
+    """
+    has_qr = int(upload_type == 'zip_with_qr')
+    return (f"upload:file_digest:{user_id}:{upload_type}:{task_id or '-'}:"
+            f"{has_qr}:{file_digest}")
+
+
+async def _find_duplicate_batch(
+    async_redis: aioredis.Redis,
+    db: AsyncDatabase,
+    digest_key: str
+) -> Optional[dict]:
+    """
+    Find a batch already created from an identical upload
+
+    Batches that failed or are being deleted do not count; stale entries
+    (deleted batches) are dropped.
+
+    Args:
+        digest_key: Key from _file_digest_key
+
+    Returns:
+        Dict with batch_uuid and status, or None
+    """
+    batch_uuid = await async_redis.get(digest_key)
+    if not batch_uuid:
+        return None
+
+    query = """
+        SELECT batch_uuid, processing_status as status
+        FROM omr_batches
+        WHERE batch_uuid = %s
+    """
+    batch = await db.execute_query(query, (batch_uuid,), fetch_one=True)
+
+    if not batch:
+        await async_redis.delete(digest_key)
+        return None
+    if batch['status'] in ('failed', BATCH_DELETING_STATUS):
+        return None
+    return batch
+
+
+def _batch_digest_ref_key(batch_uuid: str) -> str:
+    """Dedup key a batch was remembered under, so deletion can drop it"""
+    return f"batch:{batch_uuid}:file_digest_key"
+
+
+async def _remember_batch_digest(
+    async_redis: aioredis.Redis,
+    digest_key: str,
+    batch_uuid: str
+) -> None:
+    """Record which batch was created from this upload"""
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.set(digest_key, batch_uuid, ex=BATCH_DEDUP_TTL_SECONDS)
+        pipe.set(_batch_digest_ref_key(batch_uuid), digest_key,
+                 ex=BATCH_DEDUP_TTL_SECONDS)
+        await pipe.execute()
+
+
+async def _forget_batch_digest(
+    async_redis: aioredis.Redis,
+    batch_uuid: str
+) -> None:
+    """Drop the dedup entry pointing at a batch that is being deleted"""
+    ref_key = _batch_digest_ref_key(batch_uuid)
+    digest_key = await async_redis.get(ref_key)
+    if digest_key:
+        await async_redis.delete(digest_key)
+    await async_redis.delete(ref_key)
+
+
+def _validate_upload_type(upload_type: str, task_id: Optional[str]) -> None:
+    """Check upload_type and that non-QR uploads carry a task_id"""
+    valid_upload_types = ['zip_with_qr', 'zip_no_qr', 'images']
+    if upload_type not in valid_upload_types:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid upload_type. Must be one of: {', '.join(valid_upload_types)}"
+        )
+
+    if upload_type in ['zip_no_qr', 'images'] and not task_id:
+        raise HTTPException(
+            status_code=400,
+            detail=f"task_id required for upload_type '{upload_type}'"
+        )
+
+
+def get_progress_publisher(
+    async_redis: aioredis.Redis = Depends(get_async_redis)
+) -> ProgressPublisher:
+    """Dependency: stream-backed ProgressPublisher on the shared async pool"""
+    return ProgressPublisher(async_redis)
+
+
+# Chunked upload staging (sessions live in Redis, so the service is stateless)
+_chunked_upload_service = PositionalChunkUploadService(get_async_redis)
+_image_ingest = StreamingImageIngest(_chunked_upload_service)
+
+_staging_janitor_task: Optional[asyncio.Task] = None
+
+
+async def _start_staging_janitor() -> None:
+    """Startup hook: launch the staging janitor"""
+    global _staging_janitor_task
+    _staging_janitor_task = asyncio.create_task(
+        run_staging_janitor(_chunked_upload_service))
+
+
+async def _stop_staging_janitor() -> None:
+    """Shutdown hook: stop the staging janitor"""
+    if _staging_janitor_task is not None:
+        _staging_janitor_task.cancel()
+        try:
+            await _staging_janitor_task
+        except asyncio.CancelledError:
+            pass
+
+
+def _open_reassembled_upload(path: str, filename: str) -> UploadFile:
+    """
+    Wrap a reassembled upload on disk as an UploadFile without reading it
+
+    The file is opened once, unbuffered, so consumers stream it straight from
+    the staging directory instead of holding a copy in memory.
+
+    Args:
+        path: Path of the reassembled file
+        filename: Original filename reported by the client
+
+    Returns:
+        UploadFile backed by the open file handle (caller closes it)
+    """
+    handle = open(path, 'rb', buffering=0)
+    return UploadFile(
+        file=handle,
+        filename=filename,
+        size=os.fstat(handle.fileno()).st_size
+    )
+
+
+# Conditional polling: ETags derive from the batch versions (see
+# src.api.services.batch_versions), and responses are cached under the
+# version they were built at.
+BATCH_POLL_CACHE_SECONDS = int(os.getenv("BATCH_POLL_CACHE_SECONDS", "2"))
+BATCH_TERMINAL_CACHE_SECONDS = int(
+    os.getenv("BATCH_TERMINAL_CACHE_SECONDS", str(24 * 3600)))
+
+
+def _make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1(
+        "|".join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+async def _cached_json_response(
+    async_redis: aioredis.Redis,
+    cache_key: str,
+    etag: str
+) -> Optional[Response]:
+    """Serve a response body cached under cache_key, if any"""
+    cached = await async_redis.get(cache_key)
+    if cached is None:
+        return None
+    return Response(
+        content=cached,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
+
+async def _cache_json_body(
+    async_redis: aioredis.Redis,
+    cache_key: str,
+    body: str,
+    terminal: bool
+) -> None:
+    ttl = BATCH_TERMINAL_CACHE_SECONDS if terminal else BATCH_POLL_CACHE_SECONDS
+    await async_redis.set(cache_key, body, ex=ttl)
+
+
+class BatchStatusResponse(JobStatusResponse):
+    """JobStatusResponse plus the batch's scheduling queue state, if queued"""
+
+    queue: Optional[Dict[str, Any]] = None
+
+
+_auth_invalidation_task: Optional[asyncio.Task] = None
+
+
+async def _start_auth_invalidation_listener() -> None:
+    """Startup hook: follow user cache invalidations from other workers"""
+    global _auth_invalidation_task
+    if user_cache.enabled:
+        _auth_invalidation_task = asyncio.create_task(
+            listen_for_invalidations(get_async_redis()))
+
+
+async def _stop_auth_invalidation_listener() -> None:
+    """Shutdown hook: stop the invalidation listener"""
+    if _auth_invalidation_task is not None:
+        _auth_invalidation_task.cancel()
+        try:
+            await _auth_invalidation_task
+        except asyncio.CancelledError:
+            pass
+
+
+router.add_event_handler("startup", open_async_redis_pool)
+router.add_event_handler("startup", open_async_db_pool)
+router.add_event_handler("startup", start_counter_reconciliation)
+router.add_event_handler("startup", start_progress_observer)
+router.add_event_handler("startup", _start_auth_invalidation_listener)
+router.add_event_handler("startup", start_derivative_trigger)
+router.add_event_handler("startup", start_progress_fanout)
+router.add_event_handler("startup", start_metrics_listener)
+router.add_event_handler("startup", _start_staging_janitor)
+router.add_event_handler("shutdown", _stop_auth_invalidation_listener)
+router.add_event_handler("shutdown", stop_derivative_trigger)
+router.add_event_handler("shutdown", _stop_staging_janitor)
+router.add_event_handler("shutdown", stop_counter_reconciliation)
+router.add_event_handler("shutdown", stop_progress_fanout)
+router.add_event_handler("shutdown", stop_progress_observer)
+router.add_event_handler("shutdown", close_async_redis_pool)
+router.add_event_handler("shutdown", close_async_db_pool)
 
 
 @router.post("/upload", response_model=JobSubmitResponse, status_code=202)
@@ -56,9 +410,10 @@ async def upload_batch(
     has_qr: bool = Form(
         True, description="Whether ZIP contains QR code sheets"),
     notes: Optional[str] = Form(None, description="Additional notes"),
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_cached_current_user),
     settings: Settings = Depends(get_settings),
     redis_client=Depends(get_redis),
+    async_redis: aioredis.Redis = Depends(get_async_redis),
     db: BaseDatabaseService = Depends(get_db)
 ) -> JobSubmitResponse:
     """
@@ -80,7 +435,8 @@ async def upload_batch(
     logger.info(
         f"Batch upload requested by user {current_user.username} (ID: {current_user.user_id})")
 
-    return await submit_unified(
+    started = time.perf_counter()
+    response = await submit_unified(
         background_tasks=background_tasks,
         file=file,
         files=files,
@@ -93,6 +449,11 @@ async def upload_batch(
         db=db
     )
 
+    await record_phase_timing(
+        async_redis, response.batch_id, "submit", time.perf_counter() - started)
+
+    return response
+
 
 @router.post("/upload-chunk", response_model=ChunkUploadResponse, status_code=202)
 async def upload_chunk(
@@ -109,22 +470,39 @@ async def upload_chunk(
         None, description="8-digit task_id for non-QR uploads"),
     is_final_chunk: bool = Form(
         False, description="True if this is the last chunk"),
-    current_user: User = Depends(get_current_user),
+    part_size: Optional[int] = Form(
+        None, gt=0, description="Size in bytes of every chunk but the last (default: size of chunk 0)"),
+    total_size: Optional[int] = Form(
+        None, gt=0, description="Total file size in bytes (preallocates the target file)"),
+    chunk_sha256: Optional[str] = Form(
+        None, description="SHA-256 of this chunk (hex), verified while writing"),
+    chunk_crc32c: Optional[str] = Form(
+        None, description="CRC32C of this chunk (hex), verified while writing"),
+    upload_digest: Optional[str] = Form(
+        None, description="SHA-256 over the concatenated chunk SHA-256s (hex)"),
+    current_user: CachedUser = Depends(get_cached_current_user),
     settings: Settings = Depends(get_settings),
     redis_client=Depends(get_redis),
+    publisher: ProgressPublisher = Depends(get_progress_publisher),
+    async_redis: aioredis.Redis = Depends(get_async_redis),
+    async_db: AsyncDatabase = Depends(get_async_db),
     db: BaseDatabaseService = Depends(get_db)
 ) -> ChunkUploadResponse:
     """
     Upload a file chunk (for files > 100MB)
 
     This endpoint handles chunked uploads to work around Cloudflare's 100MB
-    request size limit. Files are split into chunks on the client, uploaded
-    sequentially, and reassembled on the server.
+    request size limit. Files are split into chunks on the client and each
+    chunk is written straight to its offset in the target file, so chunks
+    1..N-1 may be uploaded in parallel and in any order.
 
     Flow:
     1. Upload chunk 0 → Receive upload_id
-    2. Upload chunks 1..N-1 → Track progress
-    3. Upload final chunk (is_final_chunk=true) → Triggers batch creation
+    2. Upload chunks 1..N-1 (any order) → Track progress
+    3. Whichever chunk completes the set → Triggers batch creation
+
+    An interrupted upload can be resumed by reading
+    GET /api/batches/uploads/{upload_id} and re-sending only missing_chunks.
 
     Args:
         chunk: File chunk data (max 100MB)
@@ -134,7 +512,15 @@ async def upload_chunk(
         upload_type: 'zip_with_qr', 'zip_no_qr', or 'images'
         upload_id: Upload identifier (required for chunks > 0)
         task_id: 8-digit task ID (required for zip_no_qr and images)
-        is_final_chunk: True for the last chunk
+        is_final_chunk: True for the last chunk (informational; completion
+            is decided by all chunks having arrived)
+        part_size: Nominal chunk size in bytes
+        total_size: Declared total file size in bytes
+        chunk_sha256: Optional SHA-256 of the chunk; a mismatch returns 422
+            and only this chunk needs re-sending
+        chunk_crc32c: Optional CRC32C of the chunk (same handling)
+        upload_digest: Optional whole-file composite digest, checked once
+            every chunk has arrived
 
     Returns:
         ChunkUploadResponse with upload status and batch_id (if complete)
@@ -143,108 +529,120 @@ async def upload_chunk(
         f"Chunk upload: chunk {chunk_index + 1}/{total_chunks} by user {current_user.username}"
     )
 
-    # Validate upload_type
-    valid_upload_types = ['zip_with_qr', 'zip_no_qr', 'images']
-    if upload_type not in valid_upload_types:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid upload_type. Must be one of: {', '.join(valid_upload_types)}"
-        )
-
-    # Validate task_id for non-QR uploads
-    if upload_type in ['zip_no_qr', 'images'] and not task_id:
-        raise HTTPException(
-            status_code=400,
-            detail=f"task_id required for upload_type '{upload_type}'"
-        )
-
-    # Get chunk size
-    chunk.file.seek(0, 2)  # Seek to end
-    chunk_size = chunk.file.tell()
-    chunk.file.seek(0)  # Reset to beginning
+    _validate_upload_type(upload_type, task_id)
 
-    # Process chunk
-    metadata = ChunkMetadata(
-        upload_id=upload_id or "",
+    write_started = time.perf_counter()
+    result = await _chunked_upload_service.process_chunk(
+        chunk,
+        upload_id=upload_id,
         chunk_index=chunk_index,
         total_chunks=total_chunks,
         filename=filename,
         upload_type=upload_type,
         task_id=task_id,
-        is_final_chunk=is_final_chunk,
-        chunk_size=chunk_size
+        user_id=current_user.user_id,
+        part_size=part_size,
+        total_size=total_size,
+        chunk_sha256=chunk_sha256,
+        chunk_crc32c=chunk_crc32c,
+        upload_digest=upload_digest
     )
-
-    result = await _chunked_upload_service.process_chunk(chunk, metadata)
+    write_seconds = time.perf_counter() - write_started
+    CHUNK_BYTES.inc(result.chunk_size)
+    if write_seconds > 0:
+        CHUNK_WRITE_RATE.observe(result.chunk_size / write_seconds)
 
     # Publish progress update (using upload_id as temporary batch_id)
     try:
-        import redis.asyncio as aioredis
-
-        # Create async Redis client with password
-        redis_url = (
-            f"redis://:{settings.redis_password}@"
-            f"{settings.redis_host}:{settings.redis_port}/{settings.redis_db}"
-        )
-        async_redis = aioredis.from_url(redis_url, decode_responses=True)
-
-        publisher = ProgressPublisher(async_redis)
-
         # Publish chunk upload progress
-        chunk_size_mb = chunk_size / (1024 * 1024)
-        progress_pct = (chunk_index + 1) / total_chunks * 100
+        chunk_size_mb = result.chunk_size / (1024 * 1024)
+        # Chunks arrive in any order, so progress counts received chunks
+        progress_pct = result.chunks_received / result.total_chunks * 100
 
         await publisher.publish_progress(
             batch_id=result.upload_id,
             stage=ProcessingStage.UPLOADING,
-            message=f"Chunk {chunk_index + 1}/{total_chunks} uploaded ({chunk_size_mb:.2f}MB)",
+            message=f"{result.chunks_received}/{result.total_chunks} chunks uploaded "
+                    f"(chunk {chunk_index + 1}, {chunk_size_mb:.2f}MB)",
             progress_percentage=progress_pct
         )
-
-        await async_redis.close()
     except Exception as e:
         logger.warning(f"Failed to publish chunk upload progress: {e}")
 
+    # Extract image ZIP members already covered by the received prefix
+    if upload_type == 'images' and not result.is_complete:
+        background_tasks.add_task(
+            _image_ingest.advance, result.upload_id, publisher)
+
     # If upload is complete, trigger batch processing
     if result.is_complete and result.reassembled_path:
         logger.info(
             f"Upload {result.upload_id}: All chunks received, triggering batch processing"
         )
+        try:
+            await end_stage(async_redis, result.upload_id, ProcessingStage.UPLOADING)
+        except Exception as e:
+            logger.warning(f"Failed to record upload duration of {result.upload_id}: {e}")
+
+        # Same user already uploaded identical content for the same target:
+        # report that batch as a duplicate rather than creating another
+        digest_key = _file_digest_key(
+            result.file_digest, current_user.user_id, upload_type, task_id)
+        duplicate = await _find_duplicate_batch(
+            async_redis, async_db, digest_key)
+        if duplicate:
+            logger.info(
+                f"Upload {result.upload_id} duplicates batch {duplicate['batch_uuid']}")
+            background_tasks.add_task(
+                _chunked_upload_service.cleanup_upload, result.upload_id)
+            return ChunkUploadResponse(
+                upload_id=result.upload_id,
+                chunk_index=result.chunk_index,
+                chunks_received=result.chunks_received,
+                total_chunks=result.total_chunks,
+                is_complete=True,
+                batch_id=duplicate['batch_uuid'],
+                status="duplicate",
+                message=f"Duplicate upload: identical file already uploaded as "
+                        f"batch {duplicate['batch_uuid']} "
+                        f"({duplicate['status']}); no new batch was created"
+            )
 
+        reassembled_file = None
         try:
             # Import here to avoid circular imports
-            import aiofiles
-            from fastapi import UploadFile as FUF
-
             from src.api.routers.jobs import submit_unified
 
-            # Create UploadFile from reassembled file
-            async with aiofiles.open(result.reassembled_path, 'rb') as f:
-                file_content = await f.read()
+            # Images extracted while the upload was arriving; None when the
+            # ZIP could not be streamed and is submitted whole instead
+            extracted_images = None
+            if upload_type == 'images':
+                extracted_images = await _image_ingest.finish(
+                    result.upload_id, publisher)
+
+            # Hand the reassembled file over by path: one unbuffered handle is
+            # opened on disk and streamed by submit_unified, so worker memory
+            # stays flat regardless of upload size (ZIPs run to several GB)
+            reassembled_file = _open_reassembled_upload(
+                result.reassembled_path, filename)
 
             # Determine file/files parameter based on upload_type
-            if upload_type == 'images':
-                # For images, we need to handle multiple files
-                # But since we reassembled into one file, this is a ZIP of images
-                # Convert to images upload format
-                reassembled_file = FUF(
-                    filename=filename,
-                    file=open(result.reassembled_path, 'rb')
-                )
-                files = [reassembled_file]
+            if extracted_images:
+                file = None
+                files = open_extracted_images(extracted_images)
+            elif upload_type == 'images':
+                # Reassembled images upload is a ZIP of images
                 file = None
+                files = [reassembled_file]
             else:
                 # ZIP upload (with or without QR)
-                reassembled_file = FUF(
-                    filename=filename,
-                    file=open(result.reassembled_path, 'rb')
-                )
                 file = reassembled_file
                 files = None
 
             # Submit batch for processing
             has_qr = (upload_type == 'zip_with_qr')
 
+            submit_started = time.perf_counter()
             batch_response = await submit_unified(
                 background_tasks=background_tasks,
                 file=file,
@@ -259,20 +657,22 @@ async def upload_chunk(
             )
 
             # Clean up temp files in background
-            def cleanup():
+            async def cleanup():
                 try:
-                    if file:
-                        file.file.close()
-                    if files:
-                        for f in files:
-                            f.file.close()
-                    _chunked_upload_service.cleanup_upload(result.upload_id)
+                    reassembled_file.file.close()
+                    await _chunked_upload_service.cleanup_upload(result.upload_id)
                 except Exception as e:
                     logger.error(
                         f"Cleanup failed for upload {result.upload_id}: {e}")
 
             background_tasks.add_task(cleanup)
 
+            await _remember_batch_digest(
+                async_redis, digest_key, batch_response.batch_id)
+            await record_phase_timing(
+                async_redis, batch_response.batch_id, "submit",
+                time.perf_counter() - submit_started)
+
             return ChunkUploadResponse(
                 upload_id=result.upload_id,
                 chunk_index=result.chunk_index,
@@ -288,7 +688,9 @@ async def upload_chunk(
             logger.error(
                 f"Batch creation failed for upload {result.upload_id}: {e}", exc_info=True)
             # Clean up on error
-            _chunked_upload_service.cleanup_upload(result.upload_id)
+            if reassembled_file is not None:
+                reassembled_file.file.close()
+            await _chunked_upload_service.cleanup_upload(result.upload_id)
             raise HTTPException(
                 status_code=500,
                 detail=f"Batch creation failed: {str(e)}"
@@ -305,24 +707,265 @@ async def upload_chunk(
     )
 
 
-@router.get("/{batch_id}/status", response_model=JobStatusResponse)
+# Upper bound on batches multiplexed over one /stream connection
+BATCH_MULTI_STREAM_MAX = int(os.getenv("BATCH_MULTI_STREAM_MAX", "100"))
+
+
+@router.get("/stream")
+async def stream_batches_progress(
+    ids: Optional[str] = Query(
+        None, description="Comma-separated batch UUIDs (default: all my active batches)"),
+    current_user: CachedUser = Depends(get_cached_current_user),
+    db: AsyncDatabase = Depends(get_async_db),
+    publisher: ProgressPublisher = Depends(get_progress_publisher)
+):
+    """
+    Stream progress of several batches over one SSE connection
+
+    Permissions for every requested batch are checked in a single query.
+    Events use the same 'progress', 'complete', 'error' and 'deleted' types
+    as the single-batch stream; each payload carries its batch_id. A terminal event
+    ends only that batch; the connection closes once every batch is done.
+
+    On connect, the latest recorded event of each batch is sent first so
+    the client can render current state immediately. Batches that start
+    after the connection opens are not added; reconnect to pick them up.
+
+    Returns 204 when the user has no active batches, which tells
+    EventSource clients to stop reconnecting instead of re-querying in a loop.
+    """
+    if ids:
+        batch_ids = list(dict.fromkeys(
+            batch_id.strip() for batch_id in ids.split(",") if batch_id.strip()))
+        if not batch_ids:
+            raise HTTPException(400, "No batch IDs provided")
+        if len(batch_ids) > BATCH_MULTI_STREAM_MAX:
+            raise HTTPException(
+                400, f"At most {BATCH_MULTI_STREAM_MAX} batches per stream")
+
+        placeholders = ", ".join(["%s"] * len(batch_ids))
+        query = f"""
+            SELECT batch_uuid, uploaded_by
+            FROM omr_batches
+            WHERE batch_uuid IN ({placeholders})
+        """
+        rows = await db.execute_query(query, tuple(batch_ids), fetch_all=True) or []
+        found = {row['batch_uuid']: row for row in rows}
+
+        missing = [batch_id for batch_id in batch_ids if batch_id not in found]
+        if missing:
+            raise HTTPException(
+                404, f"Batches not found: {', '.join(missing)}")
+
+        if not current_user.is_admin and any(
+                row.get('uploaded_by') != current_user.user_id for row in rows):
+            raise HTTPException(403, "Access denied")
+    else:
+        query = """
+            SELECT batch_uuid
+            FROM omr_batches
+            WHERE processing_status NOT IN ('completed', 'failed', 'deleting')
+        """
+        params = []
+        if not current_user.is_admin:
+            query += " AND uploaded_by = %s"
+            params.append(current_user.user_id)
+        query += " ORDER BY uploaded_at DESC LIMIT %s"
+        params.append(BATCH_MULTI_STREAM_MAX)
+
+        rows = await db.execute_query(query, tuple(params), fetch_all=True) or []
+        batch_ids = [row['batch_uuid'] for row in rows]
+        if not batch_ids:
+            return Response(status_code=204)
+
+    async def event_generator():
+        """Generate SSE events for every requested batch from one queue"""
+        queue: asyncio.Queue = asyncio.Queue(
+            maxsize=progress_fanout.queue_size * max(len(batch_ids), 1))
+        active = set(batch_ids)
+
+        # Register before reading snapshots so no live event is missed
+        for batch_id in batch_ids:
+            progress_fanout.subscribe(batch_id, queue)
+
+        try:
+            latest = await publisher.read_latest_progress(batch_ids)
+
+            for batch_id, (_, event, event_type) in latest.items():
+                yield {
+                    "event": event_type,
+                    "data": event.model_copy(
+                        update={"batch_id": batch_id}).model_dump_json()
+                }
+
+                if event_type in TERMINAL_SSE_EVENTS:
+                    active.discard(batch_id)
+                    progress_fanout.unsubscribe(batch_id, queue)
+
+            logger.info(
+                f"Multi-batch SSE stream started for {len(active)} batches "
+                f"by user {current_user.username}")
+
+            while active:
+                sse_event = await queue.get()
+                # Entry IDs are per batch, so they are not sent as SSE ids here
+                yield {"event": sse_event["event"], "data": sse_event["data"]}
+
+                if sse_event["event"] in TERMINAL_SSE_EVENTS:
+                    batch_id = json.loads(sse_event["data"]).get("batch_id")
+                    active.discard(batch_id)
+                    progress_fanout.unsubscribe(batch_id, queue)
+
+            logger.info("Multi-batch SSE stream ended: all batches finished")
+
+        except asyncio.CancelledError:
+            logger.info("Multi-batch SSE stream cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Multi-batch SSE stream error: {e}", exc_info=True)
+            yield {
+                "event": "error",
+                "data": json.dumps({"error": str(e)})
+            }
+        finally:
+            for batch_id in batch_ids:
+                progress_fanout.unsubscribe(batch_id, queue)
+
+    return EventSourceResponse(event_generator())
+
+
+@router.post("/uploads", response_model=dict)
+async def start_upload(
+    filename: str = Form(..., description="Original filename"),
+    upload_type: str = Form(...,
+                            description="Upload type: zip_with_qr, zip_no_qr, images"),
+    task_id: Optional[str] = Form(
+        None, description="8-digit task_id for non-QR uploads"),
+    total_chunks: int = Form(..., ge=1, description="Total number of chunks"),
+    part_size: int = Form(..., gt=0,
+                          description="Size in bytes of every chunk but the last"),
+    total_size: int = Form(..., gt=0, description="Total file size in bytes"),
+    chunk_sha256: str = Form(...,
+                             description="Comma-separated SHA-256 (hex) of every chunk, in order"),
+    current_user: CachedUser = Depends(get_cached_current_user),
+    async_redis: aioredis.Redis = Depends(get_async_redis),
+    db: AsyncDatabase = Depends(get_async_db)
+) -> dict:
+    """
+    Content-hash handshake before a chunked upload
+
+    The client declares the SHA-256 of every chunk. If this user already
+    created a batch from identical content with the same upload_type and
+    task_id, duplicate is true, its batch_id is returned as duplicate_of and
+    nothing needs to be uploaded. Otherwise an upload session is
+    created, chunks already staged by this user are copied in server-side, and
+    only missing_chunks need to be sent to /upload-chunk with the returned
+    upload_id.
+    """
+    _validate_upload_type(upload_type, task_id)
+
+    chunk_digests = [digest.strip().lower() for digest in chunk_sha256.split(",")]
+    if len(chunk_digests) != total_chunks:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected {total_chunks} chunk digests, got {len(chunk_digests)}"
+        )
+    try:
+        upload_digest = upload_composite_digest(chunk_digests)
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="chunk_sha256 must be hex SHA-256 digests")
+
+    duplicate = await _find_duplicate_batch(
+        async_redis, db, _file_digest_key(
+            upload_digest, current_user.user_id, upload_type, task_id))
+    if duplicate:
+        return {
+            "upload_id": None,
+            "duplicate": True,
+            "duplicate_of": duplicate['batch_uuid'],
+            "status": duplicate['status'],
+            "upload_digest": upload_digest,
+            "reused_chunks": [],
+            "missing_chunks": []
+        }
+
+    session = await _chunked_upload_service.create_session(
+        total_chunks, filename, upload_type, task_id, current_user.user_id,
+        part_size, total_size, upload_digest=upload_digest)
+    reused = await _chunked_upload_service.reuse_chunks(session, chunk_digests)
+
+    return {
+        "upload_id": session.upload_id,
+        "duplicate": False,
+        "duplicate_of": None,
+        "status": None,
+        "upload_digest": upload_digest,
+        "reused_chunks": reused,
+        "missing_chunks": sorted(set(range(total_chunks)) - set(reused))
+    }
+
+
+@router.get("/uploads/{upload_id}", response_model=dict)
+async def get_upload_manifest(
+    upload_id: str,
+    current_user: CachedUser = Depends(get_cached_current_user)
+) -> dict:
+    """
+    Get the manifest of a chunked upload
+
+    Lists received and missing chunk indices so an interrupted upload can be
+    resumed by re-sending only the gaps with the same upload_id.
+    """
+    session = await _chunked_upload_service.get_session(upload_id)
+
+    if session is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Upload {upload_id} not found. Please restart upload."
+        )
+
+    if not current_user.is_admin and session.user_id != current_user.user_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return session.manifest()
+
+
+@router.get("/{batch_id}/status", response_model=BatchStatusResponse)
 async def get_batch_status(
     batch_id: str,
     include_sheets: bool = Query(False, description="Include sheet details"),
     limit: int = Query(100, ge=1, le=1000, description="Max sheets to return"),
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_cached_current_user),
     db: BaseDatabaseService = Depends(get_db),
     redis_client=Depends(get_redis),
-    settings: Settings = Depends(get_settings)
-) -> JobStatusResponse:
+    async_redis: aioredis.Redis = Depends(get_async_redis),
+    settings: Settings = Depends(get_settings),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
+) -> BatchStatusResponse:
     """
     Get detailed batch status and progress
 
     Returns current processing status, progress percentage, and optionally
-    individual sheet statuses.
+    individual sheet statuses. `queue` reports the batch's scheduling class,
+    its pending/running sheets, and queue depth and wait time per class.
+
+    Responses carry an ETag; polling with If-None-Match returns 304 while
+    the batch is unchanged.
     """
+    version = await read_version(async_redis, batch_version_key(batch_id))
+    variant = f"status:{include_sheets}:{limit}"
+    etag = _make_etag(batch_id, variant, version)
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+
+    cache_key = f"batch:{batch_id}:cache:{variant}:{version}"
+    cached = await _cached_json_response(async_redis, cache_key, etag)
+    if cached is not None:
+        return cached
+
     from src.api.routers.jobs import get_job_status
-    return await get_job_status(
+    status = await get_job_status(
         batch_id=batch_id,
         include_sheets=include_sheets,
         limit=limit,
@@ -331,25 +974,57 @@ async def get_batch_status(
         settings=settings
     )
 
+    try:
+        queue = await SheetScheduler(async_redis).queue_status(batch_id)
+    except Exception as e:
+        logger.warning(f"Failed to read queue status for batch {batch_id}: {e}")
+        queue = None
+
+    response = BatchStatusResponse(**status.model_dump(), queue=queue)
+    body = response.model_dump_json()
+    terminal = str(getattr(response.status, "value", response.status)) in ("completed", "failed")
+    # Queue state of an active batch moves without a version bump; keep only
+    # the finished batch (whose queue is empty) around for long
+    await _cache_json_body(async_redis, cache_key, body, terminal)
+
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
+
+def _bare_event_key(data: str) -> tuple:
+    """Identity of an event without a stream ID: (timestamp, stage, message)"""
+    payload = json.loads(data)
+    return payload.get("timestamp"), payload.get("stage"), payload.get("message")
+
 
 @router.get("/{batch_id}/stream")
 async def stream_batch_progress(
     batch_id: str,
-    current_user: User = Depends(get_current_user),
-    db: BaseDatabaseService = Depends(get_db),
-    redis_client=Depends(get_redis)
+    current_user: CachedUser = Depends(get_cached_current_user),
+    db: AsyncDatabase = Depends(get_async_db),
+    publisher: ProgressPublisher = Depends(get_progress_publisher),
+    last_event_id: Optional[str] = Header(
+        None, alias="Last-Event-ID", description="Resume after this event ID")
 ):
     """
     Stream real-time batch processing progress via Server-Sent Events (SSE)
 
     This endpoint provides live progress updates during batch upload and processing.
-    Client should listen for 'progress', 'complete', and 'error' events.
-    Connection auto-closes when batch reaches 'completed' or 'failed' state.
+    Client should listen for 'progress', 'complete', 'error' and 'deleted'
+    events. Connection auto-closes when batch reaches 'completed' or 'failed'
+    state, or once the batch has been deleted.
+
+    Each event carries its progress stream entry ID as the SSE id. A client
+    reconnecting with Last-Event-ID receives only the events after it.
 
     Event Types:
     - 'progress': Regular progress update
     - 'complete': Batch completed successfully
     - 'error': Batch failed
+    - 'deleted': Batch deletion finished (stage 'cleanup', 100%)
 
     Example (JavaScript):
         const eventSource = new EventSource('/api/batches/{batch_id}/stream');
@@ -364,7 +1039,7 @@ async def stream_batch_progress(
         FROM omr_batches
         WHERE batch_uuid = %s
     """
-    result = db.execute_query(query, (batch_id,), fetch_one=True)
+    result = await db.execute_query(query, (batch_id,), fetch_one=True)
 
     if not result:
         raise HTTPException(404, f"Batch {batch_id} not found")
@@ -374,81 +1049,67 @@ async def stream_batch_progress(
         raise HTTPException(403, "Access denied")
 
     async def event_generator():
-        """Generate SSE events from Redis pubsub"""
-
-        import redis.asyncio as aioredis
-
-        from src.api.dependencies import get_settings
-
-        # Create async Redis client for pubsub with password
-        settings_local = get_settings()
-        redis_url = (
-            f"redis://:{settings_local.redis_password}@"
-            f"{settings_local.redis_host}:{settings_local.redis_port}/{settings_local.redis_db}"
-        )
-        async_redis = aioredis.from_url(redis_url, decode_responses=True)
-
-        publisher = ProgressPublisher(async_redis)
+        """Generate SSE events from the shared progress subscriber"""
+        # Register before reading the stream so no live event is missed;
+        # anything also returned by the stream read is skipped below by ID
+        queue = progress_fanout.subscribe(batch_id)
+        last_id = last_event_id
+        # Bare (ID-less) events replayed from the legacy log; the same events
+        # may also be queued live, and are skipped there by content
+        replayed_bare: Set[tuple] = set()
 
         try:
-            # Send existing progress log first (for reconnections)
-            existing_log = await publisher.get_progress_log(batch_id, limit=1000)
-
-            for event in existing_log:
-                event_type = "progress"
-                if event.stage == ProcessingStage.COMPLETED:
-                    event_type = "complete"
-                elif event.stage == ProcessingStage.FAILED:
-                    event_type = "error"
-
-                yield {
+            # Send recorded events after Last-Event-ID (all on first connect)
+            recorded = await publisher.read_progress_stream(batch_id, last_id)
+
+            if not recorded and not last_id:
+                # Batch published before the progress stream existed
+                legacy_log = await publisher.get_progress_log(batch_id, limit=1000)
+                recorded = [
+                    (None, event, sse_event_type(event.stage))
+                    for event in legacy_log
+                ]
+
+            for entry_id, event, event_type in recorded:
+                sse_event = {
                     "event": event_type,
                     "data": event.model_dump_json()
                 }
-
-                # If already completed/failed, close connection
-                if event_type in ["complete", "error"]:
-                    await async_redis.close()
+                if entry_id:
+                    sse_event["id"] = entry_id
+                    last_id = entry_id
+                else:
+                    replayed_bare.add(_bare_event_key(sse_event["data"]))
+                yield sse_event
+
+                # If already completed/failed/deleted, close connection
+                if event_type in TERMINAL_SSE_EVENTS:
                     return
 
-            # Subscribe to live progress updates
-            pubsub = async_redis.pubsub()
-            await pubsub.subscribe(f"batch:{batch_id}:progress")
-
             # Stream new events
             logger.info(
                 f"SSE stream started for batch {batch_id} by user {current_user.username}")
 
-            async for message in pubsub.listen():
-                if message["type"] != "message":
-                    continue
-
-                try:
-                    event_data = json.loads(message["data"])
-                    event = BatchProgressEvent.model_validate(event_data)
-
-                    # Determine event type
-                    event_type = "progress"
-                    if event.stage == ProcessingStage.COMPLETED:
-                        event_type = "complete"
-                    elif event.stage == ProcessingStage.FAILED:
-                        event_type = "error"
-
-                    yield {
-                        "event": event_type,
-                        "data": event.model_dump_json()
-                    }
-
-                    # Close connection on completion/failure
-                    if event_type in ["complete", "error"]:
-                        logger.info(
-                            f"SSE stream ended for batch {batch_id}: {event_type}")
-                        break
-
-                except Exception as e:
-                    logger.error(
-                        f"Error processing SSE event: {e}", exc_info=True)
-                    continue
+            while True:
+                sse_event = await queue.get()
+
+                entry_id = sse_event.get("id")
+                if entry_id:
+                    if last_id and stream_id_key(entry_id) <= stream_id_key(last_id):
+                        continue
+                    last_id = entry_id
+                elif replayed_bare:
+                    bare_key = _bare_event_key(sse_event["data"])
+                    if bare_key in replayed_bare:
+                        replayed_bare.discard(bare_key)
+                        continue
+                yield sse_event
+
+                # Close connection on completion/failure/deletion
+                if sse_event["event"] in TERMINAL_SSE_EVENTS:
+                    logger.info(
+                        f"SSE stream ended for batch {batch_id}: {sse_event['event']}")
+                    break
 
         except asyncio.CancelledError:
             logger.info(f"SSE stream cancelled for batch {batch_id}")
@@ -462,12 +1123,7 @@ async def stream_batch_progress(
                 "data": json.dumps({"error": str(e)})
             }
         finally:
-            try:
-                await pubsub.unsubscribe(f"batch:{batch_id}:progress")
-                await pubsub.close()
-                await async_redis.close()
-            except Exception as e:
-                logger.error(f"Error closing SSE stream: {e}")
+            progress_fanout.unsubscribe(batch_id, queue)
 
     return EventSourceResponse(event_generator())
 
@@ -475,15 +1131,30 @@ async def stream_batch_progress(
 @router.get("/{batch_id}/progress")
 async def get_batch_progress(
     batch_id: str,
-    current_user: User = Depends(get_current_user),
-    db: BaseDatabaseService = Depends(get_db)
+    current_user: CachedUser = Depends(get_cached_current_user),
+    db: AsyncDatabase = Depends(get_async_db),
+    async_redis: aioredis.Redis = Depends(get_async_redis),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
 ) -> dict:
     """
     Get simplified batch progress (lightweight polling endpoint)
 
     Returns progress percentage and counts without full details.
     Ideal for real-time progress bars in frontend.
+
+    Responses carry an ETag; polling with If-None-Match returns 304 while
+    the batch is unchanged, without a database query.
     """
+    version = await read_version(async_redis, batch_version_key(batch_id))
+    etag = _make_etag(batch_id, "progress", version)
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+
+    cache_key = f"batch:{batch_id}:cache:progress:{version}"
+    cached = await _cached_json_response(async_redis, cache_key, etag)
+    if cached is not None:
+        return cached
+
     query = """
         SELECT 
             b.batch_uuid,
@@ -496,51 +1167,180 @@ async def get_batch_progress(
         WHERE b.batch_uuid = %s
     """
 
-    result = db.execute_query(query, (batch_id,), fetch_one=True)
+    result = await db.execute_query(query, (batch_id,), fetch_one=True)
 
     if not result:
         raise HTTPException(
             status_code=404, detail=f"Batch {batch_id} not found")
 
-    # Get processed count from sheets using integer batch_id
-    sheets_query = """
-        SELECT 
-            COUNT(CASE WHEN processing_status = 'completed' THEN 1 END) as processed_count,
-            COUNT(CASE WHEN processing_status = 'failed' THEN 1 END) as failed_count
-        FROM omr_sheets
-        WHERE batch_id = %s
-    """
-
-    sheets_result = db.execute_query(
-        sheets_query, (result['batch_int_id'],), fetch_one=True)
+    # Processed/failed counts come from the Redis counters sheet tasks
+    # update as they finish; a batch without seeded counters (or with
+    # BATCH_SHEET_COUNTERS_ENABLED off) is counted from omr_sheets instead
+    counts = await BatchSheetCounters(async_redis, db).get(
+        result['batch_uuid'], result['batch_int_id'])
 
-    processed_count = sheets_result.get(
-        'processed_count', 0) if sheets_result else 0
-    failed_count = sheets_result.get('failed_count', 0) if sheets_result else 0
+    processed_count = counts['processed_count']
+    failed_count = counts['failed_count']
     sheet_count = result.get('sheet_count', 0)
+    phase_timings = await read_phase_timings(async_redis, result['batch_uuid'])
 
     progress_percentage = (processed_count / sheet_count *
                            100) if sheet_count > 0 else 0
 
-    return {
+    progress = {
         "batch_uuid": result['batch_uuid'],
         "status": result['status'],
         "sheet_count": sheet_count,
         "processed_count": processed_count,
         "failed_count": failed_count,
         "progress_percentage": round(progress_percentage, 2),
+        "phase_timings": phase_timings,
         "created_at": result['uploaded_at'].isoformat() if result.get('uploaded_at') else None,
         "completed_at": result['processing_completed_at'].isoformat() if result.get('processing_completed_at') else None
     }
 
+    body = json.dumps(progress)
+    await _cache_json_body(
+        async_redis, cache_key, body, result['status'] in ("completed", "failed"))
+
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
+
+# Sheet statuses understood by the NDJSON export filter
+SHEET_STATUSES = ("pending", "processing", "completed", "failed")
+BATCH_SHEETS_EXPORT_FETCH_ROWS = int(os.getenv("BATCH_SHEETS_EXPORT_FETCH_ROWS", "500"))
+
+
+@router.get("/{batch_id}/sheets.ndjson")
+async def export_batch_sheets(
+    batch_id: str,
+    status: Optional[List[str]] = Query(
+        None, description="Only sheets with these statuses (repeatable)"),
+    accept_encoding: Optional[str] = Header(None, alias="Accept-Encoding"),
+    current_user: CachedUser = Depends(get_cached_current_user),
+    db: AsyncDatabase = Depends(get_async_db)
+) -> StreamingResponse:
+    """
+    Stream every sheet's status of a batch as newline-delimited JSON
+
+    Rows are read in sequence order by keyset-paged queries, so memory use
+    is constant, the first lines arrive at once regardless of batch size,
+    and no database connection is held while a slow client reads. Responses
+    are gzip-compressed when the client accepts it.
+
+    Each line: {"sheet_uuid", "batch_uuid", "status", "sequence_number",
+    "error_message", "image_path"}
+    """
+    query = """
+        SELECT id, batch_uuid, uploaded_by
+        FROM omr_batches
+        WHERE batch_uuid = %s
+    """
+    result = await db.execute_query(query, (batch_id,), fetch_one=True)
+
+    if not result:
+        raise HTTPException(404, f"Batch {batch_id} not found")
+
+    if not current_user.is_admin and result.get('uploaded_by') != current_user.user_id:
+        raise HTTPException(403, "Access denied")
+
+    statuses = list(dict.fromkeys(status or []))
+    invalid = [value for value in statuses if value not in SHEET_STATUSES]
+    if invalid:
+        raise HTTPException(
+            400, f"Invalid status filter: {', '.join(invalid)} "
+                 f"(expected {', '.join(SHEET_STATUSES)})")
+
+    sheets_query = """
+        SELECT
+            sheet_uuid,
+            processing_status as status,
+            sequence_number,
+            error_message,
+            image_path,
+            COALESCE(sequence_number, -1) as sort_key,
+            id
+        FROM omr_sheets
+        WHERE batch_id = %s
+    """
+    params = [result['id']]
+    if statuses:
+        sheets_query += f" AND processing_status IN ({', '.join(['%s'] * len(statuses))})"
+        params.extend(statuses)
+    # Keyset paging needs a non-NULL key; sheets without a sequence number
+    # still sort first, as with ORDER BY sequence_number
+    sheet_keys = [("COALESCE(sequence_number, -1)", "sort_key"), ("id", "id")]
+
+    use_gzip = "gzip" in (accept_encoding or "").lower()
+
+    async def ndjson_lines():
+        # Each page is flushed as a complete gzip block so the client can
+        # decode and render rows while the export is still running
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None
+        async for rows in db.keyset_pages(
+                sheets_query, tuple(params), sheet_keys,
+                BATCH_SHEETS_EXPORT_FETCH_ROWS):
+            payload = "".join(
+                json.dumps({
+                    "batch_uuid": batch_id,
+                    **{field: value for field, value in row.items()
+                       if field not in ("sort_key", "id")}
+                }, default=str) + "\n"
+                for row in rows
+            ).encode()
+            if compressor:
+                payload = compressor.compress(payload) + \
+                    compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield payload
+        if compressor:
+            yield compressor.flush()
+
+    headers = {"Cache-Control": "no-store", "Vary": "Accept-Encoding"}
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        ndjson_lines(), media_type="application/x-ndjson", headers=headers)
+
+
+# list_batches totals are cached briefly and reported as approximate
+BATCH_TOTAL_CACHE_SECONDS = int(os.getenv("BATCH_TOTAL_CACHE_SECONDS", "30"))
+
+
+def _encode_batch_cursor(uploaded_at: datetime, batch_int_id: int) -> str:
+    """Opaque keyset cursor for the (uploaded_at, id) sort order"""
+    raw = json.dumps([uploaded_at.isoformat(), batch_int_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_batch_cursor(cursor: str) -> tuple:
+    """Decode a cursor from _encode_batch_cursor; 400 if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        uploaded_at, batch_int_id = json.loads(
+            base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(uploaded_at), int(batch_int_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 
 @router.get("/", response_model=dict)
 async def list_batches(
     status: Optional[str] = Query(None, description="Filter by status"),
     limit: int = Query(50, ge=1, le=100, description="Results per page"),
     offset: int = Query(0, ge=0, description="Pagination offset"),
-    current_user: User = Depends(get_current_user),
-    db: BaseDatabaseService = Depends(get_db)
+    cursor: Optional[str] = Query(
+        None, description="Keyset cursor (next_cursor of the previous page); overrides offset"),
+    include_total: bool = Query(
+        True, description="Include the (cached, approximate) total count"),
+    current_user: CachedUser = Depends(get_cached_current_user),
+    db: AsyncDatabase = Depends(get_async_db),
+    async_redis: aioredis.Redis = Depends(get_async_redis),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
 ) -> dict:
     """
     List batches for current user (paginated)
@@ -549,7 +1349,21 @@ async def list_batches(
     - status: Filter by processing status (uploaded, validating, processing, completed, failed)
     - limit: Results per page (1-100)
     - offset: Pagination offset
+    - cursor: Keyset pagination on (uploaded_at, id); pass next_cursor from
+      the previous page instead of offset to page without an offset scan
+    - include_total: Set false to skip the total count; when included it is
+      cached for BATCH_TOTAL_CACHE_SECONDS and may lag slightly
+
+    Responses carry an ETag that changes whenever any batch changes;
+    polling with If-None-Match returns 304 otherwise.
     """
+    version = await read_version(async_redis, BATCHES_VERSION_KEY)
+    etag = _make_etag(
+        "batches", version, current_user.user_id, current_user.is_admin,
+        status, limit, offset, cursor, include_total)
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+
     # Build query
     query = """
         SELECT 
@@ -569,38 +1383,78 @@ async def list_batches(
         WHERE 1=1
     """
 
+    filters = ""
     params = []
 
+    # Batches being deleted are hidden unless asked for explicitly
+    if status != BATCH_DELETING_STATUS:
+        filters += " AND processing_status <> %s"
+        params.append(BATCH_DELETING_STATUS)
+
     # Filter by user unless admin
     if not current_user.is_admin:
-        query += " AND uploaded_by = %s"
+        filters += " AND uploaded_by = %s"
         params.append(current_user.user_id)
 
     # Filter by status if provided
     if status:
-        query += " AND processing_status = %s"
+        filters += " AND processing_status = %s"
         params.append(status)
 
-    # Count total
-    count_query = "SELECT COUNT(*) as total FROM omr_batches WHERE 1=1"
-    if not current_user.is_admin:
-        count_query += " AND uploaded_by = %s"
-    if status:
-        count_query += " AND processing_status = %s"
-
-    total_result = db.execute_query(count_query, tuple(params), fetch_one=True)
-    total = total_result.get('total', 0) if total_result else 0
-
-    # Add pagination
-    query += " ORDER BY uploaded_at DESC LIMIT %s OFFSET %s"
-    params.extend([limit, offset])
+    # Count total (cached per scope and status)
+    total = None
+    if include_total:
+        scope = "all" if current_user.is_admin else current_user.user_id
+        total_key = f"batches:total:{scope}:{status or 'any'}"
+        cached_total = await async_redis.get(total_key)
+
+        if cached_total is not None:
+            total = int(cached_total)
+        else:
+            count_query = "SELECT COUNT(*) as total FROM omr_batches WHERE 1=1" + filters
+            total_result = await db.execute_query(
+                count_query, tuple(params), fetch_one=True)
+            total = total_result.get('total', 0) if total_result else 0
+            await async_redis.set(total_key, total, ex=BATCH_TOTAL_CACHE_SECONDS)
+
+    query += filters
+    page_params = list(params)
+
+    # Add pagination: keyset when a cursor is given, offset otherwise.
+    # One extra row is fetched to tell whether another page exists.
+    if cursor:
+        cursor_uploaded_at, cursor_id = _decode_batch_cursor(cursor)
+        query += " AND (uploaded_at < %s OR (uploaded_at = %s AND id < %s))"
+        page_params.extend([cursor_uploaded_at, cursor_uploaded_at, cursor_id])
+        query += " ORDER BY uploaded_at DESC, id DESC LIMIT %s"
+        page_params.append(limit + 1)
+    else:
+        query += " ORDER BY uploaded_at DESC, id DESC LIMIT %s OFFSET %s"
+        page_params.extend([limit + 1, offset])
+
+    batches_result = await db.execute_query(
+        query, tuple(page_params), fetch_all=True)
+    batches = list(batches_result) if batches_result else []
+
+    has_more = len(batches) > limit
+    batches = batches[:limit]
+    next_cursor = (
+        _encode_batch_cursor(batches[-1]['created_at'], batches[-1]['id'])
+        if has_more else None
+    )
 
-    batches_result = db.execute_query(query, tuple(params), fetch_all=True)
-    batches = batches_result if batches_result else []
+    # Per-batch processed/failed counts for the whole page in one round-trip
+    counts_by_batch = await BatchSheetCounters(async_redis, db).get_many(
+        {batch['batch_uuid']: batch['id'] for batch in batches})
 
     # Format response
     batch_list = []
     for batch in batches:
+        counts = counts_by_batch[batch['batch_uuid']]
+        sheet_count = batch['sheet_count'] or 0
+        progress_percentage = (counts['processed_count'] / sheet_count *
+                               100) if sheet_count > 0 else 0
+
         batch_list.append({
             "batch_id": batch['id'],
             "batch_uuid": batch['batch_uuid'],
@@ -608,6 +1462,9 @@ async def list_batches(
             "upload_type": batch['upload_type'],
             "status": batch['status'],
             "sheet_count": batch['sheet_count'],
+            "processed_count": counts['processed_count'],
+            "failed_count": counts['failed_count'],
+            "progress_percentage": round(progress_percentage, 2),
             "file_size_bytes": batch['file_size_bytes'],
             "created_at": batch['created_at'].isoformat() if batch.get('created_at') else None,
             "processing_started_at": batch['processing_started_at'].isoformat() if batch.get('processing_started_at') else None,
@@ -616,26 +1473,406 @@ async def list_batches(
             "notes": batch.get('notes')
         })
 
+    return Response(
+        content=json.dumps({
+            "batches": batch_list,
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "showing": len(batch_list),
+            "next_cursor": next_cursor,
+            "has_more": has_more
+        }),
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
+
+@router.get("/{batch_id}/derivatives", response_model=dict)
+async def get_batch_derivatives(
+    batch_id: str,
+    current_user: CachedUser = Depends(get_cached_current_user),
+    async_redis: aioredis.Redis = Depends(get_async_redis)
+) -> dict:
+    """
+    Get the state of editor image pre-rendering for a batch
+
+    Returns:
+        status (pending/running/completed/failed), sheets_total,
+        sheets_done, rendered (files written) and failed (sheets)
+    """
+    state = await async_redis.hgetall(derivatives_key(batch_id))
+    if not state:
+        return {"batch_id": batch_id, "status": "pending"}
+
+    for count_field in ("sheets_total", "sheets_done", "rendered", "failed"):
+        if count_field in state:
+            state[count_field] = int(state[count_field])
+    return {"batch_id": batch_id, **state}
+
+
+@router.get("/{batch_id}/sheets/{sheet_uuid}/derivative")
+async def get_sheet_derivative(
+    batch_id: str,
+    sheet_uuid: str,
+    part: str = Query(..., description="Editor crop, e.g. top or bottom"),
+    width: int = Query(..., gt=0, description="Output width in pixels"),
+    current_user: CachedUser = Depends(get_cached_current_user),
+    db: AsyncDatabase = Depends(get_async_db)
+) -> FileResponse:
+    """
+    Serve a pre-rendered editor crop of a sheet
+
+    Only (part, width) pairs listed in BATCH_DERIVATIVE_SPECS are served.
+    Returns 404 when the derivative is not configured or not rendered yet;
+    the editor then falls back to the full image endpoint.
+    """
+    if (part, width) not in {(spec_part, spec_width)
+                             for spec_part, _, spec_width in BATCH_DERIVATIVE_SPECS}:
+        raise HTTPException(404, f"No derivative configured for {part} at width {width}")
+
+    query = """
+        SELECT s.image_path, b.uploaded_by
+        FROM omr_sheets s
+        JOIN omr_batches b ON b.id = s.batch_id
+        WHERE b.batch_uuid = %s AND s.sheet_uuid = %s
+    """
+    result = await db.execute_query(query, (batch_id, sheet_uuid), fetch_one=True)
+
+    if not result:
+        raise HTTPException(404, f"Sheet {sheet_uuid} not found in batch {batch_id}")
+
+    if not current_user.is_admin and result.get('uploaded_by') != current_user.user_id:
+        raise HTTPException(403, "Access denied")
+
+    path = None
+    if result.get('image_path'):
+        path = await asyncio.to_thread(
+            find_derivative, result['image_path'], part, width)
+    if not path:
+        raise HTTPException(404, f"Derivative {part} at width {width} not rendered")
+
+    return FileResponse(
+        path,
+        media_type=derivative_media_type(path),
+        headers={"Cache-Control": "private, max-age=86400"}
+    )
+
+
+@router.get("/metrics")
+async def get_metrics(
+    current_user: CachedUser = Depends(get_cached_current_user)
+) -> Response:
+    """
+    Prometheus metrics for batch processing and the batches API (admin only)
+
+    Per-stage and per-phase duration histograms, sheet throughput,
+    chunk-upload bandwidth and request latency per route. Scrapers without
+    an API token use the internal BATCH_METRICS_PORT listener instead.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403,
+            detail="Only administrators can view metrics"
+        )
+
+    if not METRICS_AVAILABLE:
+        raise HTTPException(501, "prometheus_client is not installed")
+
+    content, media_type = generate_metrics()
+    return Response(content=content, media_type=media_type)
+
+
+@router.get("/redis-pool/stats", response_model=dict)
+async def get_redis_pool_stats(
+    current_user: CachedUser = Depends(get_cached_current_user)
+) -> dict:
+    """
+    Get shared async Redis pool utilisation (Admin only)
+
+    Reports configured maximum, connections in use and idle connections,
+    plus the state of the shared progress subscriber, the user cache and
+    upload staging usage.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403,
+            detail="Only administrators can view Redis pool stats"
+        )
+
     return {
-        "batches": batch_list,
-        "total": total,
-        "limit": limit,
-        "offset": offset,
-        "showing": len(batch_list)
+        **get_async_redis_pool_stats(),
+        "progress_fanout": progress_fanout.stats(),
+        "auth_cache": user_cache.stats(),
+        "upload_staging": await get_staging_usage(get_async_redis())
     }
 
 
-@router.delete("/{batch_id}", status_code=204)
+# Batch deletion runs as a background job: sheets are deleted in bounded
+# statements (each its own transaction under autocommit), their image files
+# are removed at a capped rate, and progress goes to the batch's usual
+# progress channel so an open /{batch_id}/stream follows along.
+#
+# The batch is marked 'deleting' up front so lists hide it at once. The
+# per-batch lock has a short TTL that the job refreshes after every chunk;
+# if the worker dies the lock lapses and a new DELETE takes over.
+BATCH_DELETE_CHUNK_ROWS = int(os.getenv("BATCH_DELETE_CHUNK_ROWS", "500"))
+BATCH_DELETE_FILES_PER_SECOND = float(
+    os.getenv("BATCH_DELETE_FILES_PER_SECOND", "200"))
+BATCH_DELETE_JOB_TTL_SECONDS = 24 * 3600
+BATCH_DELETE_LOCK_TTL_SECONDS = int(os.getenv("BATCH_DELETE_LOCK_TTL_SECONDS", "60"))
+BATCH_DELETING_STATUS = "deleting"
+
+# Refresh (ttl > 0) or release (ttl 0) the delete lock if this job holds it
+# KEYS: lock
+# ARGV: job_id, ttl
+_DELETE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if tonumber(ARGV[2]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+else
+    redis.call('DEL', KEYS[1])
+end
+return 1
+"""
+
+
+class _DeleteLockLost(Exception):
+    """The delete lock lapsed and another job took the batch over"""
+
+
+def _delete_job_key(job_id: str) -> str:
+    return f"batch:delete_job:{job_id}"
+
+
+def _delete_lock_key(batch_uuid: str) -> str:
+    return f"batch:{batch_uuid}:delete_job"
+
+
+def _delete_previous_status_key(batch_uuid: str) -> str:
+    return f"batch:{batch_uuid}:delete_previous_status"
+
+
+async def _remove_files_rate_limited(paths: List[str], per_second: float) -> int:
+    """
+    Remove files at no more than `per_second` files per second
+
+    Returns:
+        Number of files removed (missing files are not counted)
+    """
+    removed = 0
+    interval = 1.0 / per_second if per_second > 0 else 0.0
+    next_at = time.monotonic()
+
+    for path in paths:
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        next_at = max(next_at, time.monotonic()) + interval
+        try:
+            await asyncio.to_thread(os.remove, path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove {path}: {e}")
+
+    return removed
+
+
+async def _run_batch_delete(
+    job_id: str,
+    batch_uuid: str,
+    batch_int_id: int,
+    sheet_total: int,
+    previous_status: str,
+    username: str
+) -> None:
+    """Background job behind DELETE /{batch_id}"""
+    async_redis = get_async_redis()
+    publisher = ProgressPublisher(async_redis)
+    job_key = _delete_job_key(job_id)
+    lock_key = _delete_lock_key(batch_uuid)
+    sheets_deleted = 0
+    files_removed = 0
+    image_dirs: Set[str] = set()
+    db = None
+
+    async def refresh_lock() -> None:
+        if not await async_redis.eval(
+                _DELETE_LOCK_SCRIPT, 1, lock_key, job_id, BATCH_DELETE_LOCK_TTL_SECONDS):
+            raise _DeleteLockLost()
+
+    async def report(**state) -> None:
+        async with async_redis.pipeline(transaction=False) as pipe:
+            pipe.hset(job_key, mapping={
+                "sheets_deleted": sheets_deleted,
+                "files_removed": files_removed,
+                "updated_at": datetime.now().isoformat(),
+                **state
+            })
+            pipe.expire(job_key, BATCH_DELETE_JOB_TTL_SECONDS)
+            await pipe.execute()
+
+    try:
+        db = await get_async_db()
+        await refresh_lock()
+        await report(status="running")
+        await SheetScheduler(async_redis).cancel(batch_uuid)
+
+        while True:
+            await refresh_lock()
+            rows = await db.execute_query(
+                """
+                SELECT id, image_path
+                FROM omr_sheets
+                WHERE batch_id = %s
+                ORDER BY id
+                LIMIT %s
+                """,
+                (batch_int_id, BATCH_DELETE_CHUNK_ROWS), fetch_all=True) or []
+            if not rows:
+                break
+
+            sheet_ids = [row['id'] for row in rows]
+            placeholders = ", ".join(["%s"] * len(sheet_ids))
+            await db.execute_query(
+                f"DELETE FROM omr_sheets WHERE id IN ({placeholders})",
+                tuple(sheet_ids))
+            sheets_deleted += len(sheet_ids)
+
+            paths = [row['image_path'] for row in rows if row.get('image_path')]
+            image_dirs.update(os.path.dirname(path) for path in paths)
+            image_dirs.update(
+                os.path.join(os.path.dirname(path), DERIVATIVE_DIR) for path in paths)
+            paths += await asyncio.to_thread(lambda: [
+                derivative
+                for path in paths
+                for derivative in (find_derivative(path, part, width)
+                                   for part, _, width in BATCH_DERIVATIVE_SPECS)
+                if derivative
+            ])
+            files_removed += await _remove_files_rate_limited(
+                paths, BATCH_DELETE_FILES_PER_SECOND)
+
+            await report()
+            await publisher.publish_progress(
+                batch_id=batch_uuid,
+                stage=ProcessingStage.CLEANUP,
+                message=f"Deleting batch: {sheets_deleted}/{sheet_total} sheets",
+                progress_percentage=min(
+                    sheets_deleted / sheet_total * 100, 100) if sheet_total else 0,
+                sheets_total=sheet_total,
+                sheets_processed=sheets_deleted
+            )
+
+        await db.execute_query(
+            "DELETE FROM omr_batches WHERE id = %s", (batch_int_id,))
+
+        # Deepest first, so derivative directories go before their parents
+        for image_dir in sorted(image_dirs, key=len, reverse=True):
+            try:
+                await asyncio.to_thread(os.rmdir, image_dir)
+            except OSError:
+                pass
+
+        await BatchSheetCounters(async_redis, db).delete(batch_uuid)
+        await async_redis.delete(
+            derivatives_key(batch_uuid), _delete_previous_status_key(batch_uuid))
+        await report(status="completed")
+        # CLEANUP at 100%, not COMPLETED: clients must not mistake the end
+        # of a deletion for the batch finishing processing. The 'deleted'
+        # event name tells it apart from the pipeline's own cleanup and
+        # closes open streams.
+        await publisher.publish_progress(
+            batch_id=batch_uuid,
+            stage=ProcessingStage.CLEANUP,
+            message=f"Batch deleted ({sheets_deleted} sheets, {files_removed} files)",
+            progress_percentage=100.0,
+            event_type="deleted",
+            sheets_total=sheet_total,
+            sheets_processed=sheets_deleted
+        )
+        logger.info(
+            f"Batch {batch_uuid} deleted by admin {username}: "
+            f"{sheets_deleted} sheets, {files_removed} files")
+
+    except _DeleteLockLost:
+        logger.warning(
+            f"Delete job {job_id} for batch {batch_uuid} lost its lock; "
+            f"another job has taken over")
+        await report(status="superseded")
+    except Exception as e:
+        logger.error(f"Deleting batch {batch_uuid} failed: {e}", exc_info=True)
+        try:
+            await report(status="failed", error=str(e))
+            if db is not None:
+                # The batch row survives a failed deletion; show it again
+                await db.execute_query(
+                    "UPDATE omr_batches SET processing_status = %s "
+                    "WHERE id = %s AND processing_status = %s",
+                    (previous_status, batch_int_id, BATCH_DELETING_STATUS))
+                await async_redis.delete(_delete_previous_status_key(batch_uuid))
+                await bump_batch_version(async_redis, batch_uuid)
+            await publisher.publish_progress(
+                batch_id=batch_uuid,
+                stage=ProcessingStage.FAILED,
+                message="Batch deletion failed",
+                error_details=str(e)
+            )
+        except Exception as report_error:
+            logger.warning(f"Failed to report delete failure: {report_error}")
+    finally:
+        await async_redis.eval(_DELETE_LOCK_SCRIPT, 1, lock_key, job_id, 0)
+
+
+@router.get("/delete-jobs/{job_id}", response_model=dict)
+async def get_delete_job(
+    job_id: str,
+    current_user: CachedUser = Depends(get_cached_current_user),
+    async_redis: aioredis.Redis = Depends(get_async_redis)
+) -> dict:
+    """
+    Get the state of a batch deletion job (Admin only)
+
+    Returns:
+        job_id, batch_id, status (queued/running/completed/failed/superseded),
+        sheets_total, sheets_deleted, files_removed and error if failed
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403,
+            detail="Only administrators can view delete jobs"
+        )
+
+    job = await async_redis.hgetall(_delete_job_key(job_id))
+    if not job:
+        raise HTTPException(404, f"Delete job {job_id} not found")
+
+    for count_field in ("sheets_total", "sheets_deleted", "files_removed"):
+        job[count_field] = int(job.get(count_field, 0))
+    return {"job_id": job_id, **job}
+
+
+@router.delete("/{batch_id}", status_code=202, response_model=dict)
 async def delete_batch(
     batch_id: str,
-    current_user: User = Depends(get_current_user),
-    db: BaseDatabaseService = Depends(get_db)
-):
+    background_tasks: BackgroundTasks,
+    current_user: CachedUser = Depends(get_cached_current_user),
+    db: AsyncDatabase = Depends(get_async_db),
+    async_redis: aioredis.Redis = Depends(get_async_redis)
+) -> dict:
     """
     Delete a batch (Admin only)
 
-    Simple hard delete for cleanup purposes.
-    Future enhancement: Add soft delete with audit trail.
+    Returns 202 with a job ID at once. The batch is marked 'deleting' (and
+    hidden from lists) immediately; sheets, image files and finally the
+    batch row are removed in the background. Progress is published on the
+    batch's progress stream (GET /{batch_id}/stream) and the job state is
+    available from GET /delete-jobs/{job_id}. Deleting a batch that is
+    already being deleted returns the running job.
     """
     # Admin-only endpoint
     if not current_user.is_admin:
@@ -646,10 +1883,10 @@ async def delete_batch(
 
     # Check batch exists
     check_query = """
-        SELECT id FROM omr_batches WHERE batch_uuid = %s
+        SELECT id, sheet_count, processing_status FROM omr_batches WHERE batch_uuid = %s
     """
 
-    result = db.execute_query(check_query, (batch_id,), fetch_one=True)
+    result = await db.execute_query(check_query, (batch_id,), fetch_one=True)
 
     if not result:
         raise HTTPException(
@@ -657,14 +1894,49 @@ async def delete_batch(
             detail=f"Batch {batch_id} not found"
         )
 
-    # Hard delete
-    delete_query = """
-        DELETE FROM omr_batches WHERE batch_uuid = %s
-    """
+    job_id = str(uuid.uuid4())
+    lock_key = _delete_lock_key(batch_id)
+    # A lock left by a dead job lapses within BATCH_DELETE_LOCK_TTL_SECONDS
+    if not await async_redis.set(
+            lock_key, job_id, nx=True, ex=BATCH_DELETE_LOCK_TTL_SECONDS):
+        running_job = await async_redis.get(lock_key)
+        if running_job:
+            return {"job_id": running_job, "batch_id": batch_id, "status": "running"}
+        await async_redis.set(lock_key, job_id, ex=BATCH_DELETE_LOCK_TTL_SECONDS)
+
+    # A takeover keeps the status the batch had before the first attempt
+    previous_status = result['processing_status']
+    previous_status_key = _delete_previous_status_key(batch_id)
+    if previous_status == BATCH_DELETING_STATUS:
+        previous_status = await async_redis.get(previous_status_key) or "failed"
+    else:
+        await async_redis.set(
+            previous_status_key, previous_status, ex=BATCH_DELETE_JOB_TTL_SECONDS)
+    await db.execute_query(
+        "UPDATE omr_batches SET processing_status = %s WHERE id = %s",
+        (BATCH_DELETING_STATUS, result['id']))
+    # Re-uploading the same file must create a new batch from here on
+    await _forget_batch_digest(async_redis, batch_id)
+
+    sheet_total = int(result.get('sheet_count') or 0)
+    job_key = _delete_job_key(job_id)
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.hset(job_key, mapping={
+            "batch_id": batch_id,
+            "status": "queued",
+            "sheets_total": sheet_total,
+            "requested_by": current_user.username,
+            "created_at": datetime.now().isoformat()
+        })
+        pipe.expire(job_key, BATCH_DELETE_JOB_TTL_SECONDS)
+        await pipe.execute()
 
-    db.execute_query(delete_query, (batch_id,),
-                     fetch_one=False, fetch_all=False)
+    background_tasks.add_task(
+        _run_batch_delete, job_id, batch_id, result['id'], sheet_total,
+        previous_status, current_user.username)
+    await bump_batch_version(async_redis, batch_id)
 
-    logger.info(f"Batch {batch_id} deleted by admin {current_user.username}")
+    logger.info(
+        f"Batch {batch_id} deletion queued as job {job_id} by admin {current_user.username}")
 
-    return None
+    return {"job_id": job_id, "batch_id": batch_id, "status": "queued"}
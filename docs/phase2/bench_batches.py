@@ -0,0 +1,507 @@
+"""
+Batches API benchmark harness
+
+Runs the /api/batches router in-process against local stand-ins and
+measures the scenarios that matter in production:
+
+- upload:  parallel /upload-chunk of a multi-GB file
+- stream:  hundreds of /{batch_id}/stream SSE clients during a
+           5,000-sheet progress burst
+- poll:    polling storms on /{batch_id}/progress and / (with and
+           without If-None-Match)
+
+Redis is replaced by an in-process fakeredis server (Lua, Streams and
+pub/sub included). MySQL/MariaDB is a local database that the harness
+creates and seeds with synthetic omr_batches/omr_sheets rows; it is never
+pointed at a real deployment. Batch submission (jobs.submit_unified) is
+replaced by a no-op so only the batches router is measured.
+
+Each scenario reports p50/p99 latency, throughput and its own peak RSS,
+sampled by a background thread while that scenario runs. Results can be
+saved as a baseline and later runs compared against it.
+
+The harness empties omr_batches/omr_sheets of the database it uses, so it
+refuses to run unless the database name ends in "_bench".
+
+Usage (from the API repository root):
+    pip install fakeredis[lua] httpx
+    BENCH_MYSQL_HOST=127.0.0.1 BENCH_MYSQL_DATABASE=omr_bench \\
+        python docs/phase2/bench_batches.py --save-baseline bench.json
+    python docs/phase2/bench_batches.py --baseline bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import aiomysql
+import httpx
+import redis.asyncio as aioredis
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeConnection
+from fastapi import FastAPI
+
+# The upload service reads its staging directory at import time; keep the
+# benchmark's multi-GB uploads out of the real one
+os.environ.setdefault(
+    "BATCH_UPLOAD_STAGING_DIR", tempfile.mkdtemp(prefix="bench_batches_staging_"))
+
+import src.api.routers.jobs as jobs  # noqa: E402
+from src.api.dependencies import get_db, get_redis  # noqa: E402
+from src.api.models.responses import JobSubmitResponse  # noqa: E402
+from src.api.routers import batches  # noqa: E402
+from src.api.services import async_pools  # noqa: E402
+from src.domains.auth.user_cache import CachedUser, get_cached_current_user  # noqa: E402
+
+BENCH_USER_ID = 1
+BENCH_DATABASE = os.getenv("BENCH_MYSQL_DATABASE", "omr_bench")
+BENCH_RSS_SAMPLE_SECONDS = 0.02
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS omr_batches (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        batch_uuid VARCHAR(36) NOT NULL UNIQUE,
+        uploaded_by INT NOT NULL,
+        upload_filename VARCHAR(255),
+        upload_type VARCHAR(20),
+        processing_status VARCHAR(20) NOT NULL,
+        sheet_count INT DEFAULT 0,
+        file_size_bytes BIGINT DEFAULT 0,
+        uploaded_at DATETIME NOT NULL,
+        processing_started_at DATETIME NULL,
+        processing_completed_at DATETIME NULL,
+        error_message TEXT NULL,
+        description TEXT NULL,
+        INDEX idx_uploaded (uploaded_by, uploaded_at, id),
+        INDEX idx_status (processing_status)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS omr_sheets (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        batch_id INT NOT NULL,
+        sheet_uuid VARCHAR(36) NOT NULL,
+        processing_status VARCHAR(20) NOT NULL,
+        sequence_number INT NOT NULL,
+        error_message TEXT NULL,
+        image_path VARCHAR(500) NULL,
+        INDEX idx_batch_status (batch_id, processing_status)
+    )
+    """,
+)
+
+
+# ---------------------------------------------------------------------------
+# Stand-ins
+# ---------------------------------------------------------------------------
+
+async def _open_bench_db() -> aiomysql.Pool:
+    """Create the bench schema on a local MySQL and return a pool for it"""
+    # The tables are emptied below; never do that to a non-bench database
+    if not BENCH_DATABASE.endswith("_bench"):
+        raise SystemExit(
+            f"Refusing to use database {BENCH_DATABASE!r}: the benchmark deletes "
+            f"all batches and sheets, so its name must end in '_bench'")
+
+    pool = await aiomysql.create_pool(
+        host=os.getenv("BENCH_MYSQL_HOST", "127.0.0.1"),
+        port=int(os.getenv("BENCH_MYSQL_PORT", "3306")),
+        user=os.getenv("BENCH_MYSQL_USER", "root"),
+        password=os.getenv("BENCH_MYSQL_PASSWORD", ""),
+        db=BENCH_DATABASE,
+        minsize=1,
+        maxsize=async_pools.BATCH_DB_POOL_MAX,
+        autocommit=True,
+        charset="utf8mb4"
+    )
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            for statement in _SCHEMA:
+                await cursor.execute(statement)
+            await cursor.execute("DELETE FROM omr_sheets")
+            await cursor.execute("DELETE FROM omr_batches")
+    return pool
+
+
+async def _seed(pool: aiomysql.Pool, batch_count: int, big_batch_sheets: int) -> str:
+    """
+    Insert synthetic batches and one large batch with sheets
+
+    Returns:
+        UUID of the large batch
+    """
+    now = datetime.now()
+    statuses = ("completed", "completed", "completed", "failed", "processing")
+    rows = [
+        (str(uuid.uuid4()), BENCH_USER_ID, f"bench-{i}.zip", "zip_no_qr",
+         statuses[i % len(statuses)], 300, 300 * 2_000_000,
+         now - timedelta(minutes=i))
+        for i in range(batch_count)
+    ]
+    big_batch_uuid = str(uuid.uuid4())
+    rows.append((big_batch_uuid, BENCH_USER_ID, "bench-big.zip", "zip_no_qr",
+                 "processing", big_batch_sheets, big_batch_sheets * 2_000_000, now))
+
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.executemany(
+                """
+                INSERT INTO omr_batches
+                    (batch_uuid, uploaded_by, upload_filename, upload_type,
+                     processing_status, sheet_count, file_size_bytes, uploaded_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                """, rows)
+            await cursor.execute(
+                "SELECT id FROM omr_batches WHERE batch_uuid = %s", (big_batch_uuid,))
+            (big_batch_id,) = await cursor.fetchone()
+            await cursor.executemany(
+                """
+                INSERT INTO omr_sheets
+                    (batch_id, sheet_uuid, processing_status, sequence_number, image_path)
+                VALUES (%s, %s, %s, %s, %s)
+                """,
+                [(big_batch_id, str(uuid.uuid4()), "pending", n, f"/tmp/bench/{n}.jpg")
+                 for n in range(big_batch_sheets)])
+
+    return big_batch_uuid
+
+
+def _build_app(redis_server: FakeServer, db_pool: aiomysql.Pool) -> FastAPI:
+    """The batches router wired to the stand-ins"""
+    async def fake_submit_unified(**kwargs) -> JobSubmitResponse:
+        return JobSubmitResponse(
+            batch_id=str(uuid.uuid4()), status="queued",
+            message="Batch submitted for processing")
+
+    # The shared pools back module-level callers (fan-out, background jobs)
+    # and dependencies alike
+    async_pools._async_redis_pool = aioredis.BlockingConnectionPool(
+        connection_class=FakeConnection, server=redis_server, decode_responses=True,
+        max_connections=async_pools.BATCH_REDIS_MAX_CONNECTIONS)
+    async_pools._async_db_pool = db_pool
+    jobs.submit_unified = fake_submit_unified
+
+    app = FastAPI()
+    app.include_router(batches.router)
+    app.dependency_overrides[get_cached_current_user] = lambda: CachedUser(
+        user_id=BENCH_USER_ID, username="bench", is_admin=True)
+    app.dependency_overrides[get_redis] = lambda: None
+    app.dependency_overrides[get_db] = lambda: None
+    return app
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def _current_rss_mb() -> float:
+    """Resident set size now; the process-wide peak where /proc is missing"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class _RssSampler:
+    """
+    Peak RSS since the last reset, sampled by a daemon thread
+
+    ru_maxrss is a high-water mark for the whole process, so every scenario
+    after the multi-GB upload would report the upload's peak. Each scenario
+    resets the sampler before it starts and reads its own peak.
+    """
+
+    def __init__(self, interval: float = BENCH_RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self._peak = 0.0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def start(self) -> None:
+        self.reset()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._peak = _current_rss_mb()
+
+    def peak_mb(self) -> float:
+        rss = _current_rss_mb()
+        with self._lock:
+            self._peak = max(self._peak, rss)
+            return self._peak
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.peak_mb()
+
+
+_rss_sampler = _RssSampler()
+
+
+def _summarize(latencies: List[float], elapsed: float, units: float, unit: str) -> dict:
+    """p50/p99 latency (ms), throughput and peak RSS (since the last reset)"""
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p99 = cuts[49], cuts[98]
+    else:
+        p50 = p99 = latencies[0] if latencies else 0.0
+    return {
+        "samples": len(latencies),
+        "p50_ms": round(p50 * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+        "throughput": round(units / elapsed, 2) if elapsed > 0 else 0.0,
+        "throughput_unit": unit,
+        "peak_rss_mb": round(_rss_sampler.peak_mb(), 1)
+    }
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+async def bench_upload(client: httpx.AsyncClient, args) -> dict:
+    """Parallel /upload-chunk of one file of --upload-mb megabytes"""
+    chunk_size = args.chunk_mb * 1024 * 1024
+    total_chunks = max(1, args.upload_mb // args.chunk_mb)
+    payload = os.urandom(chunk_size)
+    form = {
+        "total_chunks": str(total_chunks),
+        "filename": "bench.zip",
+        "upload_type": "zip_no_qr",
+        "task_id": "11600111",
+        "part_size": str(chunk_size),
+        "total_size": str(chunk_size * total_chunks),
+    }
+
+    async def send(index: int, upload_id: str = None) -> str:
+        data = dict(form, chunk_index=str(index))
+        if upload_id:
+            data["upload_id"] = upload_id
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/batches/upload-chunk", data=data,
+            files={"chunk": ("chunk", payload, "application/octet-stream")})
+        latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+        return response.json()["upload_id"]
+
+    latencies: List[float] = []
+    _rss_sampler.reset()
+    started = time.perf_counter()
+    upload_id = await send(0)
+
+    semaphore = asyncio.Semaphore(args.upload_parallel)
+
+    async def send_limited(index: int) -> None:
+        async with semaphore:
+            await send(index, upload_id)
+
+    await asyncio.gather(*(send_limited(i) for i in range(1, total_chunks)))
+    elapsed = time.perf_counter() - started
+
+    return _summarize(latencies, elapsed, chunk_size * total_chunks / 1e6, "MB/s")
+
+
+async def bench_stream(client: httpx.AsyncClient, args, batch_uuid: str) -> dict:
+    """SSE clients on one batch while a progress burst is published"""
+    publisher = batches.ProgressPublisher(batches.get_async_redis())
+    latencies: List[float] = []
+    connected = asyncio.Event()
+    ready = 0
+
+    async def sse_client() -> int:
+        nonlocal ready
+        received = 0
+        async with client.stream("GET", f"/api/batches/{batch_uuid}/stream") as response:
+            ready += 1
+            if ready == args.sse_clients:
+                connected.set()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:])
+                if "timestamp" in event:
+                    latencies.append(
+                        datetime.now().timestamp()
+                        - datetime.fromisoformat(event["timestamp"]).timestamp())
+                received += 1
+                if event.get("stage") == "completed":
+                    break
+        return received
+
+    _rss_sampler.reset()
+    clients = [asyncio.create_task(sse_client()) for _ in range(args.sse_clients)]
+    await asyncio.wait_for(connected.wait(), timeout=60)
+
+    started = time.perf_counter()
+    for processed in range(1, args.burst_sheets + 1):
+        await publisher.publish_progress(
+            batch_id=batch_uuid,
+            stage=batches.ProcessingStage.PROCESSING_SHEETS,
+            message=f"Processing: {processed}/{args.burst_sheets} sheets completed",
+            progress_percentage=processed / args.burst_sheets * 100,
+            sheets_total=args.burst_sheets,
+            sheets_processed=processed
+        )
+    await publisher.publish_progress(
+        batch_id=batch_uuid,
+        stage=batches.ProcessingStage.COMPLETED,
+        message="Batch completed",
+        progress_percentage=100.0,
+        sheets_total=args.burst_sheets,
+        sheets_processed=args.burst_sheets
+    )
+
+    delivered = sum(await asyncio.gather(*clients))
+    elapsed = time.perf_counter() - started
+    await batches.progress_fanout.stop()
+
+    return _summarize(latencies, elapsed, delivered, "events/s")
+
+
+async def bench_poll(client: httpx.AsyncClient, args, batch_uuid: str) -> Dict[str, dict]:
+    """Polling storms on /{batch_id}/progress and /, cold and conditional"""
+    results = {}
+
+    for name, path in (("poll_progress", f"/api/batches/{batch_uuid}/progress"),
+                       ("poll_list", "/api/batches/")):
+        for conditional in (False, True):
+            etag = (await client.get(path)).headers.get("etag")
+            headers = {"If-None-Match": etag} if conditional and etag else {}
+            latencies: List[float] = []
+            semaphore = asyncio.Semaphore(args.poll_concurrency)
+
+            async def poll() -> None:
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(path, headers=headers)
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code not in (200, 304):
+                        response.raise_for_status()
+
+            _rss_sampler.reset()
+            started = time.perf_counter()
+            await asyncio.gather(*(poll() for _ in range(args.poll_requests)))
+            elapsed = time.perf_counter() - started
+
+            key = f"{name}_304" if conditional else name
+            results[key] = _summarize(latencies, elapsed, args.poll_requests, "req/s")
+
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------------
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Regressions of results against baseline
+
+    Latency and RSS regress when they grow, throughput when it shrinks, by
+    more than `tolerance` (a fraction).
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        for metric, higher_is_worse in (("p50_ms", True), ("p99_ms", True),
+                                        ("peak_rss_mb", True), ("throughput", False)):
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change if higher_is_worse else -change) > tolerance:
+                regressions.append(
+                    f"{scenario}.{metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+async def run(args) -> dict:
+    redis_server = FakeServer()
+    db_pool = await _open_bench_db()
+    _rss_sampler.start()
+    try:
+        batch_uuid = await _seed(db_pool, args.batches, args.burst_sheets)
+        app = _build_app(redis_server, db_pool)
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench", timeout=None) as client:
+            results = {}
+            if "upload" in args.scenarios:
+                results["upload"] = await bench_upload(client, args)
+            if "stream" in args.scenarios:
+                results["stream"] = await bench_stream(client, args, batch_uuid)
+            if "poll" in args.scenarios:
+                results.update(await bench_poll(client, args, batch_uuid))
+        return results
+    finally:
+        _rss_sampler.stop()
+        db_pool.close()
+        await db_pool.wait_closed()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--scenarios", nargs="+", default=["upload", "stream", "poll"],
+                        choices=["upload", "stream", "poll"])
+    parser.add_argument("--upload-mb", type=int, default=2048)
+    parser.add_argument("--chunk-mb", type=int, default=50)
+    parser.add_argument("--upload-parallel", type=int, default=4)
+    parser.add_argument("--sse-clients", type=int, default=200)
+    parser.add_argument("--burst-sheets", type=int, default=5000)
+    parser.add_argument("--batches", type=int, default=500,
+                        help="Synthetic batches to seed besides the large one")
+    parser.add_argument("--poll-requests", type=int, default=5000)
+    parser.add_argument("--poll-concurrency", type=int, default=100)
+    parser.add_argument("--baseline", help="Compare against this results file")
+    parser.add_argument("--save-baseline", help="Write results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed regression as a fraction (default 0.10)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("No regressions against baseline")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1194 @@
+"""
+Chunked upload staging service
+
+Positional (pwrite) chunk uploads with sessions shared through Redis, the
+staging disk budget and janitor, and streaming extraction of 'images' ZIP
+uploads while their chunks are still arriving. Used by the batches router.
+"""
+
+import asyncio
+import errno
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import struct
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import redis.asyncio as aioredis
+from fastapi import HTTPException, UploadFile
+
+try:
+    import crc32c
+except ImportError:  # CRC32C chunk checks need the optional crc32c package
+    crc32c = None
+
+from src.api.models.responses import ProcessingStage
+from src.api.services.progress_publisher import ProgressPublisher
+
+logger = logging.getLogger(__name__)
+
+# Chunked uploads are written straight into a preallocated staging file at
+# each chunk's offset, so chunks may arrive in any order and there is no
+# separate reassembly pass when the last one lands.
+#
+# Session metadata lives in Redis and chunk data in BATCH_UPLOAD_STAGING_DIR,
+# so with the staging dir on shared storage (CephFS) any worker on any node
+# can accept any chunk of any upload.
+BATCH_UPLOAD_STAGING_DIR = os.getenv(
+    "BATCH_UPLOAD_STAGING_DIR", "/dev/shm/omr/chunk_upload")
+BATCH_UPLOAD_SESSION_TTL_SECONDS = int(
+    os.getenv("BATCH_UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+_CHUNK_WRITE_BLOCK = 4 * 1024 * 1024
+
+# Staging disk budget. Every upload session reserves its declared size
+# (twice that for 'images' uploads, which are also extracted) against a
+# global and a per-user budget before its staging file is created; the
+# reservation is released when the upload is cleaned up. Uploads that do
+# not fit are refused with 429 and Retry-After instead of failing midway
+# with ENOSPC. 0 budgets derive from the staging filesystem size.
+BATCH_UPLOAD_STAGING_BUDGET_BYTES = int(os.getenv("BATCH_UPLOAD_STAGING_BUDGET_BYTES", "0"))
+BATCH_UPLOAD_USER_BUDGET_BYTES = int(os.getenv("BATCH_UPLOAD_USER_BUDGET_BYTES", "0"))
+BATCH_UPLOAD_MIN_FREE_BYTES = int(
+    os.getenv("BATCH_UPLOAD_MIN_FREE_BYTES", str(1024 * 1024 * 1024)))
+BATCH_UPLOAD_RETRY_AFTER_SECONDS = int(os.getenv("BATCH_UPLOAD_RETRY_AFTER_SECONDS", "60"))
+BATCH_UPLOAD_IDLE_TTL_SECONDS = int(os.getenv("BATCH_UPLOAD_IDLE_TTL_SECONDS", str(2 * 3600)))
+BATCH_UPLOAD_JANITOR_INTERVAL_SECONDS = int(
+    os.getenv("BATCH_UPLOAD_JANITOR_INTERVAL_SECONDS", "300"))
+
+_STAGING_TOTAL_KEY = "upload:staging:total"
+_STAGING_USERS_KEY = "upload:staging:users"
+_STAGING_RESERVATIONS_KEY = "upload:staging:reservations"
+
+# ARGV: upload_id, user_id, bytes, global budget, user budget
+# Returns {admitted, global bytes, user bytes}
+_RESERVE_STAGING_SCRIPT = """
+local total = tonumber(redis.call('GET', KEYS[1]) or '0')
+local user_bytes = tonumber(redis.call('HGET', KEYS[2], ARGV[2]) or '0')
+local size = tonumber(ARGV[3])
+if total + size > tonumber(ARGV[4]) or user_bytes + size > tonumber(ARGV[5]) then
+    return {0, total, user_bytes}
+end
+redis.call('INCRBY', KEYS[1], ARGV[3])
+redis.call('HINCRBY', KEYS[2], ARGV[2], ARGV[3])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[2] .. '|' .. ARGV[3])
+return {1, total + size, user_bytes + size}
+"""
+
+# ARGV: upload_id. Returns released bytes
+_RELEASE_STAGING_SCRIPT = """
+local reservation = redis.call('HGET', KEYS[3], ARGV[1])
+if not reservation then
+    return 0
+end
+local sep = string.find(reservation, '|', 1, true)
+local user = string.sub(reservation, 1, sep - 1)
+local size = string.sub(reservation, sep + 1)
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('DECRBY', KEYS[1], size)
+if tonumber(redis.call('HINCRBY', KEYS[2], user, '-' .. size)) <= 0 then
+    redis.call('HDEL', KEYS[2], user)
+end
+return tonumber(size)
+"""
+
+
+def _staging_budgets(staging_dir: str) -> tuple:
+    """(global budget, per-user budget) in bytes"""
+    budget = BATCH_UPLOAD_STAGING_BUDGET_BYTES
+    if budget <= 0:
+        budget = int(shutil.disk_usage(staging_dir).total * 0.8)
+    user_budget = BATCH_UPLOAD_USER_BUDGET_BYTES or budget // 2
+    return budget, user_budget
+
+
+def _staging_reservation_bytes(
+    upload_type: str,
+    total_chunks: int,
+    part_size: int,
+    total_size: Optional[int]
+) -> int:
+    size = total_size or total_chunks * part_size
+    return size * 2 if upload_type == 'images' else size
+
+
+def _staging_full(message: str) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=message,
+        headers={"Retry-After": str(BATCH_UPLOAD_RETRY_AFTER_SECONDS)}
+    )
+
+
+async def reserve_staging(
+    async_redis: aioredis.Redis,
+    staging_dir: str,
+    upload_id: str,
+    user_id: Any,
+    size: int
+) -> None:
+    """
+    Admit an upload of `size` bytes against the staging budgets
+
+    Raises:
+        HTTPException 429 (with Retry-After) if it does not fit
+    """
+    budget, user_budget = _staging_budgets(staging_dir)
+    admitted, used, user_used = await async_redis.eval(
+        _RESERVE_STAGING_SCRIPT, 3,
+        _STAGING_TOTAL_KEY, _STAGING_USERS_KEY, _STAGING_RESERVATIONS_KEY,
+        upload_id, str(user_id), size, budget, user_budget)
+
+    if not admitted:
+        if user_used + size > user_budget:
+            raise _staging_full(
+                f"Upload staging limit reached for this user "
+                f"({user_used / 1e9:.1f} of {user_budget / 1e9:.1f} GB in use); "
+                f"finish or cancel other uploads, or retry later")
+        raise _staging_full(
+            f"Upload staging is full ({used / 1e9:.1f} of {budget / 1e9:.1f} GB "
+            f"in use); retry later")
+
+    # The budget may not account for everything on the volume
+    if shutil.disk_usage(staging_dir).free - size < BATCH_UPLOAD_MIN_FREE_BYTES:
+        await release_staging(async_redis, upload_id)
+        raise _staging_full("Not enough free space for upload staging; retry later")
+
+
+async def release_staging(async_redis: aioredis.Redis, upload_id: str) -> int:
+    """Return an upload's reservation to the budgets; returns bytes released"""
+    return await async_redis.eval(
+        _RELEASE_STAGING_SCRIPT, 3,
+        _STAGING_TOTAL_KEY, _STAGING_USERS_KEY, _STAGING_RESERVATIONS_KEY,
+        upload_id)
+
+
+async def get_staging_usage(
+    async_redis: aioredis.Redis,
+    staging_dir: str = BATCH_UPLOAD_STAGING_DIR
+) -> dict:
+    """Reserved staging bytes, globally and per user, against the budgets"""
+    async with async_redis.pipeline(transaction=False) as pipe:
+        pipe.get(_STAGING_TOTAL_KEY)
+        pipe.hgetall(_STAGING_USERS_KEY)
+        pipe.hlen(_STAGING_RESERVATIONS_KEY)
+        used, per_user, uploads = await pipe.execute()
+
+    os.makedirs(staging_dir, exist_ok=True)
+    budget, user_budget = _staging_budgets(staging_dir)
+    return {
+        "reserved_bytes": int(used or 0),
+        "budget_bytes": budget,
+        "user_budget_bytes": user_budget,
+        "free_bytes": shutil.disk_usage(staging_dir).free,
+        "uploads": uploads,
+        "users": {user: int(size) for user, size in per_user.items()}
+    }
+
+
+# Record a received chunk and decide completion atomically: exactly one
+# request, on whichever worker, sees completes=1 for an upload.
+# KEYS: chunks hash, completing flag, meta hash, digests hash
+# ARGV: chunk_index, chunk_length, total_chunks, ttl, completer id, now,
+#       chunk sha256
+_RECORD_CHUNK_SCRIPT = """
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[4], ARGV[1], ARGV[7])
+local received = redis.call('HLEN', KEYS[1])
+local completes = 0
+if received == tonumber(ARGV[3]) then
+    if redis.call('SET', KEYS[2], ARGV[5], 'NX', 'EX', ARGV[4]) then
+        completes = 1
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[3], ARGV[4])
+redis.call('EXPIRE', KEYS[4], ARGV[4])
+redis.call('HSET', KEYS[3], 'updated_at', ARGV[6])
+return {received, completes}
+"""
+
+
+def _upload_keys(upload_id: str) -> tuple:
+    """Redis keys of an upload: (meta, chunks, completing flag, digests)"""
+    prefix = f"upload:{upload_id}"
+    return (f"{prefix}:meta", f"{prefix}:chunks", f"{prefix}:completing",
+            f"{prefix}:digests")
+
+
+def upload_composite_digest(chunk_digests: List[str]) -> str:
+    """
+    Whole-file digest of a chunked upload, built from per-chunk SHA-256s
+
+    SHA-256 over the concatenated raw chunk digests in index order, so it is
+    available at completion without reading the file again. Clients compute
+    the same value from their chunk digests to verify the whole upload.
+    """
+    combined = hashlib.sha256()
+    for digest in chunk_digests:
+        combined.update(bytes.fromhex(digest))
+    return combined.hexdigest()
+
+
+def _chunk_location_key(user_id: int, digest: str) -> str:
+    # Scoped per user: a shared index would reveal whether other users hold
+    # a file and let anyone who knows a digest copy its bytes
+    return f"upload:chunk:{user_id}:{digest}"
+
+
+def _copy_verified_range(
+    source_path: str,
+    source_offset: int,
+    length: int,
+    dest_path: str,
+    dest_offset: int,
+    digest: str
+) -> bool:
+    """
+    Copy a byte range between staging files and check its SHA-256
+
+    Uses copy_file_range (no round-trip through user space) where the
+    filesystem allows it, pread/pwrite otherwise. Returns False if the
+    source is gone or its bytes no longer match the digest.
+    """
+    try:
+        with open(source_path, 'rb') as src, open(dest_path, 'r+b') as dst:
+            if os.fstat(src.fileno()).st_size < source_offset + length:
+                return False
+
+            copied = 0
+            while copied < length:
+                try:
+                    n = os.copy_file_range(
+                        src.fileno(), dst.fileno(), length - copied,
+                        source_offset + copied, dest_offset + copied)
+                except OSError:
+                    block = os.pread(
+                        src.fileno(), min(_CHUNK_WRITE_BLOCK, length - copied),
+                        source_offset + copied)
+                    n = os.pwrite(dst.fileno(), block, dest_offset + copied)
+                if n == 0:
+                    return False
+                copied += n
+
+            sha256 = hashlib.sha256()
+            verified = 0
+            while verified < length:
+                block = os.pread(
+                    dst.fileno(), min(_CHUNK_WRITE_BLOCK, length - verified),
+                    dest_offset + verified)
+                if not block:
+                    return False
+                sha256.update(block)
+                verified += len(block)
+            return sha256.hexdigest() == digest
+    except OSError:
+        return False
+
+
+def _write_block(fd: int, block: memoryview, position: int, sha256, crc) -> int:
+    """pwrite one block and fold it into the chunk checksums (worker thread)"""
+    sha256.update(block)
+    if crc is not None:
+        crc[0] = crc32c.crc32c(block, crc[0])
+
+    written = 0
+    while written < len(block):
+        written += os.pwrite(fd, block[written:], position + written)
+    return written
+
+
+@dataclass
+class UploadSession:
+    """State of one chunked upload"""
+    upload_id: str
+    user_id: int
+    filename: str
+    upload_type: str
+    task_id: Optional[str]
+    total_chunks: int
+    part_size: int
+    total_size: Optional[int]
+    path: str
+    upload_digest: Optional[str] = None
+    chunk_lengths: Dict[int, int] = field(default_factory=dict)
+    chunk_digests: Dict[int, str] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def bytes_received(self) -> int:
+        return sum(self.chunk_lengths.values())
+
+    def to_redis(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "filename": self.filename,
+            "upload_type": self.upload_type,
+            "task_id": self.task_id or "",
+            "total_chunks": self.total_chunks,
+            "part_size": self.part_size,
+            "total_size": self.total_size or "",
+            "path": self.path,
+            "upload_digest": self.upload_digest or "",
+            "created_at": int(self.created_at),
+            "updated_at": int(self.updated_at)
+        }
+
+    @classmethod
+    def from_redis(
+        cls,
+        upload_id: str,
+        meta: dict,
+        chunks: dict,
+        digests: dict
+    ) -> "UploadSession":
+        return cls(
+            upload_id=upload_id,
+            user_id=int(meta["user_id"]),
+            filename=meta["filename"],
+            upload_type=meta["upload_type"],
+            task_id=meta["task_id"] or None,
+            total_chunks=int(meta["total_chunks"]),
+            part_size=int(meta["part_size"]),
+            total_size=int(meta["total_size"]) if meta["total_size"] else None,
+            path=meta["path"],
+            upload_digest=meta.get("upload_digest") or None,
+            chunk_lengths={int(k): int(v) for k, v in chunks.items()},
+            chunk_digests={int(k): v for k, v in digests.items()},
+            created_at=float(meta["created_at"]),
+            updated_at=float(meta["updated_at"])
+        )
+
+    def manifest(self) -> dict:
+        """Received and missing chunk indices, for resuming the upload"""
+        received = sorted(self.chunk_lengths)
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "upload_type": self.upload_type,
+            "total_chunks": self.total_chunks,
+            "part_size": self.part_size,
+            "total_size": self.total_size,
+            "received_chunks": received,
+            "missing_chunks": sorted(
+                set(range(self.total_chunks)) - set(received)),
+            "bytes_received": self.bytes_received,
+            "chunk_sha256": {str(i): self.chunk_digests[i]
+                             for i in received if i in self.chunk_digests},
+            "is_complete": len(received) == self.total_chunks
+        }
+
+
+@dataclass
+class ChunkWriteResult:
+    """Outcome of writing one chunk"""
+    upload_id: str
+    chunk_index: int
+    chunk_size: int
+    chunks_received: int
+    total_chunks: int
+    is_complete: bool
+    reassembled_path: Optional[str] = None
+    file_digest: Optional[str] = None
+
+
+class PositionalChunkUploadService:
+    """
+    Chunked upload staging with positional (pwrite) chunk writes
+
+    The first request creates a session and preallocates the target file
+    when the total size is declared. Every chunk is written at
+    chunk_index * part_size as it arrives; the upload is complete once every
+    index has been received, in whatever order. Session state is kept in
+    Redis so every worker process and node shares it.
+    """
+
+    def __init__(
+        self,
+        redis_factory: Callable[[], aioredis.Redis],
+        staging_dir: str = BATCH_UPLOAD_STAGING_DIR
+    ):
+        self.redis_factory = redis_factory
+        self.staging_dir = staging_dir
+
+    async def get_session(self, upload_id: str) -> Optional[UploadSession]:
+        """Load an upload session from Redis"""
+        meta_key, chunks_key, _, digests_key = _upload_keys(upload_id)
+
+        async with self.redis_factory().pipeline(transaction=False) as pipe:
+            pipe.hgetall(meta_key)
+            pipe.hgetall(chunks_key)
+            pipe.hgetall(digests_key)
+            meta, chunks, digests = await pipe.execute()
+
+        if not meta:
+            return None
+        return UploadSession.from_redis(upload_id, meta, chunks, digests)
+
+    async def process_chunk(
+        self,
+        chunk: UploadFile,
+        upload_id: Optional[str],
+        chunk_index: int,
+        total_chunks: int,
+        filename: str,
+        upload_type: str,
+        task_id: Optional[str],
+        user_id: int,
+        part_size: Optional[int] = None,
+        total_size: Optional[int] = None,
+        chunk_sha256: Optional[str] = None,
+        chunk_crc32c: Optional[str] = None,
+        upload_digest: Optional[str] = None
+    ) -> ChunkWriteResult:
+        """
+        Write one chunk at its offset in the staging file
+
+        Args:
+            chunk: Chunk data
+            upload_id: Existing upload ID, or None to start a new upload
+            chunk_index: Zero-based chunk index
+            total_chunks: Total number of chunks
+            filename: Original filename
+            upload_type: Upload strategy
+            task_id: Optional 8-digit task ID
+            user_id: Uploading user
+            part_size: Size of every chunk but the last (defaults to the
+                size of chunk 0)
+            total_size: Declared total file size, used to preallocate
+            chunk_sha256: Expected SHA-256 of the chunk (hex)
+            chunk_crc32c: Expected CRC32C of the chunk (hex)
+            upload_digest: Expected upload_composite_digest of the whole file
+
+        Returns:
+            ChunkWriteResult; reassembled_path is set for exactly one request
+            per upload, across all workers: the one that completes it
+        """
+        if total_chunks < 1 or not 0 <= chunk_index < total_chunks:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid chunk_index {chunk_index} (total: {total_chunks})"
+            )
+
+        chunk_length = chunk.size
+        if chunk_length is None:
+            chunk.file.seek(0, 2)
+            chunk_length = chunk.file.tell()
+            chunk.file.seek(0)
+
+        session = await self._get_or_create_session(
+            upload_id, chunk_index, chunk_length, total_chunks, filename,
+            upload_type, task_id, user_id, part_size, total_size)
+
+        is_last = chunk_index == session.total_chunks - 1
+        if (not is_last and chunk_length != session.part_size) or \
+                (is_last and chunk_length > session.part_size):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Chunk {chunk_index} is {chunk_length} bytes, expected "
+                       f"{'at most ' if is_last else ''}{session.part_size}"
+            )
+
+        offset = chunk_index * session.part_size
+        if session.total_size is not None and offset + chunk_length > session.total_size:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Chunk {chunk_index} extends past declared total_size"
+            )
+
+        expected_crc = None
+        if chunk_crc32c:
+            if crc32c is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail="CRC32C verification is not available; send chunk_sha256"
+                )
+            try:
+                expected_crc = int(chunk_crc32c, 16)
+            except ValueError:
+                raise HTTPException(
+                    status_code=400, detail="chunk_crc32c must be hex")
+
+        # Checksums are computed in the same pass that writes the chunk
+        sha256, crc = await self._write_at(
+            session.path, chunk, offset, with_crc32c=expected_crc is not None)
+
+        async_redis = self.redis_factory()
+        meta_key, chunks_key, completing_key, digests_key = _upload_keys(
+            session.upload_id)
+
+        mismatch = None
+        if chunk_sha256 and sha256 != chunk_sha256.lower():
+            mismatch = "SHA-256"
+        elif expected_crc is not None and crc != expected_crc:
+            mismatch = "CRC32C"
+        if mismatch:
+            # The bad bytes may have overwritten a previously verified copy
+            # of this chunk, so it must no longer count as received
+            async with async_redis.pipeline(transaction=False) as pipe:
+                pipe.hdel(chunks_key, chunk_index)
+                pipe.hdel(digests_key, chunk_index)
+                await pipe.execute()
+            raise HTTPException(
+                status_code=422,
+                detail=f"Chunk {chunk_index} {mismatch} mismatch; re-send this chunk"
+            )
+
+        if upload_digest:
+            await async_redis.hset(meta_key, "upload_digest", upload_digest.lower())
+
+        chunks_received, completes = await async_redis.eval(
+            _RECORD_CHUNK_SCRIPT, 4, chunks_key, completing_key, meta_key, digests_key,
+            chunk_index, chunk_length, session.total_chunks,
+            BATCH_UPLOAD_SESSION_TTL_SECONDS, f"{os.uname().nodename}:{os.getpid()}",
+            int(time.time()), sha256)
+
+        await self._remember_chunk(
+            session.user_id, sha256, session.path, offset, chunk_length)
+
+        reassembled_path = None
+        file_digest = None
+        if completes:
+            completed = await self.get_session(session.upload_id)
+            final_size = completed.bytes_received
+            if session.total_size is not None and final_size != session.total_size:
+                await async_redis.delete(completing_key)
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Received {final_size} bytes, declared {session.total_size}"
+                )
+
+            file_digest = upload_composite_digest(
+                [completed.chunk_digests[i] for i in range(completed.total_chunks)])
+            if completed.upload_digest and completed.upload_digest != file_digest:
+                await async_redis.delete(completing_key)
+                raise HTTPException(
+                    status_code=422,
+                    detail="Upload digest mismatch; check chunk_sha256 in the manifest"
+                )
+
+            await async_redis.hset(meta_key, "file_digest", file_digest)
+            logger.info(
+                f"Upload {session.upload_id} complete: {final_size} bytes, digest {file_digest}")
+
+            os.truncate(session.path, final_size)
+            reassembled_path = session.path
+
+        return ChunkWriteResult(
+            upload_id=session.upload_id,
+            chunk_index=chunk_index,
+            chunk_size=chunk_length,
+            chunks_received=chunks_received,
+            total_chunks=session.total_chunks,
+            is_complete=chunks_received == session.total_chunks,
+            reassembled_path=reassembled_path,
+            file_digest=file_digest
+        )
+
+    async def reuse_chunks(
+        self,
+        session: UploadSession,
+        chunk_digests: List[str]
+    ) -> List[int]:
+        """
+        Fill chunks the server already holds from the user's other staged uploads
+
+        Each reusable chunk is copied server-side with copy_file_range,
+        re-verified against its SHA-256 and recorded as received. At most
+        total_chunks - 1 chunks are reused so the client's last upload
+        request is the one that completes (and submits) the upload.
+
+        Args:
+            session: Newly created upload session
+            chunk_digests: Client-declared SHA-256 of every chunk, in order
+
+        Returns:
+            Indices of the chunks that no longer need to be sent
+        """
+        async_redis = self.redis_factory()
+        async with async_redis.pipeline(transaction=False) as pipe:
+            for digest in chunk_digests:
+                pipe.get(_chunk_location_key(session.user_id, digest))
+            locations = await pipe.execute()
+
+        meta_key, chunks_key, completing_key, digests_key = _upload_keys(
+            session.upload_id)
+        reused = []
+
+        for chunk_index, (digest, location) in enumerate(zip(chunk_digests, locations)):
+            if location is None or len(reused) >= session.total_chunks - 1:
+                continue
+
+            source_path, source_offset, length = json.loads(location)
+            copied = await asyncio.to_thread(
+                _copy_verified_range, source_path, source_offset, length,
+                session.path, chunk_index * session.part_size, digest)
+            if not copied:
+                continue
+
+            await async_redis.eval(
+                _RECORD_CHUNK_SCRIPT, 4, chunks_key, completing_key, meta_key, digests_key,
+                chunk_index, length, session.total_chunks,
+                BATCH_UPLOAD_SESSION_TTL_SECONDS, f"{os.uname().nodename}:{os.getpid()}",
+                int(time.time()), digest)
+            reused.append(chunk_index)
+
+        if reused:
+            logger.info(
+                f"Upload {session.upload_id}: reused {len(reused)} chunks held by the server")
+        return reused
+
+    async def _remember_chunk(
+        self,
+        user_id: int,
+        digest: str,
+        path: str,
+        offset: int,
+        length: int
+    ) -> None:
+        """Index a verified chunk by SHA-256 for reuse by the same user's uploads"""
+        await self.redis_factory().set(
+            _chunk_location_key(user_id, digest),
+            json.dumps([path, offset, length]),
+            ex=BATCH_UPLOAD_SESSION_TTL_SECONDS
+        )
+
+    async def cleanup_upload(self, upload_id: str) -> None:
+        """Remove the staging file and session of an upload, releasing its budget"""
+        path = self._staging_path(upload_id)
+        await self.redis_factory().delete(
+            *_upload_keys(upload_id), *_ingest_keys(upload_id))
+        try:
+            await asyncio.to_thread(os.remove, path)
+        except FileNotFoundError:
+            pass
+        await asyncio.to_thread(shutil.rmtree, _ingest_dir(path), True)
+        await release_staging(self.redis_factory(), upload_id)
+
+    def _staging_path(self, upload_id: str) -> str:
+        return os.path.join(self.staging_dir, f"{upload_id}.upload")
+
+    async def _get_or_create_session(
+        self,
+        upload_id: Optional[str],
+        chunk_index: int,
+        chunk_length: int,
+        total_chunks: int,
+        filename: str,
+        upload_type: str,
+        task_id: Optional[str],
+        user_id: int,
+        part_size: Optional[int],
+        total_size: Optional[int]
+    ) -> UploadSession:
+        if upload_id:
+            session = await self.get_session(upload_id)
+            if session is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Upload {upload_id} not found. Please restart upload."
+                )
+            if session.user_id != user_id:
+                raise HTTPException(status_code=403, detail="Access denied")
+            return session
+
+        if part_size is None:
+            if chunk_index != 0 and total_chunks > 1:
+                raise HTTPException(
+                    status_code=400,
+                    detail="part_size required when an upload does not start with chunk 0"
+                )
+            part_size = chunk_length
+
+        return await self.create_session(
+            total_chunks, filename, upload_type, task_id, user_id,
+            part_size, total_size)
+
+    async def create_session(
+        self,
+        total_chunks: int,
+        filename: str,
+        upload_type: str,
+        task_id: Optional[str],
+        user_id: int,
+        part_size: int,
+        total_size: Optional[int],
+        upload_digest: Optional[str] = None
+    ) -> UploadSession:
+        """
+        Create the staging file and register a new upload session
+
+        Raises:
+            HTTPException 429 (with Retry-After) if the upload does not fit
+            the staging budgets
+        """
+        os.makedirs(self.staging_dir, exist_ok=True)
+        upload_id = str(uuid.uuid4())
+        path = self._staging_path(upload_id)
+
+        await reserve_staging(
+            self.redis_factory(), self.staging_dir, upload_id, user_id,
+            _staging_reservation_bytes(upload_type, total_chunks, part_size, total_size))
+
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            try:
+                if total_size:
+                    os.posix_fallocate(fd, 0, total_size)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            await release_staging(self.redis_factory(), upload_id)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            if e.errno == errno.ENOSPC:
+                raise _staging_full("Not enough free space for upload staging; retry later")
+            raise
+
+        session = UploadSession(
+            upload_id=upload_id,
+            user_id=user_id,
+            filename=filename,
+            upload_type=upload_type,
+            task_id=task_id,
+            total_chunks=total_chunks,
+            part_size=part_size,
+            total_size=total_size,
+            path=path,
+            upload_digest=upload_digest
+        )
+
+        meta_key = _upload_keys(upload_id)[0]
+        async with self.redis_factory().pipeline(transaction=True) as pipe:
+            pipe.hset(meta_key, mapping=session.to_redis())
+            pipe.expire(meta_key, BATCH_UPLOAD_SESSION_TTL_SECONDS)
+            await pipe.execute()
+
+        return session
+
+    async def _write_at(
+        self,
+        path: str,
+        chunk: UploadFile,
+        offset: int,
+        with_crc32c: bool = False
+    ) -> tuple:
+        """
+        Stream the chunk into the file at offset with positional writes
+
+        Returns:
+            (SHA-256 hex digest, CRC32C or None) of the bytes written
+        """
+        sha256 = hashlib.sha256()
+        crc = [0] if with_crc32c else None
+
+        fd = os.open(path, os.O_WRONLY)
+        try:
+            position = offset
+            while True:
+                block = await chunk.read(_CHUNK_WRITE_BLOCK)
+                if not block:
+                    break
+                position += await asyncio.to_thread(
+                    _write_block, fd, memoryview(block), position, sha256, crc)
+        finally:
+            os.close(fd)
+
+        return sha256.hexdigest(), (crc[0] if crc is not None else None)
+
+
+async def sweep_upload_staging(service: PositionalChunkUploadService) -> int:
+    """
+    Expire idle uploads and remove orphaned staging files
+
+    An upload is idle when no chunk arrived for BATCH_UPLOAD_IDLE_TTL_SECONDS
+    or its session is gone from Redis. Staging files without a reservation
+    are removed once older than the same TTL.
+
+    Returns:
+        Number of uploads and files removed
+    """
+    async_redis = service.redis_factory()
+    now = time.time()
+    removed = 0
+
+    reservations = await async_redis.hkeys(_STAGING_RESERVATIONS_KEY)
+    for upload_id in reservations:
+        session = await service.get_session(upload_id)
+        if session is None or now - session.updated_at > BATCH_UPLOAD_IDLE_TTL_SECONDS:
+            logger.info(f"Expiring idle upload {upload_id}")
+            await service.cleanup_upload(upload_id)
+            removed += 1
+
+    if not os.path.isdir(service.staging_dir):
+        return removed
+
+    live = set(await async_redis.hkeys(_STAGING_RESERVATIONS_KEY))
+    for entry in await asyncio.to_thread(lambda: list(os.scandir(service.staging_dir))):
+        if entry.name.split(".", 1)[0] in live:
+            continue
+        try:
+            if now - entry.stat().st_mtime < BATCH_UPLOAD_IDLE_TTL_SECONDS:
+                continue
+            if entry.is_dir():
+                await asyncio.to_thread(shutil.rmtree, entry.path, True)
+            else:
+                await asyncio.to_thread(os.remove, entry.path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+
+    return removed
+
+
+async def run_staging_janitor(service: PositionalChunkUploadService) -> None:
+    """Periodically sweep upload staging; one worker per interval does it"""
+    lock_key = "upload:staging:janitor_lock"
+
+    while True:
+        await asyncio.sleep(BATCH_UPLOAD_JANITOR_INTERVAL_SECONDS)
+        try:
+            acquired = await service.redis_factory().set(
+                lock_key, os.getpid(), nx=True, ex=BATCH_UPLOAD_JANITOR_INTERVAL_SECONDS)
+            if not acquired:
+                continue
+            removed = await sweep_upload_staging(service)
+            if removed:
+                logger.info(f"Upload staging janitor removed {removed} uploads/files")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Upload staging janitor failed: {e}")
+
+
+# Streaming ingest for 'images' uploads (a ZIP of sheet images). As soon
+# as the contiguous prefix of the staging file covers a ZIP member, the
+# member is extracted next to the staging file, so extraction overlaps the
+# rest of the upload and submit_unified receives ready image files.
+_ZIP_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_ZIP_LOCAL_SIGNATURE = 0x04034b50
+_ZIP_CENTRAL_SIGNATURE = 0x02014b50
+_INGEST_SKIP_PREFIXES = ("__MACOSX/", "._")
+
+# Longest the final chunk request waits for extraction to finish. It must
+# stay well below the proxy's request timeout (Cloudflare gives up after
+# ~100 s); past it the upload is submitted as a whole ZIP instead.
+BATCH_INGEST_FINISH_WAIT_SECONDS = float(
+    os.getenv("BATCH_INGEST_FINISH_WAIT_SECONDS", "60"))
+
+
+def _ingest_keys(upload_id: str) -> tuple:
+    """Redis keys of streaming ingest: (state hash, file list, lock)"""
+    prefix = f"upload:{upload_id}:ingest"
+    return prefix, f"{prefix}:files", f"{prefix}:lock"
+
+
+def _ingest_dir(staging_path: str) -> str:
+    return f"{staging_path}.d"
+
+
+def _contiguous_bytes(session: UploadSession) -> int:
+    """Length of the fully received prefix of the staging file"""
+    index = 0
+    while index in session.chunk_lengths:
+        index += 1
+    if index == session.total_chunks:
+        return session.bytes_received
+    return index * session.part_size
+
+
+def _zip64_sizes(extra: bytes, csize: int, usize: int) -> tuple:
+    """Read sizes from a ZIP64 extended-information extra field"""
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, length = struct.unpack_from("<HH", extra, pos)
+        if header_id == 0x0001:
+            values = list(struct.unpack_from(f"<{length // 8}Q", extra, pos + 4))
+            if usize == 0xFFFFFFFF and values:
+                usize = values.pop(0)
+            if csize == 0xFFFFFFFF and values:
+                csize = values.pop(0)
+            break
+        pos += 4 + length
+    return csize, usize
+
+
+def _extract_ready_members(
+    staging_path: str,
+    cursor: int,
+    available: int,
+    out_dir: str,
+    deadline: Optional[float] = None
+) -> tuple:
+    """
+    Extract every ZIP member that lies entirely below `available` bytes
+
+    Args:
+        staging_path: Staging file being written by the chunk uploads
+        cursor: Offset of the next local file header to read
+        available: Length of the contiguous prefix received so far
+        out_dir: Directory for extracted images
+        deadline: time.monotonic() value after which no further member is
+            started; the state stays 'active'
+
+    Returns:
+        (new cursor, extracted paths, state) where state is 'active' (more
+        members to come), 'done' (central directory reached) or 'fallback'
+        (archive cannot be streamed; process the ZIP after upload instead)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    extracted = []
+
+    with open(staging_path, 'rb') as f:
+        fd = f.fileno()
+        while cursor + _ZIP_LOCAL_HEADER.size <= available:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            header = os.pread(fd, _ZIP_LOCAL_HEADER.size, cursor)
+            (signature, _, flags, method, _, _, crc, csize, usize,
+             name_len, extra_len) = _ZIP_LOCAL_HEADER.unpack(header)
+
+            if signature == _ZIP_CENTRAL_SIGNATURE:
+                return cursor, extracted, "done"
+            # Encrypted members, data descriptors (sizes unknown up front)
+            # and unsupported methods can only be handled from the full ZIP
+            if signature != _ZIP_LOCAL_SIGNATURE or flags & 0x09 or method not in (0, 8):
+                return cursor, extracted, "fallback"
+
+            names_end = cursor + _ZIP_LOCAL_HEADER.size + name_len + extra_len
+            if names_end > available:
+                break
+            names = os.pread(fd, name_len + extra_len,
+                             cursor + _ZIP_LOCAL_HEADER.size)
+            name = names[:name_len].decode("utf-8", errors="replace")
+            csize, usize = _zip64_sizes(names[name_len:], csize, usize)
+
+            data_end = names_end + csize
+            if data_end > available:
+                break
+
+            basename = os.path.basename(name)
+            if basename and not name.startswith(_INGEST_SKIP_PREFIXES) \
+                    and not basename.startswith("._"):
+                out_path = os.path.join(out_dir, f"{cursor:012d}_{basename}")
+                if not _extract_member(fd, names_end, csize, method, crc, out_path):
+                    return cursor, extracted, "fallback"
+                extracted.append(out_path)
+
+            cursor = data_end
+
+    return cursor, extracted, "active"
+
+
+def _extract_member(
+    fd: int,
+    offset: int,
+    csize: int,
+    method: int,
+    crc: int,
+    out_path: str
+) -> bool:
+    """Decompress one member to out_path and check its CRC-32"""
+    decompressor = zlib.decompressobj(-15) if method == 8 else None
+    checksum = 0
+
+    with open(out_path, 'wb') as out:
+        position = offset
+        remaining = csize
+        while remaining:
+            block = os.pread(fd, min(_CHUNK_WRITE_BLOCK, remaining), position)
+            if not block:
+                return False
+            position += len(block)
+            remaining -= len(block)
+            data = decompressor.decompress(block) if decompressor else block
+            checksum = zlib.crc32(data, checksum)
+            out.write(data)
+        if decompressor:
+            tail = decompressor.flush()
+            checksum = zlib.crc32(tail, checksum)
+            out.write(tail)
+
+    return checksum == crc
+
+
+class _DeferredFile(io.RawIOBase):
+    """
+    Read-only file that opens its path on first read and closes at EOF
+
+    Lets thousands of extracted images be handed over as UploadFiles
+    without holding a file descriptor per image.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self._path = path
+        self._handle = None
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._handle is None:
+            self._handle = open(self._path, 'rb', buffering=0)
+            self._handle.seek(self._position)
+        n = self._handle.readinto(buffer)
+        self._position += n
+        if n == 0:
+            self._handle.close()
+            self._handle = None
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += os.path.getsize(self._path)
+        self._position = offset
+        if self._handle is not None:
+            self._handle.seek(offset)
+        return offset
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        super().close()
+
+
+class StreamingImageIngest:
+    """
+    Extract members of an 'images' ZIP upload while chunks are arriving
+
+    The extraction cursor is shared in Redis and guarded by a lock, so any
+    worker that receives a chunk can advance it. Extracted paths are kept in
+    order in a Redis list for submission once the upload completes.
+    """
+
+    def __init__(self, uploads: PositionalChunkUploadService):
+        self._uploads = uploads
+
+    async def advance(
+        self,
+        upload_id: str,
+        publisher: Optional[ProgressPublisher] = None,
+        deadline: Optional[float] = None
+    ) -> str:
+        """
+        Extract whatever members the received prefix now covers
+
+        Args:
+            deadline: time.monotonic() value after which extraction stops
+                and 'active' is returned
+
+        Returns:
+            Ingest state: 'active', 'done', 'fallback' or 'busy' (another
+            worker holds the lock)
+        """
+        async_redis = self._uploads.redis_factory()
+        state_key, files_key, lock_key = _ingest_keys(upload_id)
+
+        if not await async_redis.set(lock_key, os.getpid(), nx=True, ex=300):
+            return "busy"
+
+        try:
+            session = await self._uploads.get_session(upload_id)
+            if session is None:
+                return "fallback"
+
+            ingest = await async_redis.hgetall(state_key)
+            state = ingest.get("state", "active")
+            if state != "active":
+                return state
+
+            cursor = int(ingest.get("cursor", 0))
+            available = _contiguous_bytes(session)
+
+            cursor, extracted, state = await asyncio.to_thread(
+                _extract_ready_members, session.path, cursor, available,
+                _ingest_dir(session.path), deadline)
+
+            async with async_redis.pipeline(transaction=True) as pipe:
+                if extracted:
+                    pipe.rpush(files_key, *extracted)
+                pipe.hset(state_key, mapping={"cursor": cursor, "state": state})
+                pipe.hincrby(state_key, "extracted", len(extracted))
+                for key in (state_key, files_key):
+                    pipe.expire(key, BATCH_UPLOAD_SESSION_TTL_SECONDS)
+                results = await pipe.execute()
+
+            if extracted and publisher is not None:
+                await publisher.publish_progress(
+                    batch_id=upload_id,
+                    stage=ProcessingStage.EXTRACTING,
+                    message=f"Extracted {results[-3]} images during upload",
+                    progress_percentage=available / (session.total_size or available) * 100
+                )
+
+            return state
+        except Exception as e:
+            logger.warning(f"Streaming ingest failed for upload {upload_id}: {e}")
+            await async_redis.hset(state_key, "state", "fallback")
+            return "fallback"
+        finally:
+            await async_redis.delete(lock_key)
+
+    async def finish(
+        self,
+        upload_id: str,
+        publisher: Optional[ProgressPublisher] = None
+    ) -> Optional[List[str]]:
+        """
+        Extract the remaining members after the last chunk
+
+        Waiting for another worker's extraction and extracting the rest
+        together take at most BATCH_INGEST_FINISH_WAIT_SECONDS, so the final
+        chunk request answers before the proxy times it out.
+
+        Returns:
+            Extracted image paths in archive order, or None if the upload
+            must be submitted as a ZIP instead
+        """
+        deadline = time.monotonic() + BATCH_INGEST_FINISH_WAIT_SECONDS
+        state = await self.advance(upload_id, publisher, deadline)
+        while state == "busy" and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            state = await self.advance(upload_id, publisher, deadline)
+
+        if state != "done":
+            if state in ("active", "busy"):
+                logger.info(
+                    f"Streaming ingest of upload {upload_id} not finished within "
+                    f"{BATCH_INGEST_FINISH_WAIT_SECONDS:.0f}s; submitting the ZIP")
+            return None
+
+        _, files_key, _ = _ingest_keys(upload_id)
+        return await self._uploads.redis_factory().lrange(files_key, 0, -1)
+
+
+def open_extracted_images(paths: List[str]) -> List[UploadFile]:
+    """UploadFiles for extracted images, opened lazily on first read"""
+    return [
+        UploadFile(
+            file=_DeferredFile(path),
+            filename=os.path.basename(path).split("_", 1)[1],
+            size=os.path.getsize(path)
+        )
+        for path in paths
+    ]
@@ -0,0 +1,284 @@
+"""
+Editor image derivatives
+
+When a batch completes, the crops the OMR editor requests
+(/sheets/{id}/image?part=...&width=...) are rendered once in a process pool
+and stored next to each scan, so review sessions read small pre-built files
+instead of resizing full scans per request. Rendering is triggered by a
+ProgressFanout listener and reports its own progress under
+derivatives:{batch_id}; GET /api/batches/{batch_id}/derivatives and
+/sheets/{sheet_uuid}/derivative expose the state and the files.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from src.api.models.responses import BatchProgressEvent, ProcessingStage
+from src.api.services.async_pools import get_async_db, get_async_redis
+from src.api.services.batch_metrics import PHASE_DURATION
+from src.api.services.batch_versions import BATCH_VERSION_TTL_SECONDS
+from src.api.services.progress_fanout import progress_fanout
+from src.api.services.progress_publisher import BATCH_PROGRESS_TTL_SECONDS, ProgressPublisher
+
+logger = logging.getLogger(__name__)
+
+# Each spec is (part, crop box in source pixels, output width); crop boxes
+# must match the part crops of the sheets image endpoint. Rendering is
+# opt-in: with no specs (the default) nothing is rendered. To enable it for
+# the editor's crops, set
+#   BATCH_DERIVATIVE_SPECS='[["top", [0, 0, 1440, 595], 920], ["bottom", [270, 595, 1440, 2245], 350]]'
+# and have the editor request /batches/{id}/sheets/{sheet_uuid}/derivative,
+# falling back to the full image endpoint on 404.
+BATCH_DERIVATIVE_SPECS = [
+    (part, tuple(box), width)
+    for part, box, width in json.loads(os.getenv("BATCH_DERIVATIVE_SPECS", "[]"))
+]
+BATCH_DERIVATIVE_FORMAT = os.getenv("BATCH_DERIVATIVE_FORMAT", "webp")
+BATCH_DERIVATIVE_QUALITY = int(os.getenv("BATCH_DERIVATIVE_QUALITY", "80"))
+BATCH_DERIVATIVE_WORKERS = int(
+    os.getenv("BATCH_DERIVATIVE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+BATCH_DERIVATIVE_FETCH_ROWS = 200
+# COMPLETED can be published before the batch row says so; wait for the row
+# this many times, doubling a one-second delay each time
+BATCH_DERIVATIVE_STATUS_ATTEMPTS = int(os.getenv("BATCH_DERIVATIVE_STATUS_ATTEMPTS", "6"))
+DERIVATIVE_DIR = ".derivatives"
+
+_DERIVATIVE_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+_DERIVATIVE_MEDIA_TYPES = {"webp": "image/webp", "jpg": "image/jpeg"}
+
+
+def derivative_path(image_path: str, part: str, width: int,
+                    fmt: str = BATCH_DERIVATIVE_FORMAT) -> str:
+    """Where the derivative of a scan is stored"""
+    directory, name = os.path.split(image_path)
+    stem = os.path.splitext(name)[0]
+    return os.path.join(
+        directory, DERIVATIVE_DIR,
+        f"{stem}.{part}.w{width}.{_DERIVATIVE_EXTENSIONS[fmt]}")
+
+
+def derivative_media_type(path: str) -> str:
+    """Content type of a derivative file"""
+    return _DERIVATIVE_MEDIA_TYPES[path.rsplit(".", 1)[-1]]
+
+
+def find_derivative(image_path: str, part: str, width: int) -> Optional[str]:
+    """Pre-rendered derivative for an editor request, if one exists"""
+    for fmt in _DERIVATIVE_EXTENSIONS:
+        path = derivative_path(image_path, part, width, fmt)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _render_sheet_derivatives(image_path: str, specs: list, fmt: str, quality: int) -> int:
+    """
+    Render every derivative of one scan (runs in the process pool)
+
+    Derivatives newer than the scan are kept. Files are written to a
+    temporary name and renamed, so readers never see a partial image.
+
+    Returns:
+        Number of derivatives written
+    """
+    from PIL import Image, features
+
+    if fmt == "webp" and not features.check("webp"):
+        fmt = "jpeg"
+
+    source_mtime = os.path.getmtime(image_path)
+    pending = [
+        (part, box, width, derivative_path(image_path, part, width, fmt))
+        for part, box, width in specs
+    ]
+    pending = [
+        spec for spec in pending
+        if not os.path.exists(spec[3]) or os.path.getmtime(spec[3]) < source_mtime
+    ]
+    if not pending:
+        return 0
+
+    os.makedirs(os.path.join(os.path.dirname(image_path), DERIVATIVE_DIR), exist_ok=True)
+
+    with Image.open(image_path) as image:
+        image = image.convert("RGB")
+        for part, box, width, out_path in pending:
+            crop = image.crop(box)
+            if crop.width > width:
+                height = round(crop.height * width / crop.width)
+                crop = crop.resize((width, height), Image.LANCZOS)
+            tmp_path = f"{out_path}.{os.getpid()}.tmp"
+            if fmt == "webp":
+                crop.save(tmp_path, format="WEBP", quality=quality, method=4)
+            else:
+                crop.save(tmp_path, format="JPEG", quality=quality, optimize=True)
+            os.replace(tmp_path, out_path)
+
+    return len(pending)
+
+
+_derivative_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_derivative_pool() -> ProcessPoolExecutor:
+    global _derivative_pool
+    if _derivative_pool is None:
+        # spawn: never fork a process that is running an event loop
+        _derivative_pool = ProcessPoolExecutor(
+            max_workers=BATCH_DERIVATIVE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"))
+    return _derivative_pool
+
+
+def derivatives_key(batch_uuid: str) -> str:
+    return f"batch:{batch_uuid}:derivatives"
+
+
+def _derivatives_lock_key(batch_uuid: str) -> str:
+    return f"{derivatives_key(batch_uuid)}:lock"
+
+
+def _derivatives_progress_id(batch_uuid: str) -> str:
+    # Own progress stream, so the batch's stream still ends at COMPLETED
+    return f"derivatives:{batch_uuid}"
+
+
+async def render_batch_derivatives(batch_uuid: str) -> dict:
+    """
+    Render editor derivatives for every completed sheet of a batch
+
+    Progress is kept in batch:{id}:derivatives and published on the
+    batch:derivatives:{id}:progress channel.
+
+    Returns:
+        Final state: status, sheets_total, rendered, failed
+    """
+    async_redis = get_async_redis()
+    db = await get_async_db()
+    publisher = ProgressPublisher(async_redis)
+    progress_id = _derivatives_progress_id(batch_uuid)
+    state_key = derivatives_key(batch_uuid)
+
+    batch = None
+    for attempt in range(BATCH_DERIVATIVE_STATUS_ATTEMPTS):
+        batch = await db.execute_query(
+            "SELECT id, processing_status FROM omr_batches WHERE batch_uuid = %s",
+            (batch_uuid,), fetch_one=True)
+        if not batch or batch['processing_status'] in (
+                'completed', 'failed', 'deleting'):
+            break
+        await asyncio.sleep(2 ** attempt)
+    if not batch or batch['processing_status'] != 'completed':
+        return {"status": "skipped"}
+
+    total_row = await db.execute_query(
+        """
+        SELECT COUNT(*) as total FROM omr_sheets
+        WHERE batch_id = %s AND processing_status = 'completed'
+        """, (batch['id'],), fetch_one=True)
+    state = {"status": "running", "sheets_total": int(total_row['total'] or 0),
+             "sheets_done": 0, "rendered": 0, "failed": 0}
+    await async_redis.hset(state_key, mapping=state)
+    await async_redis.expire(state_key, BATCH_VERSION_TTL_SECONDS)
+
+    loop = asyncio.get_running_loop()
+    pool = _get_derivative_pool()
+    started = time.perf_counter()
+
+    async for rows in db.keyset_pages(
+            """
+            SELECT id, image_path FROM omr_sheets
+            WHERE batch_id = %s AND processing_status = 'completed'
+              AND image_path IS NOT NULL
+            """, (batch['id'],), [("id", "id")], BATCH_DERIVATIVE_FETCH_ROWS):
+        futures = [
+            loop.run_in_executor(
+                pool, _render_sheet_derivatives, row['image_path'],
+                BATCH_DERIVATIVE_SPECS, BATCH_DERIVATIVE_FORMAT, BATCH_DERIVATIVE_QUALITY)
+            for row in rows
+        ]
+        for outcome in await asyncio.gather(*futures, return_exceptions=True):
+            if isinstance(outcome, Exception):
+                state["failed"] += 1
+                logger.warning(f"Derivative rendering failed in batch {batch_uuid}: {outcome}")
+            else:
+                state["rendered"] += outcome
+            state["sheets_done"] += 1
+
+        await async_redis.hset(state_key, mapping=state)
+        await publisher.publish_progress(
+            batch_id=progress_id,
+            stage=ProcessingStage.PROCESSING_SHEETS,
+            message=f"Rendering editor images: {state['sheets_done']}/{state['sheets_total']} sheets",
+            progress_percentage=(state['sheets_done'] / state['sheets_total'] * 100
+                                 if state['sheets_total'] else 100.0),
+            sheets_total=state['sheets_total'],
+            sheets_processed=state['sheets_done']
+        )
+
+    state["status"] = "completed"
+    await async_redis.hset(state_key, mapping=state)
+    await publisher.publish_progress(
+        batch_id=progress_id,
+        stage=ProcessingStage.COMPLETED,
+        message=f"Editor images ready ({state['rendered']} rendered, {state['failed']} failed)",
+        progress_percentage=100.0,
+        sheets_total=state['sheets_total'],
+        sheets_processed=state['sheets_done']
+    )
+    PHASE_DURATION.labels("rendering_derivatives").observe(time.perf_counter() - started)
+    logger.info(
+        f"Batch {batch_uuid}: rendered {state['rendered']} editor derivatives "
+        f"in {time.perf_counter() - started:.1f}s ({state['failed']} sheets failed)")
+    return state
+
+
+async def _on_batch_progress(
+    batch_uuid: str,
+    event: BatchProgressEvent,
+    appended: bool
+) -> None:
+    """Fanout listener: start derivative rendering when a batch completes"""
+    if event.stage != ProcessingStage.COMPLETED or batch_uuid.startswith("derivatives:"):
+        return
+    # Every worker sees the event; one renders
+    if await get_async_redis().set(
+            _derivatives_lock_key(batch_uuid), os.getpid(),
+            nx=True, ex=BATCH_PROGRESS_TTL_SECONDS):
+        asyncio.create_task(_render_logged(batch_uuid))
+
+
+async def _render_logged(batch_uuid: str) -> None:
+    try:
+        await render_batch_derivatives(batch_uuid)
+    except Exception as e:
+        logger.error(f"Derivative rendering for batch {batch_uuid} failed: {e}", exc_info=True)
+        await get_async_redis().hset(
+            derivatives_key(batch_uuid), mapping={"status": "failed", "error": str(e)})
+    finally:
+        # Up-to-date files are skipped, so a later COMPLETED may render again
+        try:
+            await get_async_redis().delete(_derivatives_lock_key(batch_uuid))
+        except Exception as e:
+            logger.warning(f"Failed to release derivatives lock of batch {batch_uuid}: {e}")
+
+
+async def start_derivative_trigger() -> None:
+    """Startup hook: render derivatives of batches as they complete"""
+    if BATCH_DERIVATIVE_SPECS:
+        progress_fanout.add_listener(_on_batch_progress)
+
+
+async def stop_derivative_trigger() -> None:
+    """Shutdown hook: stop the trigger and the render pool"""
+    global _derivative_pool
+    progress_fanout.remove_listener(_on_batch_progress)
+    if _derivative_pool is not None:
+        _derivative_pool.shutdown(wait=False, cancel_futures=True)
+        _derivative_pool = None
@@ -0,0 +1,451 @@
+"""
+Progress fan-out and observation
+
+ProgressFanout is the single batch:*:progress pattern subscriber of an API
+process: it validates each message once, hands it to in-process listeners
+and fans it out, coalesced, to the SSE client queues watching that batch.
+ProgressObserver is one such listener, active in one elected process at a
+time, that keeps batch versions current for bare events and derives stage
+durations, throughput and finished-sheet counts for the metrics.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import redis.asyncio as aioredis
+
+from src.api.models.responses import BatchProgressEvent, ProcessingStage
+from src.api.services.async_pools import get_async_db, get_async_redis
+from src.api.services.batch_metrics import SHEET_THROUGHPUT, SHEETS_FINISHED, STAGE_DURATION
+from src.api.services.batch_versions import bump_batch_version
+from src.api.services.progress_publisher import (
+    BATCH_PROGRESS_TTL_SECONDS,
+    TERMINAL_SSE_EVENTS,
+    TERMINAL_STAGES,
+    ProgressCoalescer,
+    progress_stream_key,
+    sse_event_type,
+)
+from src.api.services.sheet_counters import COUNTED_STATUSES, BatchSheetCounters
+
+logger = logging.getLogger(__name__)
+
+# Track a batch's current stage; on a forward transition report the one
+# that ended. Stages only move forward in ProcessingStage order, so a late
+# or reordered event of an earlier stage is ignored; after a terminal stage
+# any stage starts a new run (reprocessing, deletion).
+# KEYS: stage hash
+# ARGV: stage, stage rank, now, ttl, lowest terminal rank
+# Returns {changed, ended stage or '', its start time or ''}
+_TRACK_STAGE_SCRIPT = """
+local previous = redis.call('HMGET', KEYS[1], 'stage', 'since', 'rank')
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+if previous[1] == ARGV[1] then
+    return {0, '', ''}
+end
+local rank = tonumber(previous[3] or '-1')
+local restart = rank >= tonumber(ARGV[5])
+if not restart and tonumber(ARGV[2]) <= rank then
+    return {0, '', ''}
+end
+redis.call('HSET', KEYS[1], 'stage', ARGV[1], 'since', ARGV[3], 'rank', ARGV[2])
+if restart then
+    return {1, '', ''}
+end
+return {1, previous[1] or '', previous[2] or ''}
+"""
+
+# End the current stage without starting another, for a stage whose
+# successor is published under a different id (UPLOADING ends on the upload
+# id; the batch continues under its own)
+# KEYS: stage hash
+# ARGV: stage
+# Returns the ended stage's start time, or '' if it was not current
+_END_STAGE_SCRIPT = """
+local current = redis.call('HMGET', KEYS[1], 'stage', 'since')
+if current[1] ~= ARGV[1] or not current[2] or current[2] == '' then
+    return ''
+end
+redis.call('HSET', KEYS[1], 'since', '')
+return current[2]
+"""
+
+_STAGE_RANKS = {stage: rank for rank, stage in enumerate(ProcessingStage)}
+
+
+def _stage_key(batch_id: str) -> str:
+    return f"{progress_stream_key(batch_id)}:stage"
+
+
+async def end_stage(
+    async_redis: aioredis.Redis,
+    batch_id: str,
+    stage: ProcessingStage
+) -> None:
+    """Observe the duration of a stage that ends without a successor event"""
+    since = await async_redis.eval(_END_STAGE_SCRIPT, 1, _stage_key(batch_id), stage.value)
+    if since:
+        STAGE_DURATION.labels(stage.value).observe(time.time() - float(since))
+
+
+# Per-client SSE queue bound; a client that falls further behind than this
+# has its oldest pending events dropped so it always sees the latest state
+BATCH_SSE_QUEUE_SIZE = int(os.getenv("BATCH_SSE_QUEUE_SIZE", "100"))
+
+PROGRESS_CHANNEL_PATTERN = "batch:*:progress"
+
+# In-process progress listener: (batch_id, event, appended), where appended
+# is True for events that went through the stream append script
+ProgressListener = Callable[[str, BatchProgressEvent, bool], Awaitable[None]]
+
+
+class ProgressFanout:
+    """
+    Single pattern subscriber per worker process, fanned out to SSE clients
+
+    One pubsub connection listens on batch:*:progress. Each message is
+    validated into a BatchProgressEvent once and the serialised SSE event is
+    shared by every client queue watching that batch, coalesced per batch
+    the same way as publishing. Messages from ProgressPublisher and
+    publish_progress_sync carry their stream entry ID as the SSE id; bare
+    events from publishers not yet upgraded are forwarded without one.
+
+    In-process listeners (the progress observer, the derivative trigger)
+    receive every parsed event, uncoalesced, from the same loop instead of
+    opening pubsub connections of their own. They run inline, in message
+    order, so they must stay brief and hand longer work to a task.
+    """
+
+    def __init__(self, queue_size: int = BATCH_SSE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.dropped_events = 0
+        self._clients: Dict[str, Set[asyncio.Queue]] = {}
+        self._listeners: List[ProgressListener] = []
+        self._task: Optional[asyncio.Task] = None
+        self._coalescer = ProgressCoalescer(self._deliver)
+
+    def start(self) -> None:
+        """Start listening, if not already"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+
+    def add_listener(self, listener: ProgressListener) -> None:
+        """Register an in-process listener for every progress event"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: ProgressListener) -> None:
+        """Unregister an in-process listener"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def subscribe(
+        self,
+        batch_id: str,
+        queue: Optional[asyncio.Queue] = None
+    ) -> asyncio.Queue:
+        """
+        Register a client queue for a batch and start listening if needed
+
+        Pass the same queue for several batches to multiplex them onto one
+        client connection.
+        """
+        self.start()
+
+        if queue is None:
+            queue = asyncio.Queue(maxsize=self.queue_size)
+        self._clients.setdefault(batch_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, batch_id: str, queue: asyncio.Queue) -> None:
+        """Remove a client queue"""
+        queues = self._clients.get(batch_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._clients[batch_id]
+
+    async def stop(self) -> None:
+        """Cancel the listener task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        """Report subscriber state"""
+        return {
+            "listening": self._task is not None and not self._task.done(),
+            "batches": len(self._clients),
+            "clients": sum(len(q) for q in self._clients.values()),
+            "listeners": len(self._listeners),
+            "queue_size": self.queue_size,
+            "dropped_events": self.dropped_events,
+            "coalesced_events": self._coalescer.coalesced_events
+        }
+
+    async def _listen(self) -> None:
+        """Pattern-subscribe and dispatch messages, reconnecting on failure"""
+        while True:
+            pubsub = get_async_redis().pubsub()
+            try:
+                await pubsub.psubscribe(PROGRESS_CHANNEL_PATTERN)
+                logger.info(
+                    f"Progress subscriber listening on {PROGRESS_CHANNEL_PATTERN}")
+
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        await self._dispatch(message["channel"], message["data"])
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(
+                    f"Progress subscriber error, reconnecting: {e}", exc_info=True)
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception as e:
+                    logger.error(f"Error closing progress subscriber: {e}")
+
+    async def _dispatch(self, channel: str, data: str) -> None:
+        """Validate one message, notify listeners, offer it to the coalescer"""
+        # Channel format: batch:{batch_id}:progress
+        batch_id = channel[len("batch:"):-len(":progress")]
+
+        if not self._listeners and not self._clients.get(batch_id):
+            return
+
+        try:
+            payload = json.loads(data)
+            stream_id = None
+            event_type = None
+            if "id" in payload and "event" in payload:
+                stream_id = payload["id"]
+                event_type = payload.get("type")
+                payload = payload["event"]
+            event = BatchProgressEvent.model_validate(payload)
+            if not event.batch_id:
+                # Tag once so multi-batch clients can route the event
+                event = event.model_copy(update={"batch_id": batch_id})
+        except Exception as e:
+            logger.error(f"Invalid progress event on {channel}: {e}")
+            return
+
+        for listener in list(self._listeners):
+            try:
+                await listener(batch_id, event, stream_id is not None)
+            except Exception as e:
+                logger.warning(f"Progress listener failed for batch {batch_id}: {e}")
+
+        if not self._clients.get(batch_id):
+            return
+
+        sse_event = {
+            "event": event_type or sse_event_type(event.stage),
+            "data": event.model_dump_json()
+        }
+        if stream_id:
+            sse_event["id"] = stream_id
+
+        await self._coalescer.offer(
+            batch_id, event.stage, sse_event,
+            terminal=sse_event["event"] in TERMINAL_SSE_EVENTS)
+
+    async def _deliver(self, batch_id: str, sse_event: dict) -> None:
+        """Put an SSE event on every queue currently watching the batch"""
+        for queue in self._clients.get(batch_id, ()):
+            try:
+                queue.put_nowait(sse_event)
+            except asyncio.QueueFull:
+                # Slow consumer: drop its oldest pending event
+                queue.get_nowait()
+                queue.put_nowait(sse_event)
+                self.dropped_events += 1
+
+
+progress_fanout = ProgressFanout()
+
+
+async def start_progress_fanout() -> None:
+    """Startup hook: start the shared progress subscriber for its listeners"""
+    progress_fanout.start()
+
+
+async def stop_progress_fanout() -> None:
+    """Shutdown hook: stop the shared progress subscriber"""
+    await progress_fanout.stop()
+
+
+# One process at a time observes every progress message, whichever
+# publisher sent it, as a listener on that process's ProgressFanout.
+# Stream-appended events bump the batch version in their append script;
+# bare events from publishers not yet upgraded are bumped here so
+# conditional polls still see them.
+# Stage durations, throughput and finished-sheet counts are derived here
+# too, so they cover every publisher and land in the API's /metrics once.
+# Leadership is a lock the holder refreshes; if that process dies another
+# takes over within BATCH_PROGRESS_OBSERVER_LOCK_SECONDS.
+BATCH_PROGRESS_OBSERVER_LOCK_SECONDS = int(
+    os.getenv("BATCH_PROGRESS_OBSERVER_LOCK_SECONDS", "15"))
+PROGRESS_OBSERVER_LOCK_KEY = "batch:progress:observer_lock"
+
+# Take or refresh (ttl > 0) or release (ttl 0) a lock held by ARGV[1]
+# KEYS: lock
+# ARGV: holder, ttl
+# Returns 1 if the caller holds the lock afterwards (or released it)
+_HOLD_LOCK_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if tonumber(ARGV[2]) == 0 then
+    if holder == ARGV[1] then
+        redis.call('DEL', KEYS[1])
+    end
+    return 1
+end
+if holder == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if not holder then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class ProgressObserver:
+    """Elected fanout listener that reacts to every batch progress message"""
+
+    def __init__(self, lock_seconds: int = BATCH_PROGRESS_OBSERVER_LOCK_SECONDS):
+        self.lock_seconds = lock_seconds
+        self._holder = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._leader = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, fanout: ProgressFanout) -> None:
+        """Listen on the fanout and start competing for leadership"""
+        fanout.add_listener(self.observe)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, fanout: ProgressFanout) -> None:
+        """Stop observing and hand leadership over at once"""
+        fanout.remove_listener(self.observe)
+        self._leader = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await get_async_redis().eval(
+                _HOLD_LOCK_SCRIPT, 1, PROGRESS_OBSERVER_LOCK_KEY, self._holder, 0)
+        except Exception as e:
+            logger.warning(f"Failed to release progress observer lock: {e}")
+
+    async def _run(self) -> None:
+        """Hold or retry for the lock; observe only while holding it"""
+        try:
+            while True:
+                try:
+                    leader = bool(await get_async_redis().eval(
+                        _HOLD_LOCK_SCRIPT, 1, PROGRESS_OBSERVER_LOCK_KEY,
+                        self._holder, self.lock_seconds))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Progress observer lock check failed: {e}")
+                    leader = False
+
+                if leader and not self._leader:
+                    logger.info("Progress observer elected in this process")
+                self._leader = leader
+
+                await asyncio.sleep(self.lock_seconds / 3)
+        finally:
+            self._leader = False
+
+    async def observe(
+        self,
+        batch_id: str,
+        event: BatchProgressEvent,
+        appended: bool
+    ) -> None:
+        """Bump versions for bare events and record stage metrics for all"""
+        if not self._leader:
+            return
+
+        async_redis = get_async_redis()
+        try:
+            # Stream-appended events already bumped the version atomically
+            if not appended:
+                await bump_batch_version(async_redis, batch_id)
+            await self._track_stage(async_redis, batch_id, event)
+        except Exception as e:
+            logger.warning(f"Failed to observe progress of batch {batch_id}: {e}")
+
+    async def _track_stage(
+        self,
+        async_redis: aioredis.Redis,
+        batch_id: str,
+        event: BatchProgressEvent
+    ) -> None:
+        """Observe the duration of a stage that just ended"""
+        now = time.time()
+        changed, ended_stage, since = await async_redis.eval(
+            _TRACK_STAGE_SCRIPT, 1, _stage_key(batch_id),
+            event.stage.value, _STAGE_RANKS[event.stage], now,
+            BATCH_PROGRESS_TTL_SECONDS,
+            min(_STAGE_RANKS[stage] for stage in TERMINAL_STAGES))
+        if not int(changed):
+            return
+
+        # An empty start time means the stage was already ended explicitly
+        if ended_stage and since:
+            STAGE_DURATION.labels(ended_stage).observe(now - float(since))
+        if event.stage not in TERMINAL_STAGES:
+            return
+
+        if event.stage == ProcessingStage.COMPLETED and event.elapsed_seconds > 0 \
+                and event.sheets_processed:
+            SHEET_THROUGHPUT.observe(event.sheets_processed / event.elapsed_seconds)
+        await self._count_finished_sheets(async_redis, batch_id)
+
+    async def _count_finished_sheets(self, async_redis: aioredis.Redis, batch_id: str) -> None:
+        """Add a finished batch's completed/failed sheets to SHEETS_FINISHED"""
+        db = await get_async_db()
+        batch = await db.execute_query(
+            "SELECT id FROM omr_batches WHERE batch_uuid = %s", (batch_id,), fetch_one=True)
+        if not batch:
+            # Upload ids and deleted batches have no sheets to count
+            return
+
+        counts = await BatchSheetCounters(async_redis, db).get(batch_id, batch['id'])
+        for status, count_field in COUNTED_STATUSES.items():
+            SHEETS_FINISHED.labels(status).inc(counts[count_field])
+
+
+progress_observer = ProgressObserver()
+
+
+async def start_progress_observer() -> None:
+    """Startup hook: compete to observe progress messages"""
+    progress_observer.start(progress_fanout)
+
+
+async def stop_progress_observer() -> None:
+    """Shutdown hook: stop observing and release leadership"""
+    await progress_observer.stop(progress_fanout)
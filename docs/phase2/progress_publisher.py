@@ -0,0 +1,430 @@
+"""
+Batch progress publishing
+
+Progress events are recorded in a capped Redis Stream per batch and
+published on batch:{id}:progress in the same atomic step, as
+{"id": <entry id>, "event": {...}}. Stream entry IDs are monotonic and
+double as SSE event IDs, so a reconnecting client resumes exactly after its
+Last-Event-ID. The router (ProgressPublisher) and the workers
+(publish_progress_sync) share the same append, so every event carries an
+ID, bumps the batch version and updates batch:{id}:progress:current.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import redis.asyncio as aioredis
+
+from src.api.models.responses import BatchProgressEvent, ProcessingStage
+from src.api.services.batch_versions import (
+    BATCH_VERSION_TTL_SECONDS,
+    BATCHES_VERSION_KEY,
+    batch_version_key,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_PROGRESS_STREAM_MAXLEN = int(
+    os.getenv("BATCH_PROGRESS_STREAM_MAXLEN", "1000"))
+BATCH_PROGRESS_TTL_SECONDS = 3600
+
+# Per-batch coalescing window for progress events (0 disables coalescing)
+BATCH_PROGRESS_COALESCE_MS = int(os.getenv("BATCH_PROGRESS_COALESCE_MS", "250"))
+
+TERMINAL_STAGES = {ProcessingStage.COMPLETED, ProcessingStage.FAILED}
+
+# SSE event names after which a batch stream closes: the batch finished,
+# failed, or was deleted (deletion progress is published as CLEANUP, so it
+# carries an explicit 'deleted' event name rather than one from its stage)
+TERMINAL_SSE_EVENTS = ("complete", "error", "deleted")
+
+# XADD the event, then publish it with its entry ID in one atomic step so
+# live subscribers and stream readers always agree on IDs and ordering.
+# An SSE event type, when given, overrides the one derived from the stage.
+# KEYS: stream, current event, batch version, global version
+# ARGV: maxlen, ttl, channel, event JSON, version ttl, SSE event type or ''
+_APPEND_PROGRESS_SCRIPT = """
+local id
+local envelope
+if ARGV[6] ~= '' then
+    id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*',
+        'event', ARGV[4], 'type', ARGV[6])
+    envelope = '{"id":"' .. id .. '","type":"' .. ARGV[6] .. '","event":' .. ARGV[4] .. '}'
+else
+    id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'event', ARGV[4])
+    envelope = '{"id":"' .. id .. '","event":' .. ARGV[4] .. '}'
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('SET', KEYS[2], ARGV[4], 'EX', ARGV[2])
+redis.call('INCR', KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[5])
+redis.call('INCR', KEYS[4])
+redis.call('PUBLISH', ARGV[3], envelope)
+return id
+"""
+
+
+def progress_stream_key(batch_id: str) -> str:
+    return f"batch:{batch_id}:progress:stream"
+
+
+def progress_channel(batch_id: str) -> str:
+    return f"batch:{batch_id}:progress"
+
+
+def _started_at_key(batch_id: str) -> str:
+    return f"batch:{batch_id}:started_at"
+
+
+def _legacy_log_key(batch_id: str) -> str:
+    return f"batch:{batch_id}:progress:log"
+
+
+def stream_id_key(stream_id: str) -> tuple:
+    """Sortable form of a Redis Stream entry ID ('<ms>-<seq>')"""
+    ms, _, seq = stream_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def sse_event_type(stage: ProcessingStage) -> str:
+    """Map a processing stage to its SSE event name"""
+    if stage == ProcessingStage.COMPLETED:
+        return "complete"
+    if stage == ProcessingStage.FAILED:
+        return "error"
+    return "progress"
+
+
+def _parse_stream_entry(entry_id: str, fields: dict) -> tuple:
+    """Decode a progress stream entry into (entry_id, event, SSE event name)"""
+    event = BatchProgressEvent.model_validate_json(fields["event"])
+    return entry_id, event, fields.get("type") or sse_event_type(event.stage)
+
+
+def _build_event(
+    batch_id: str,
+    started_at: str,
+    now: datetime,
+    fields: dict
+) -> BatchProgressEvent:
+    """Stamp an event with its batch, time and elapsed seconds"""
+    fields.setdefault(
+        "elapsed_seconds",
+        max(int((now - datetime.fromisoformat(started_at)).total_seconds()), 0))
+    return BatchProgressEvent(batch_id=batch_id, timestamp=now.isoformat(), **fields)
+
+
+def _append_keys(batch_id: str) -> list:
+    return [
+        progress_stream_key(batch_id),
+        f"batch:{batch_id}:progress:current",
+        batch_version_key(batch_id),
+        BATCHES_VERSION_KEY
+    ]
+
+
+def _append_args(
+    batch_id: str,
+    event: BatchProgressEvent,
+    event_type: Optional[str]
+) -> list:
+    return [
+        BATCH_PROGRESS_STREAM_MAXLEN,
+        BATCH_PROGRESS_TTL_SECONDS,
+        progress_channel(batch_id),
+        event.model_dump_json(),
+        BATCH_VERSION_TTL_SECONDS,
+        event_type or ""
+    ]
+
+
+class ProgressCoalescer:
+    """
+    Per-batch rate limiter for progress events
+
+    Within each window only the latest event of the current stage is
+    emitted, at the end of the window. Stage transitions and
+    COMPLETED/FAILED events are emitted immediately, after flushing the
+    pending event of the previous stage so ordering is preserved.
+    Batches whose window has passed with nothing pending are evicted, so
+    ids that never reach a terminal stage (e.g. upload ids) do not pile up.
+    """
+
+    def __init__(
+        self,
+        emit: Callable[[str, Any], Awaitable[Any]],
+        window_ms: int = BATCH_PROGRESS_COALESCE_MS
+    ):
+        self.window_seconds = window_ms / 1000
+        self.coalesced_events = 0
+        self._emit = emit
+        self._batches: Dict[str, dict] = {}
+        self._swept_at = 0.0
+
+    async def offer(
+        self,
+        batch_id: str,
+        stage: ProcessingStage,
+        item: Any,
+        terminal: bool = False
+    ) -> Any:
+        """
+        Emit an event now or hold it until the batch's window closes
+
+        Args:
+            terminal: Treat the event as final even though its stage is not
+                COMPLETED/FAILED (e.g. the end of a batch deletion)
+
+        Returns:
+            Result of emit if the event went out immediately, else None
+        """
+        terminal = terminal or stage in TERMINAL_STAGES
+        now = time.monotonic()
+        self._evict_idle(now)
+        state = self._batches.setdefault(
+            batch_id, {"stage": None, "sent_at": 0.0, "pending": None, "timer": None})
+
+        immediate = (
+            stage != state["stage"]
+            or terminal
+            or now - state["sent_at"] >= self.window_seconds
+        )
+
+        if not immediate:
+            if state["pending"] is not None:
+                self.coalesced_events += 1
+            state["pending"] = item
+            if state["timer"] is None:
+                delay = self.window_seconds - (now - state["sent_at"])
+                state["timer"] = asyncio.create_task(
+                    self._flush_later(batch_id, delay))
+            return None
+
+        pending = state["pending"]
+        if state["timer"] is not None:
+            state["timer"].cancel()
+        state.update(pending=None, timer=None)
+
+        if pending is not None:
+            if stage == state["stage"] and not terminal:
+                # Superseded by this event within the same stage
+                self.coalesced_events += 1
+            else:
+                await self._emit(batch_id, pending)
+
+        state.update(stage=stage, sent_at=time.monotonic())
+        result = await self._emit(batch_id, item)
+
+        if terminal:
+            self._batches.pop(batch_id, None)
+
+        return result
+
+    def _evict_idle(self, now: float) -> None:
+        """Drop batches idle for a full window, at most once per window"""
+        if now - self._swept_at < self.window_seconds:
+            return
+        self._swept_at = now
+
+        idle = [
+            batch_id for batch_id, state in self._batches.items()
+            if state["pending"] is None
+            and state["timer"] is None
+            and now - state["sent_at"] >= self.window_seconds
+        ]
+        for batch_id in idle:
+            del self._batches[batch_id]
+
+    async def _flush_later(self, batch_id: str, delay: float) -> None:
+        """Emit the pending event once the window has elapsed"""
+        await asyncio.sleep(delay)
+
+        state = self._batches.get(batch_id)
+        if state is None or state["pending"] is None:
+            return
+
+        pending = state["pending"]
+        state.update(pending=None, timer=None, sent_at=time.monotonic())
+        try:
+            await self._emit(batch_id, pending)
+        except Exception as e:
+            logger.warning(
+                f"Failed to flush coalesced progress for {batch_id}: {e}")
+
+
+async def _emit_coalesced_progress(batch_id: str, item: tuple) -> str:
+    """Publish a held event through the publisher that offered it"""
+    publisher, fields = item
+    return await publisher._append_event(batch_id, **fields)
+
+
+_publish_coalescer = ProgressCoalescer(_emit_coalesced_progress)
+
+
+class ProgressPublisher:
+    """Publish batch progress events and read them back (async callers)"""
+
+    def __init__(self, redis_client: aioredis.Redis):
+        self.redis = redis_client
+        self._append = redis_client.register_script(_APPEND_PROGRESS_SCRIPT)
+
+    async def publish_progress(
+        self,
+        batch_id: str,
+        stage: ProcessingStage,
+        message: str,
+        progress_percentage: float = 0.0,
+        event_type: Optional[str] = None,
+        **fields
+    ) -> Optional[str]:
+        """
+        Append a progress event to the batch stream and publish it
+
+        Events are coalesced per batch: within BATCH_PROGRESS_COALESCE_MS only
+        the latest event of a stage is published. Stage transitions and
+        COMPLETED/FAILED events are published immediately.
+
+        Args:
+            event_type: SSE event name overriding the one derived from the
+                stage; terminal names (see TERMINAL_SSE_EVENTS) are published
+                immediately and end client streams
+            **fields: sheets_total, sheets_processed, error_details, ...
+
+        Returns:
+            Stream entry ID if published now, None if held for coalescing
+        """
+        fields.update(
+            stage=stage,
+            message=message,
+            progress_percentage=progress_percentage,
+            event_type=event_type
+        )
+        return await _publish_coalescer.offer(
+            batch_id, stage, (self, fields),
+            terminal=event_type in TERMINAL_SSE_EVENTS)
+
+    async def _append_event(
+        self,
+        batch_id: str,
+        event_type: Optional[str] = None,
+        **fields
+    ) -> str:
+        """Build the event and append it to the stream (no coalescing)"""
+        now = datetime.now()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(_started_at_key(batch_id), now.isoformat(), nx=True,
+                     ex=BATCH_PROGRESS_TTL_SECONDS)
+            pipe.get(_started_at_key(batch_id))
+            _, started_at = await pipe.execute()
+
+        event = _build_event(batch_id, started_at, now, fields)
+        return await self._append(
+            keys=_append_keys(batch_id),
+            args=_append_args(batch_id, event, event_type))
+
+    async def read_progress_stream(
+        self,
+        batch_id: str,
+        after_id: Optional[str] = None
+    ) -> List[tuple]:
+        """
+        Read recorded events for a batch
+
+        Args:
+            batch_id: Batch (or upload) identifier
+            after_id: Return only entries after this ID; all entries if None
+
+        Returns:
+            List of (entry_id, BatchProgressEvent, SSE event name) in
+            stream order
+        """
+        start = f"({after_id}" if after_id else "-"
+        entries = await self.redis.xrange(
+            progress_stream_key(batch_id), min=start, max="+")
+
+        return [_parse_stream_entry(entry_id, fields) for entry_id, fields in entries]
+
+    async def read_latest_progress(self, batch_ids: List[str]) -> Dict[str, tuple]:
+        """
+        Read the most recent recorded event of several batches in one round-trip
+
+        Returns:
+            Mapping of batch_id to (entry_id, BatchProgressEvent, SSE event
+            name); batches with no recorded events are omitted
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for batch_id in batch_ids:
+                pipe.xrevrange(progress_stream_key(batch_id), count=1)
+            results = await pipe.execute()
+
+        latest = {}
+        for batch_id, entries in zip(batch_ids, results):
+            if entries:
+                latest[batch_id] = _parse_stream_entry(*entries[0])
+        return latest
+
+    async def get_progress_log(
+        self,
+        batch_id: str,
+        limit: int = 100
+    ) -> List[BatchProgressEvent]:
+        """
+        Get the most recent events of a batch, oldest first
+
+        Falls back to the list written by earlier publishers
+        (batch:{id}:progress:log) for batches that have no stream yet.
+        """
+        entries = await self.redis.xrevrange(
+            progress_stream_key(batch_id), count=limit)
+        if entries:
+            return [_parse_stream_entry(*entry)[1] for entry in reversed(entries)]
+
+        legacy_log = await self.redis.lrange(_legacy_log_key(batch_id), -limit, -1)
+        return [BatchProgressEvent.model_validate_json(item) for item in legacy_log]
+
+
+def publish_progress_sync(
+    redis_client,
+    batch_id: str,
+    stage: ProcessingStage,
+    message: str,
+    progress_percentage: float = 0.0,
+    sheets_total: int = 0,
+    sheets_processed: int = 0,
+    error_details: Optional[str] = None,
+    event_type: Optional[str] = None
+) -> str:
+    """
+    Append a progress event to the batch stream and publish it (sync workers)
+
+    Same stream, IDs and version bump as ProgressPublisher.publish_progress,
+    without coalescing; SSE subscribers coalesce on delivery.
+
+    Returns:
+        Stream entry ID
+    """
+    now = datetime.now()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.set(_started_at_key(batch_id), now.isoformat(), nx=True,
+             ex=BATCH_PROGRESS_TTL_SECONDS)
+    pipe.get(_started_at_key(batch_id))
+    _, started_at = pipe.execute()
+    if isinstance(started_at, bytes):
+        started_at = started_at.decode()
+
+    event = _build_event(batch_id, started_at, now, {
+        "stage": stage,
+        "message": message,
+        "progress_percentage": progress_percentage,
+        "sheets_total": sheets_total,
+        "sheets_processed": sheets_processed,
+        "error_details": error_details
+    })
+    entry_id = redis_client.eval(
+        _APPEND_PROGRESS_SCRIPT, 4, *_append_keys(batch_id),
+        *_append_args(batch_id, event, event_type))
+    return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
@@ -0,0 +1,327 @@
+"""
+Per-batch sheet counters
+
+Processed/failed sheet counts kept in Redis as sheets change status, so the
+progress endpoints read O(1) instead of COUNT-ing omr_sheets per poll.
+Counters are seeded at 0 when a batch's sheets are submitted
+(sheet_scheduler.submit_sheet_tasks_sync) and every sheet task reports its
+final status through sheet_scheduler.sheet_task_done_sync. A reconciliation
+loop, started with the batches router, recomputes recent batches to correct
+any drift, and a read that finds no seeded counters COUNTs once and seeds
+them.
+
+Every status change also bumps a generation field. Seeding from a COUNT only
+succeeds if the generation is unchanged since it was read before counting,
+so a seed never overwrites increments that landed while the COUNT ran; a
+refused seed is simply retried by the next read or reconciliation pass.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, Optional
+
+import redis.asyncio as aioredis
+
+from src.api.services.async_pools import AsyncDatabase, get_async_db, get_async_redis
+from src.api.services.batch_versions import (
+    BATCH_VERSION_TTL_SECONDS,
+    BATCHES_VERSION_KEY,
+    batch_version_key,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SHEET_COUNTERS_ENABLED = os.getenv(
+    "BATCH_SHEET_COUNTERS_ENABLED", "true").lower() == "true"
+BATCH_COUNTER_RECONCILE_SECONDS = int(
+    os.getenv("BATCH_COUNTER_RECONCILE_SECONDS", "60"))
+BATCH_COUNTER_TTL_SECONDS = 7 * 24 * 3600
+
+COUNTED_STATUSES = {"completed": "processed_count", "failed": "failed_count"}
+_COUNTERS_SEEDED_FIELD = "seeded"
+_COUNTERS_GENERATION_FIELD = "gen"
+
+# Set a batch's counters to full counts and mark the hash as seeded, unless a
+# status change arrived since the counts were taken (generation moved on).
+# Changed counts bump the batch and global versions so polls see them.
+# KEYS: counters hash, batch version, global version
+# ARGV: processed_count, failed_count, ttl, version ttl, expected generation
+# Returns 1 if stored and changed, 0 if stored unchanged, -1 if refused
+_SEED_COUNTERS_SCRIPT = """
+local current = redis.call('HMGET', KEYS[1], 'processed_count', 'failed_count', 'seeded', 'gen')
+if (current[4] or '0') ~= ARGV[5] then
+    return -1
+end
+redis.call('HSET', KEYS[1], 'processed_count', ARGV[1], 'failed_count', ARGV[2], 'seeded', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+if current[3] and current[1] == ARGV[1] and current[2] == ARGV[2] then
+    return 0
+end
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('INCR', KEYS[3])
+return 1
+"""
+
+# Apply one status change. The generation always moves, so a concurrent
+# seed is refused; the counts only move once seeded, since incrementing a
+# missing hash would create partial counts that look authoritative.
+# KEYS: counters hash, batch version, global version
+# ARGV: old field (or ''), new field (or ''), ttl, version ttl
+_RECORD_SHEET_STATUS_SCRIPT = """
+redis.call('HINCRBY', KEYS[1], 'gen', 1)
+if redis.call('HEXISTS', KEYS[1], 'seeded') == 1 then
+    if ARGV[1] ~= '' then
+        redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+    end
+    if ARGV[2] ~= '' then
+        redis.call('HINCRBY', KEYS[1], ARGV[2], 1)
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('INCR', KEYS[3])
+return 1
+"""
+
+
+def sheet_counters_key(batch_uuid: str) -> str:
+    return f"batch:{batch_uuid}:sheet_counts"
+
+
+def _seed_args(batch_uuid: str, counts: dict, generation: str) -> tuple:
+    """Arguments of _SEED_COUNTERS_SCRIPT for one batch"""
+    return (
+        _SEED_COUNTERS_SCRIPT, 3, sheet_counters_key(batch_uuid),
+        batch_version_key(batch_uuid), BATCHES_VERSION_KEY,
+        counts["processed_count"], counts["failed_count"],
+        BATCH_COUNTER_TTL_SECONDS, BATCH_VERSION_TTL_SECONDS, generation
+    )
+
+
+def seed_sheet_counters_sync(redis_client, batch_uuid: str) -> None:
+    """
+    Start a newly submitted batch's counters at zero (sync callers)
+
+    No-op if the batch already has counters that have seen status changes
+    (e.g. a resubmitted batch), which stay authoritative.
+    """
+    redis_client.eval(*_seed_args(
+        batch_uuid, {"processed_count": 0, "failed_count": 0}, "0"))
+
+
+def record_sheet_status_sync(
+    redis_client,
+    batch_uuid: str,
+    old_status: Optional[str],
+    new_status: str
+) -> None:
+    """
+    Apply one sheet status change to the batch counters (sync workers)
+
+    Unseeded counters are left alone; the next read seeds them from
+    omr_sheets, which already includes this change.
+
+    Args:
+        redis_client: Sync Redis client
+        batch_uuid: Batch UUID the sheet belongs to
+        old_status: Previous processing_status (None for a new sheet)
+        new_status: New processing_status
+    """
+    old_field = COUNTED_STATUSES.get(old_status)
+    new_field = COUNTED_STATUSES.get(new_status)
+    if old_field == new_field:
+        return
+
+    redis_client.eval(
+        _RECORD_SHEET_STATUS_SCRIPT, 3, sheet_counters_key(batch_uuid),
+        batch_version_key(batch_uuid), BATCHES_VERSION_KEY,
+        old_field or "", new_field or "", BATCH_COUNTER_TTL_SECONDS,
+        BATCH_VERSION_TTL_SECONDS)
+
+
+class BatchSheetCounters:
+    """Read, seed and reconcile per-batch processed/failed sheet counters"""
+
+    def __init__(self, async_redis: aioredis.Redis, db: AsyncDatabase):
+        self._redis = async_redis
+        self._db = db
+
+    async def get(self, batch_uuid: str, batch_int_id: int) -> dict:
+        """
+        Get counters for one batch, seeding them from omr_sheets on a miss
+
+        Returns:
+            Dict with processed_count and failed_count
+        """
+        counts = await self.get_many({batch_uuid: batch_int_id})
+        return counts[batch_uuid]
+
+    async def get_many(self, batch_ids: Dict[str, int]) -> Dict[str, dict]:
+        """
+        Get counters for several batches in one Redis round-trip
+
+        Batches without seeded counters are counted with a single grouped
+        COUNT, so a page of batches costs a constant number of queries. With
+        BATCH_SHEET_COUNTERS_ENABLED off, every batch is counted.
+
+        Args:
+            batch_ids: Mapping of batch UUID to integer batch id
+
+        Returns:
+            Mapping of batch UUID to dict with processed_count and failed_count
+        """
+        if not batch_ids:
+            return {}
+
+        if not BATCH_SHEET_COUNTERS_ENABLED:
+            return await self._count(
+                {batch_int_id: batch_uuid for batch_uuid, batch_int_id in batch_ids.items()})
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for batch_uuid in batch_ids:
+                pipe.hgetall(sheet_counters_key(batch_uuid))
+            results = await pipe.execute()
+
+        counts_by_batch = {}
+        missing = {}
+        generations = {}
+        for (batch_uuid, batch_int_id), counts in zip(batch_ids.items(), results):
+            if counts and _COUNTERS_SEEDED_FIELD in counts:
+                counts_by_batch[batch_uuid] = {
+                    field: int(counts.get(field, 0))
+                    for field in COUNTED_STATUSES.values()
+                }
+            else:
+                missing[batch_int_id] = batch_uuid
+                generations[batch_uuid] = (counts or {}).get(
+                    _COUNTERS_GENERATION_FIELD, "0")
+
+        if missing:
+            seeded = await self._count(missing)
+            await self._store(seeded, generations)
+            counts_by_batch.update(seeded)
+
+        return counts_by_batch
+
+    async def reconcile(self, window_seconds: int) -> int:
+        """
+        Recompute counters of active and recently finished batches
+
+        Returns:
+            Number of batches reconciled
+        """
+        query = """
+            SELECT id, batch_uuid
+            FROM omr_batches
+            WHERE processing_status NOT IN ('completed', 'failed', 'deleting')
+               OR processing_completed_at >= NOW() - INTERVAL %s SECOND
+        """
+        rows = await self._db.execute_query(
+            query, (window_seconds,), fetch_all=True) or []
+        if not rows:
+            return 0
+
+        # Generations are read before counting so changes made meanwhile
+        # make the store refuse rather than be overwritten
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for row in rows:
+                pipe.hget(sheet_counters_key(row['batch_uuid']),
+                          _COUNTERS_GENERATION_FIELD)
+            generations = {
+                row['batch_uuid']: generation or "0"
+                for row, generation in zip(rows, await pipe.execute())
+            }
+
+        counts = await self._count({row['id']: row['batch_uuid'] for row in rows})
+        await self._store(counts, generations)
+        return len(rows)
+
+    async def delete(self, batch_uuid: str) -> None:
+        """Drop counters of a deleted batch"""
+        await self._redis.delete(sheet_counters_key(batch_uuid))
+
+    async def _count(self, batch_uuids_by_id: Dict[int, str]) -> Dict[str, dict]:
+        """Count processed/failed sheets of several batches in one query"""
+        placeholders = ", ".join(["%s"] * len(batch_uuids_by_id))
+        query = f"""
+            SELECT
+                batch_id,
+                COUNT(CASE WHEN processing_status = 'completed' THEN 1 END) as processed_count,
+                COUNT(CASE WHEN processing_status = 'failed' THEN 1 END) as failed_count
+            FROM omr_sheets
+            WHERE batch_id IN ({placeholders})
+            GROUP BY batch_id
+        """
+        rows = await self._db.execute_query(
+            query, tuple(batch_uuids_by_id), fetch_all=True) or []
+        rows_by_id = {row['batch_id']: row for row in rows}
+
+        return {
+            batch_uuid: {
+                field: int(rows_by_id.get(batch_int_id, {}).get(field) or 0)
+                for field in COUNTED_STATUSES.values()
+            }
+            for batch_int_id, batch_uuid in batch_uuids_by_id.items()
+        }
+
+    async def _store(
+        self,
+        counts_by_batch: Dict[str, dict],
+        generations: Dict[str, str]
+    ) -> None:
+        if not counts_by_batch:
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for batch_uuid, counts in counts_by_batch.items():
+                pipe.eval(*_seed_args(
+                    batch_uuid, counts, generations.get(batch_uuid, "0")))
+            await pipe.execute()
+
+
+# Periodic reconciliation, run by one API worker per interval
+_counter_reconcile_task: Optional[asyncio.Task] = None
+
+
+async def _reconcile_counters_loop() -> None:
+    """Periodically correct counter drift; one worker per interval does it"""
+    lock_key = "batch:sheet_counts:reconcile_lock"
+
+    while True:
+        await asyncio.sleep(BATCH_COUNTER_RECONCILE_SECONDS)
+        try:
+            async_redis = get_async_redis()
+            acquired = await async_redis.set(
+                lock_key, os.getpid(), nx=True, ex=BATCH_COUNTER_RECONCILE_SECONDS)
+            if not acquired:
+                continue
+
+            counters = BatchSheetCounters(async_redis, await get_async_db())
+            # Window covers batches that finished since the previous pass
+            reconciled = await counters.reconcile(
+                BATCH_COUNTER_RECONCILE_SECONDS * 2)
+            logger.debug(f"Reconciled sheet counters for {reconciled} batches")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Sheet counter reconciliation failed: {e}")
+
+
+async def start_counter_reconciliation() -> None:
+    """Startup hook: launch the reconciliation loop if counters are enabled"""
+    global _counter_reconcile_task
+    if not BATCH_SHEET_COUNTERS_ENABLED:
+        return
+    _counter_reconcile_task = asyncio.create_task(_reconcile_counters_loop())
+
+
+async def stop_counter_reconciliation() -> None:
+    """Shutdown hook: stop the reconciliation loop"""
+    if _counter_reconcile_task is not None:
+        _counter_reconcile_task.cancel()
+        try:
+            await _counter_reconcile_task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,132 @@
+"""
+Bulk sheet registration and dispatch
+
+Helpers for submit_unified and the sheet workers. submit_unified used to
+INSERT one omr_sheets row per sheet; it now goes through
+sheet_scheduler.submit_batch_sheets_sync, which inserts the rows in bulk,
+publishes the tasks through the fair scheduler and records how long each
+submission phase took, for GET /api/batches/{batch_id}/progress.
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+from celery import group
+
+from src.services.base_database_service import BaseDatabaseService
+
+logger = logging.getLogger(__name__)
+
+BATCH_SHEET_INSERT_ROWS = int(os.getenv("BATCH_SHEET_INSERT_ROWS", "1000"))
+PHASE_TIMINGS_TTL_SECONDS = 7 * 24 * 3600
+
+
+def phase_timings_key(batch_uuid: str) -> str:
+    return f"batch:{batch_uuid}:phase_timings"
+
+
+def bulk_insert_sheet_records_sync(
+    db: BaseDatabaseService,
+    rows: List[Dict[str, Any]],
+    chunk_rows: int = BATCH_SHEET_INSERT_ROWS
+) -> int:
+    """
+    Insert omr_sheets rows with multi-row INSERT statements
+
+    Args:
+        db: Sync database service
+        rows: Column -> value dicts, all with the same columns
+        chunk_rows: Rows per INSERT statement
+
+    Returns:
+        Number of rows inserted
+    """
+    if not rows:
+        return 0
+
+    columns = list(rows[0])
+    row_placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        query = (
+            f"INSERT INTO omr_sheets ({', '.join(columns)}) VALUES "
+            + ", ".join([row_placeholders] * len(chunk))
+        )
+        params = tuple(row[column] for row in chunk for column in columns)
+        db.execute_query(query, params)
+
+    return len(rows)
+
+
+def dispatch_sheet_tasks(
+    task,
+    sheet_calls: List[tuple],
+    **options
+) -> int:
+    """
+    Publish one message per admitted sheet, all in a single group
+
+    Every message is one scheduler slot, so the per-user cap and the
+    interactive class hold per sheet; a message carrying several sheets
+    would run them serially while each counted as running. Sheet tasks
+    reach this through the fair scheduler (see
+    sheet_scheduler.submit_sheet_tasks_sync), not from submit_unified.
+
+    Args:
+        task: Celery task processing a single sheet
+        sheet_calls: (positional args, lease_id) of each sheet; the lease
+            is passed as the lease_id keyword and must be handed back to
+            sheet_scheduler.sheet_task_done_sync
+        **options: Passed to apply_async (queue, priority, ...)
+
+    Returns:
+        Number of messages published
+    """
+    if not sheet_calls:
+        return 0
+
+    group(
+        task.s(*args, lease_id=lease_id) for args, lease_id in sheet_calls
+    ).apply_async(**options)
+    return len(sheet_calls)
+
+
+def record_phase_timing_sync(
+    redis_client,
+    batch_uuid: str,
+    phase: str,
+    seconds: float
+) -> None:
+    """
+    Record how long a submission phase took (sync callers)
+
+    Args:
+        redis_client: Sync Redis client
+        batch_uuid: Batch UUID
+        phase: Phase name, e.g. 'creating_sheet_records', 'dispatching_tasks'
+        seconds: Duration of the phase
+    """
+    key = phase_timings_key(batch_uuid)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(key, phase, round(seconds, 3))
+    pipe.expire(key, PHASE_TIMINGS_TTL_SECONDS)
+    pipe.execute()
+
+
+@contextmanager
+def phase_timer(redis_client, batch_uuid: str, phase: str):
+    """Time the enclosed block and record it as a batch phase"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        logger.info(f"Batch {batch_uuid}: {phase} took {elapsed:.2f}s")
+        try:
+            record_phase_timing_sync(redis_client, batch_uuid, phase, elapsed)
+        except Exception as e:
+            logger.warning(f"Failed to record {phase} timing for {batch_uuid}: {e}")
@@ -0,0 +1,524 @@
+"""
+Fair scheduling of sheet tasks
+
+Instead of one FIFO, pending sheets are queued per batch and handed out by
+weighted fair queueing: users compete on a virtual clock (1/weight per
+sheet served), and each user's batches compete the same way. The
+interactive class (small batches, reprocessing) is served before bulk,
+except that bulk is guaranteed BATCH_SCHED_BULK_SHARE of dispatches while
+it has work, so a steady stream of small batches cannot starve it. A user
+at their concurrency cap is skipped until one of their sheets finishes.
+
+Every dispatched sheet holds a lease: a running slot with a deadline. A
+task that is killed (OOM, worker restart) never reports back, so expired
+leases are reclaimed on every dispatch instead of capping the user forever.
+
+This is the only dispatch path for sheet tasks:
+
+- submit_unified calls submit_batch_sheets_sync instead of inserting the
+  sheet rows and publishing the tasks itself; the rows are bulk-inserted,
+  the sheets are queued and the eligible ones are published right away,
+  one message per sheet (see sheet_dispatch.dispatch_sheet_tasks).
+- Each sheet task receives a lease_id keyword and calls
+  sheet_task_done_sync with it when it finishes or fails, which frees its
+  slot, updates the batch's sheet counters and publishes whatever became
+  eligible.
+
+All keys share the {sched} hash tag, so the scripts' derived keys live in
+the same Redis Cluster slot as the keys they are passed.
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as aioredis
+
+from src.api.services.sheet_counters import (
+    record_sheet_status_sync,
+    seed_sheet_counters_sync,
+)
+from src.api.services.sheet_dispatch import (
+    bulk_insert_sheet_records_sync,
+    dispatch_sheet_tasks,
+    phase_timer,
+)
+from src.services.base_database_service import BaseDatabaseService
+
+logger = logging.getLogger(__name__)
+
+BATCH_SCHED_USER_CONCURRENCY = int(os.getenv("BATCH_SCHED_USER_CONCURRENCY", "32"))
+BATCH_SCHED_INTERACTIVE_MAX_SHEETS = int(
+    os.getenv("BATCH_SCHED_INTERACTIVE_MAX_SHEETS", "100"))
+BATCH_SCHED_WAIT_EWMA_ALPHA = float(os.getenv("BATCH_SCHED_WAIT_EWMA_ALPHA", "0.1"))
+BATCH_SCHED_RELEASE_MAX = int(os.getenv("BATCH_SCHED_RELEASE_MAX", "500"))
+# Minimum fraction of dispatches that go to bulk while it has work
+BATCH_SCHED_BULK_SHARE = float(os.getenv("BATCH_SCHED_BULK_SHARE", "0.2"))
+# Lifetime of a running slot; set it above the sheet task's hard time limit
+BATCH_SCHED_LEASE_SECONDS = int(os.getenv("BATCH_SCHED_LEASE_SECONDS", "1800"))
+BATCH_SCHED_RECLAIM_MAX = 100
+BATCH_SCHED_ENQUEUE_CHUNK = 1000
+
+SCHED_CLASSES = ("interactive", "bulk")
+
+
+def _sched_key(*parts: Any) -> str:
+    return ":".join(["{sched}", *map(str, parts)])
+
+
+_RUNNING_KEY = _sched_key("running")
+_STATS_KEY = _sched_key("stats")
+_USER_CAPS_KEY = _sched_key("user_caps")
+_USER_WEIGHTS_KEY = _sched_key("user_weights")
+_LEASES_KEY = _sched_key("leases")
+_LEASE_OWNERS_KEY = _sched_key("lease_owners")
+_LEASE_SEQ_KEY = _sched_key("lease_seq")
+
+# KEYS: batch queue, batch meta, class users zset, user's class batches zset,
+#       stats hash, class virtual clock
+# ARGV: batch, user, class, weight, now, payload...
+_SCHED_ENQUEUE_SCRIPT = """
+local batch, user, class = ARGV[1], ARGV[2], ARGV[3]
+local n = #ARGV - 5
+for i = 6, #ARGV do
+    redis.call('RPUSH', KEYS[1], ARGV[5] .. '|' .. ARGV[i])
+end
+redis.call('HSET', KEYS[2], 'user', user, 'class', class, 'weight', ARGV[4])
+redis.call('HINCRBY', KEYS[2], 'pending', n)
+redis.call('HINCRBY', KEYS[5], class .. ':depth', n)
+-- Newcomers start at the current virtual clock instead of banking credit
+if not redis.call('ZSCORE', KEYS[3], user) then
+    redis.call('ZADD', KEYS[3], redis.call('GET', KEYS[6]) or '0', user)
+end
+if not redis.call('ZSCORE', KEYS[4], batch) then
+    local first = redis.call('ZRANGE', KEYS[4], 0, 0, 'WITHSCORES')
+    redis.call('ZADD', KEYS[4], first[2] or '0', batch)
+end
+return n
+"""
+
+# Free one running slot of a user and a batch; shared by the done and next
+# scripts so a reported finish and a reclaimed lease release alike
+_RELEASE_SLOT_LUA = """
+local function release_slot(running_key, user, meta_key)
+    if tonumber(redis.call('HINCRBY', running_key, user, -1)) <= 0 then
+        redis.call('HDEL', running_key, user)
+    end
+    if redis.call('EXISTS', meta_key) == 0 then
+        return
+    end
+    local running = redis.call('HINCRBY', meta_key, 'running', -1)
+    if running <= 0 and tonumber(redis.call('HGET', meta_key, 'pending') or '0') <= 0 then
+        redis.call('DEL', meta_key)
+    end
+end
+"""
+
+# Which user and batch are served next is only known inside the script, so
+# per-class, per-user and per-batch keys are derived under the {sched} tag.
+# Expired leases are reclaimed first. Interactive is tried before bulk
+# unless bulk has earned a turn: every dispatch adds the bulk share to a
+# credit (capped at 1), serving bulk spends 1, and a full credit puts bulk
+# first.
+# KEYS: running hash, user caps hash, user weights hash, stats hash,
+#       leases zset, lease owners hash, lease sequence
+# ARGV: now, default user cap, ewma alpha, bulk share, lease seconds,
+#       reclaim limit
+# Returns {class, user, batch, payload, lease} or nil when nothing is eligible
+_SCHED_NEXT_SCRIPT = _RELEASE_SLOT_LUA + """
+local now, default_cap, alpha = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local share, lease_seconds = tonumber(ARGV[4]), tonumber(ARGV[5])
+
+local expired = redis.call('ZRANGEBYSCORE', KEYS[5], '-inf', now, 'LIMIT', 0, tonumber(ARGV[6]))
+for _, lease in ipairs(expired) do
+    local owner = redis.call('HGET', KEYS[6], lease)
+    if owner then
+        local sep = string.find(owner, '|', 1, true)
+        release_slot(KEYS[1], string.sub(owner, 1, sep - 1),
+            '{sched}:batch:' .. string.sub(owner, sep + 1) .. ':meta')
+    end
+    redis.call('ZREM', KEYS[5], lease)
+    redis.call('HDEL', KEYS[6], lease)
+end
+if #expired > 0 then
+    redis.call('HINCRBY', KEYS[4], 'reclaimed', #expired)
+end
+
+local credit = tonumber(redis.call('HGET', KEYS[4], 'bulk_credit') or '0')
+local order = {'interactive', 'bulk'}
+if credit >= 0.999999 then
+    order = {'bulk', 'interactive'}
+end
+
+for _, class in ipairs(order) do
+    local users_key = '{sched}:users:' .. class
+    local users = redis.call('ZRANGE', users_key, 0, -1, 'WITHSCORES')
+    for i = 1, #users, 2 do
+        local user = users[i]
+        local cap = tonumber(redis.call('HGET', KEYS[2], user) or default_cap)
+        local running = tonumber(redis.call('HGET', KEYS[1], user) or '0')
+        local batches_key = '{sched}:user:' .. user .. ':' .. class
+        local batch = redis.call('ZRANGE', batches_key, 0, 0)[1]
+        if not batch then
+            redis.call('ZREM', users_key, user)
+        elseif running < cap then
+            local queue_key = '{sched}:batch:' .. batch .. ':queue'
+            local meta_key = '{sched}:batch:' .. batch .. ':meta'
+            local item = redis.call('LPOP', queue_key)
+            local batch_weight = tonumber(redis.call('HGET', meta_key, 'weight') or '1')
+            local user_weight = tonumber(redis.call('HGET', KEYS[3], user) or '1')
+
+            if redis.call('LLEN', queue_key) == 0 then
+                redis.call('ZREM', batches_key, batch)
+            else
+                redis.call('ZINCRBY', batches_key, 1 / batch_weight, batch)
+            end
+            if redis.call('ZCARD', batches_key) == 0 then
+                redis.call('ZREM', users_key, user)
+            else
+                redis.call('ZINCRBY', users_key, 1 / user_weight, user)
+            end
+            redis.call('SET', '{sched}:vclock:' .. class, users[i + 1])
+
+            if item then
+                redis.call('HINCRBY', KEYS[1], user, 1)
+                redis.call('HINCRBY', meta_key, 'pending', -1)
+                redis.call('HINCRBY', meta_key, 'running', 1)
+                redis.call('HINCRBY', KEYS[4], class .. ':depth', -1)
+
+                local lease = tostring(redis.call('INCR', KEYS[7]))
+                redis.call('ZADD', KEYS[5], now + lease_seconds, lease)
+                redis.call('HSET', KEYS[6], lease, user .. '|' .. batch)
+
+                if class == 'bulk' then
+                    credit = math.max(credit - 1, 0)
+                end
+                credit = math.min(credit + share, 1)
+
+                local sep = string.find(item, '|', 1, true)
+                local wait = now - tonumber(string.sub(item, 1, sep - 1))
+                local ewma = tonumber(redis.call('HGET', KEYS[4], class .. ':wait_ewma') or wait)
+                redis.call('HSET', KEYS[4],
+                    class .. ':wait_ewma', tostring(ewma + alpha * (wait - ewma)),
+                    class .. ':last_wait', tostring(wait),
+                    'bulk_credit', tostring(credit))
+                return {class, user, batch, string.sub(item, sep + 1), lease}
+            end
+        end
+    end
+end
+return nil
+"""
+
+# A lease that was already reclaimed (or reported twice) frees nothing
+# KEYS: leases zset, lease owners hash, running hash
+# ARGV: lease
+_SCHED_DONE_SCRIPT = _RELEASE_SLOT_LUA + """
+local owner = redis.call('HGET', KEYS[2], ARGV[1])
+if not owner or redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+local sep = string.find(owner, '|', 1, true)
+release_slot(KEYS[3], string.sub(owner, 1, sep - 1),
+    '{sched}:batch:' .. string.sub(owner, sep + 1) .. ':meta')
+return 1
+"""
+
+# KEYS: batch queue, batch meta, stats hash
+# ARGV: batch
+_SCHED_CANCEL_SCRIPT = """
+local user = redis.call('HGET', KEYS[2], 'user')
+if not user then
+    return 0
+end
+local class = redis.call('HGET', KEYS[2], 'class')
+local n = redis.call('LLEN', KEYS[1])
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', '{sched}:user:' .. user .. ':' .. class, ARGV[1])
+redis.call('HINCRBY', KEYS[3], class .. ':depth', -n)
+redis.call('HSET', KEYS[2], 'pending', 0)
+if tonumber(redis.call('HGET', KEYS[2], 'running') or '0') <= 0 then
+    redis.call('DEL', KEYS[2])
+end
+return n
+"""
+
+
+def _batch_keys(batch_uuid: str) -> tuple:
+    """Scheduler keys of a batch: (queue, meta)"""
+    return _sched_key("batch", batch_uuid, "queue"), _sched_key("batch", batch_uuid, "meta")
+
+
+def classify_batch(sheet_count: int, is_reprocess: bool = False) -> str:
+    """Scheduling class of a batch: 'interactive' or 'bulk'"""
+    if is_reprocess or sheet_count <= BATCH_SCHED_INTERACTIVE_MAX_SHEETS:
+        return "interactive"
+    return "bulk"
+
+
+def enqueue_sheet_tasks_sync(
+    redis_client,
+    batch_uuid: str,
+    user_id: Any,
+    payloads: List[str],
+    sched_class: str,
+    weight: float = 1.0
+) -> int:
+    """
+    Queue a batch's sheet tasks with the fair scheduler
+
+    Args:
+        redis_client: Sync Redis client
+        batch_uuid: Batch UUID
+        user_id: Submitting user
+        payloads: Serialized per-sheet task arguments
+        sched_class: 'interactive' or 'bulk' (see classify_batch)
+        weight: Share of this batch among the user's batches
+
+    Returns:
+        Number of sheets queued
+    """
+    queue_key, meta_key = _batch_keys(batch_uuid)
+    keys = (queue_key, meta_key, _sched_key("users", sched_class),
+            _sched_key("user", user_id, sched_class), _STATS_KEY,
+            _sched_key("vclock", sched_class))
+
+    queued = 0
+    for start in range(0, len(payloads), BATCH_SCHED_ENQUEUE_CHUNK):
+        chunk = payloads[start:start + BATCH_SCHED_ENQUEUE_CHUNK]
+        queued += redis_client.eval(
+            _SCHED_ENQUEUE_SCRIPT, len(keys), *keys, batch_uuid, str(user_id),
+            sched_class, weight, time.time(), *chunk)
+    return queued
+
+
+def next_sheet_task_sync(redis_client) -> Optional[Dict[str, str]]:
+    """
+    Take the next sheet task to run
+
+    Returns:
+        Dict with class, user_id, batch_uuid, payload and lease_id, or None
+        if nothing is queued or every queued user is at their concurrency cap
+    """
+    picked = redis_client.eval(
+        _SCHED_NEXT_SCRIPT, 7, _RUNNING_KEY, _USER_CAPS_KEY, _USER_WEIGHTS_KEY,
+        _STATS_KEY, _LEASES_KEY, _LEASE_OWNERS_KEY, _LEASE_SEQ_KEY, time.time(),
+        BATCH_SCHED_USER_CONCURRENCY, BATCH_SCHED_WAIT_EWMA_ALPHA,
+        BATCH_SCHED_BULK_SHARE, BATCH_SCHED_LEASE_SECONDS, BATCH_SCHED_RECLAIM_MAX)
+    if not picked:
+        return None
+    picked = [v.decode() if isinstance(v, bytes) else v for v in picked]
+    return dict(zip(("class", "user_id", "batch_uuid", "payload", "lease_id"), picked))
+
+
+def release_sheet_tasks_sync(
+    redis_client,
+    task,
+    limit: int = BATCH_SCHED_RELEASE_MAX,
+    **options
+) -> int:
+    """
+    Publish queued sheet tasks, in fair order, until none is eligible
+
+    Args:
+        redis_client: Sync Redis client
+        task: Celery task processing a single sheet
+        limit: Most tasks to publish in this call
+        **options: Passed to apply_async (queue, priority, ...)
+
+    Returns:
+        Number of sheet tasks published
+    """
+    sheet_calls = []
+    while len(sheet_calls) < limit:
+        picked = next_sheet_task_sync(redis_client)
+        if picked is None:
+            break
+        sheet_calls.append(
+            (tuple(json.loads(picked["payload"])), picked["lease_id"]))
+
+    return dispatch_sheet_tasks(task, sheet_calls, **options)
+
+
+def submit_sheet_tasks_sync(
+    redis_client,
+    task,
+    batch_uuid: str,
+    user_id: Any,
+    sheet_args: List[tuple],
+    sched_class: str,
+    weight: float = 1.0,
+    **options
+) -> int:
+    """
+    Queue a batch's sheet tasks and publish those eligible now
+
+    Args:
+        redis_client: Sync Redis client
+        task: Celery task processing a single sheet
+        batch_uuid: Batch UUID
+        user_id: Submitting user
+        sheet_args: Positional arguments of each sheet's task call
+            (JSON-serializable)
+        sched_class: 'interactive' or 'bulk' (see classify_batch)
+        weight: Share of this batch among the user's batches
+        **options: Passed to apply_async (queue, priority, ...)
+
+    Returns:
+        Number of sheets queued
+    """
+    seed_sheet_counters_sync(redis_client, batch_uuid)
+    queued = enqueue_sheet_tasks_sync(
+        redis_client, batch_uuid, user_id,
+        [json.dumps(list(args)) for args in sheet_args], sched_class, weight)
+    released = release_sheet_tasks_sync(redis_client, task, **options)
+    logger.info(
+        f"Batch {batch_uuid}: queued {queued} sheets ({sched_class}), "
+        f"published {released}")
+    return queued
+
+
+def submit_batch_sheets_sync(
+    db: BaseDatabaseService,
+    redis_client,
+    task,
+    batch_uuid: str,
+    user_id: Any,
+    sheet_rows: List[Dict[str, Any]],
+    sheet_args: List[tuple],
+    is_reprocess: bool = False,
+    weight: float = 1.0,
+    **options
+) -> int:
+    """
+    Register a batch's sheets and hand them to the scheduler (submit_unified)
+
+    Inserts the omr_sheets rows in bulk, then queues one task per sheet and
+    publishes those eligible now. The two steps are recorded as the
+    'creating_sheet_records' and 'dispatching_tasks' phases reported by
+    GET /api/batches/{batch_id}/progress.
+
+    Args:
+        db: Sync database service
+        redis_client: Sync Redis client
+        task: Celery task processing a single sheet
+        batch_uuid: Batch UUID
+        user_id: Submitting user
+        sheet_rows: omr_sheets column -> value dicts, all with the same columns
+        sheet_args: Positional arguments of each sheet's task call
+            (JSON-serializable)
+        is_reprocess: Reprocessing runs in the interactive class
+        weight: Share of this batch among the user's batches
+        **options: Passed to apply_async (queue, priority, ...)
+
+    Returns:
+        Number of sheets queued
+    """
+    with phase_timer(redis_client, batch_uuid, "creating_sheet_records"):
+        bulk_insert_sheet_records_sync(db, sheet_rows)
+
+    sched_class = classify_batch(len(sheet_args), is_reprocess)
+    with phase_timer(redis_client, batch_uuid, "dispatching_tasks"):
+        return submit_sheet_tasks_sync(
+            redis_client, task, batch_uuid, user_id, sheet_args, sched_class,
+            weight, **options)
+
+
+def sheet_task_done_sync(
+    redis_client,
+    task,
+    lease_id: str,
+    batch_uuid: str,
+    new_status: str,
+    old_status: Optional[str] = None,
+    **options
+) -> int:
+    """
+    Free the slot of a finished (or failed) sheet task (sheet workers)
+
+    Call after the sheet's omr_sheets row has been updated. Records the
+    status change in the batch's sheet counters and publishes the tasks the
+    freed slot makes eligible, so the queue keeps draining without a
+    separate dispatcher process. A lease that already expired was reclaimed
+    by the scheduler and frees nothing here.
+
+    Args:
+        redis_client: Sync Redis client
+        task: Celery task processing a single sheet
+        lease_id: The lease_id keyword the sheet task was called with
+        batch_uuid: Batch UUID the sheet belongs to
+        new_status: processing_status the sheet ended in
+        old_status: processing_status before this run (e.g. 'failed' when
+            a failed sheet is reprocessed)
+        **options: Passed to apply_async (queue, priority, ...)
+
+    Returns:
+        Number of sheet tasks published
+    """
+    record_sheet_status_sync(redis_client, batch_uuid, old_status, new_status)
+    redis_client.eval(
+        _SCHED_DONE_SCRIPT, 3, _LEASES_KEY, _LEASE_OWNERS_KEY, _RUNNING_KEY, lease_id)
+    return release_sheet_tasks_sync(redis_client, task, **options)
+
+
+class SheetScheduler:
+    """Router-side view of the fair scheduler: cancel and inspect queues"""
+
+    def __init__(self, async_redis: aioredis.Redis):
+        self._redis = async_redis
+
+    async def cancel(self, batch_uuid: str) -> int:
+        """Drop a batch's pending sheets; returns how many were dropped"""
+        queue_key, meta_key = _batch_keys(batch_uuid)
+        return await self._redis.eval(
+            _SCHED_CANCEL_SCRIPT, 3, queue_key, meta_key, _STATS_KEY, batch_uuid)
+
+    async def set_user_limits(
+        self,
+        user_id: Any,
+        concurrency: Optional[int] = None,
+        weight: Optional[float] = None
+    ) -> None:
+        """Override the concurrency cap and/or fair-share weight of a user"""
+        async with self._redis.pipeline(transaction=False) as pipe:
+            if concurrency is not None:
+                pipe.hset(_USER_CAPS_KEY, str(user_id), concurrency)
+            if weight is not None:
+                pipe.hset(_USER_WEIGHTS_KEY, str(user_id), weight)
+            await pipe.execute()
+
+    async def queue_status(self, batch_uuid: str) -> Optional[dict]:
+        """
+        Queue depth and wait time per class, plus this batch's position
+
+        Returns:
+            Dict with the batch's class/pending/running and, per class,
+            depth (queued sheets) and wait times in seconds; None if the
+            batch has nothing queued or running in the scheduler
+        """
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(_batch_keys(batch_uuid)[1])
+            pipe.hgetall(_STATS_KEY)
+            meta, stats = await pipe.execute()
+
+        if not meta:
+            return None
+
+        return {
+            "class": meta.get("class"),
+            "pending": int(meta.get("pending", 0)),
+            "running": int(meta.get("running", 0)),
+            "classes": {
+                sched_class: {
+                    "depth": max(int(stats.get(f"{sched_class}:depth", 0)), 0),
+                    "avg_wait_seconds": round(
+                        float(stats.get(f"{sched_class}:wait_ewma", 0)), 2),
+                    "last_wait_seconds": round(
+                        float(stats.get(f"{sched_class}:last_wait", 0)), 2),
+                }
+                for sched_class in SCHED_CLASSES
+            }
+        }
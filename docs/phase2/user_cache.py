@@ -0,0 +1,236 @@
+"""
+Per-token cache of authenticated users
+
+get_cached_current_user is a route dependency that resolves a bearer token
+through get_current_user once, then serves a CachedUser snapshot (id,
+username, admin flag) from an in-process LRU, so chunk POSTs, progress polls
+and SSE connects skip the token decode and user lookup. Snapshots are plain
+dataclasses, never ORM objects, so they hold no session or lazy relations.
+
+Entries expire after AUTH_USER_CACHE_TTL_SECONDS, or at the token's own exp
+claim if that comes first. Logout, role changes and deactivation must call
+invalidate_cached_user(_sync); the message is broadcast on
+AUTH_CACHE_CHANNEL and listen_for_invalidations drops matching entries in
+every API worker at once.
+"""
+
+import asyncio
+import base64
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import redis.asyncio as aioredis
+from fastapi import Depends
+from fastapi.security import OAuth2PasswordBearer
+
+from src.api.dependencies import get_db
+from src.domains.auth.dependencies import get_current_user
+
+logger = logging.getLogger(__name__)
+
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "30"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "1024"))
+AUTH_CACHE_CHANNEL = "auth:user_cache:invalidate"
+
+_bearer_token = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """The parts of an authenticated user that routes read"""
+
+    user_id: int
+    username: str
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user: Any) -> "CachedUser":
+        return cls(
+            user_id=user.user_id,
+            username=user.username,
+            is_admin=bool(user.is_admin)
+        )
+
+
+def token_key(token: str) -> str:
+    """Digest a token is cached under; raw tokens are never kept"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_expires_in(token: str) -> Optional[float]:
+    """
+    Seconds until a JWT's exp claim, None if it has none
+
+    The claim is read without verification; only call this for tokens
+    get_current_user has already accepted.
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"]) - time.time()
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class UserCache:
+    """LRU of CachedUser keyed by token digest, each entry capped at its token's exp"""
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_size > 0
+
+    def get(self, token: str) -> Optional[CachedUser]:
+        key = token_key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, token: str, user: CachedUser) -> None:
+        if not self.enabled:
+            return
+        ttl = self.ttl_seconds
+        expires_in = token_expires_in(token)
+        if expires_in is not None:
+            if expires_in <= 0:
+                return
+            ttl = min(ttl, expires_in)
+        key = token_key(token)
+        self._entries[key] = (time.monotonic() + ttl, user)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate_token(self, key: str) -> None:
+        """Drop one token (by its token_key digest)"""
+        self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id: Any) -> int:
+        """Drop every token of a user; returns how many were dropped"""
+        stale = [key for key, (_, user) in self._entries.items()
+                 if str(user.user_id) == str(user_id)]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+user_cache = UserCache(AUTH_USER_CACHE_TTL_SECONDS, AUTH_USER_CACHE_SIZE)
+
+
+async def get_cached_current_user(
+    token: str = Depends(_bearer_token),
+    db=Depends(get_db)
+) -> CachedUser:
+    """
+    Dependency: the authenticated user behind the in-process user cache
+
+    Cache misses go through get_current_user itself, so authentication
+    errors are identical to routes that depend on it directly.
+    """
+    cached = user_cache.get(token)
+    if cached is not None:
+        return cached
+
+    user = get_current_user(token=token, db=db)
+    if inspect.isawaitable(user):
+        user = await user
+    cached = CachedUser.from_user(user)
+    user_cache.put(token, cached)
+    return cached
+
+
+def _invalidation_message(user_id: Any = None, token: Optional[str] = None) -> str:
+    return json.dumps({
+        "user_id": None if user_id is None else str(user_id),
+        "token_key": token_key(token) if token else None
+    })
+
+
+def invalidate_cached_user_sync(
+    redis_client,
+    user_id: Any = None,
+    token: Optional[str] = None
+) -> None:
+    """
+    Drop cached users in every API worker (sync callers)
+
+    Call on logout/token revocation (token) and whenever a user's role
+    changes or the user is deactivated (user_id). With neither argument the
+    whole cache is cleared.
+    """
+    redis_client.publish(AUTH_CACHE_CHANNEL, _invalidation_message(user_id, token))
+
+
+async def invalidate_cached_user(
+    async_redis: aioredis.Redis,
+    user_id: Any = None,
+    token: Optional[str] = None
+) -> None:
+    """Async counterpart of invalidate_cached_user_sync"""
+    await async_redis.publish(AUTH_CACHE_CHANNEL, _invalidation_message(user_id, token))
+
+
+def _apply_invalidation(data: str) -> None:
+    message = json.loads(data)
+    if message.get("token_key"):
+        user_cache.invalidate_token(message["token_key"])
+    if message.get("user_id") is not None:
+        user_cache.invalidate_user(message["user_id"])
+    if not message.get("token_key") and message.get("user_id") is None:
+        user_cache.clear()
+
+
+async def listen_for_invalidations(async_redis: aioredis.Redis) -> None:
+    """Apply invalidations published by any worker; reconnects on errors"""
+    while True:
+        pubsub = None
+        try:
+            pubsub = async_redis.pubsub()
+            await pubsub.subscribe(AUTH_CACHE_CHANNEL)
+            # Anything missed while disconnected may be stale
+            user_cache.clear()
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    _apply_invalidation(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Auth cache invalidation listener error: {e}")
+            await asyncio.sleep(1)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
@@ -72,11 +72,22 @@ export async function listBatches(params: ListBatchesParams = {}): Promise<ListB
   return response.data;
 }
 
+/**
+ * Batch deletion job (deletion runs in the background)
+ */
+export interface DeleteBatchJob {
+  job_id: string;
+  batch_id: string;
+  status: 'queued' | 'running' | 'completed' | 'failed' | 'superseded';
+}
+
 /**
  * Delete batch (admin only)
+ * Returns the background deletion job; progress is published on the batch stream
  */
-export async function deleteBatch(batchId: string): Promise<void> {
-  await apiClient.delete(`/batches/${batchId}`);
+export async function deleteBatch(batchId: string): Promise<DeleteBatchJob> {
+  const response = await apiClient.delete<DeleteBatchJob>(`/batches/${batchId}`);
+  return response.data;
 }
 
 /**
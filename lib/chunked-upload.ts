@@ -30,6 +30,7 @@ function getChunkSize(totalBytes: number): number {
 
 const CLOUDFLARE_LIMIT = 100 * 1024 * 1024; // 100MB Cloudflare limit
 const MAX_RETRIES = 3;
+const MAX_ADMISSION_WAITS = 20; // 429 (staging full) waits per chunk
 
 /**
  * Get auth token from Zustand store
@@ -134,6 +135,16 @@ const CONCURRENCY_LIMIT = process.env.NEXT_PUBLIC_CONCURRENCY_LIMIT
   ? parseInt(process.env.NEXT_PUBLIC_CONCURRENCY_LIMIT, 10)
   : 4;
 
+/**
+ * SHA-256 of a chunk as hex, or null where WebCrypto is unavailable
+ * (non-secure contexts). The server verifies it while writing the chunk.
+ */
+async function sha256Hex(blob: Blob): Promise<string | null> {
+  if (typeof crypto === 'undefined' || !crypto.subtle) return null;
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+}
+
 /**
  * Helper: Uploads a single chunk with internal retry logic
  */
@@ -141,6 +152,7 @@ async function uploadSingleChunkWithRetry(
   chunk: Blob,
   chunkIndex: number,
   totalChunks: number,
+  chunkSize: number,
   file: File,
   uploadType: UploadType,
   uploadId: string | null,
@@ -151,7 +163,9 @@ async function uploadSingleChunkWithRetry(
   signal?: AbortSignal
 ): Promise<{ upload_id: string; batch_id?: string }> {
   const isLastChunk = chunkIndex === totalChunks - 1;
+  const chunkSha256 = await sha256Hex(chunk);
   let retryCount = 0;
+  let admissionWaits = 0;
 
   while (retryCount < MAX_RETRIES) {
     if (signal?.aborted) throw new Error('Upload cancelled by user');
@@ -164,6 +178,10 @@ async function uploadSingleChunkWithRetry(
       formData.append('filename', file.name);
       formData.append('upload_type', uploadType);
       formData.append('is_final_chunk', isLastChunk.toString());
+      // Lets the server write each chunk at its offset (any arrival order)
+      formData.append('part_size', chunkSize.toString());
+      formData.append('total_size', file.size.toString());
+      if (chunkSha256) formData.append('chunk_sha256', chunkSha256);
 
       if (uploadId) formData.append('upload_id', uploadId);
       if (taskId) formData.append('task_id', taskId);
@@ -187,6 +205,15 @@ async function uploadSingleChunkWithRetry(
         signal, // Connect abort signal
       });
 
+      // Server staging is full: wait as instructed without using up a retry
+      if (response.status === 429 && admissionWaits < MAX_ADMISSION_WAITS) {
+        admissionWaits++;
+        const retryAfterSeconds = Number(response.headers.get('Retry-After')) || 30;
+        console.warn(`[Chunk ${chunkIndex + 1}] Upload staging busy, retrying in ${retryAfterSeconds}s`);
+        await new Promise((resolve) => setTimeout(resolve, retryAfterSeconds * 1000));
+        continue;
+      }
+
       if (!response.ok) {
         const error = await response.json().catch(() => ({ message: 'Upload failed' }));
         throw new Error(error.message || `Chunk ${chunkIndex + 1} failed`);
@@ -258,6 +285,7 @@ async function uploadInChunks(
     chunk0,
     0,
     totalChunks,
+    chunkSize,
     file,
     uploadType,
     null,
@@ -297,6 +325,7 @@ async function uploadInChunks(
         chunkBlob,
         index,
         totalChunks,
+        chunkSize,
         file,
         uploadType,
         uploadId,
@@ -37,6 +37,8 @@ export interface BatchStreamState {
   currentEvent: BatchProgressEvent | null;
   isConnected: boolean;
   isComplete: boolean;
+  /** The batch was deleted while being watched */
+  isDeleted: boolean;
   error: string | null;
 }
 
@@ -46,6 +48,7 @@ export function useBatchStream(batchId: string | null) {
     currentEvent: null,
     isConnected: false,
     isComplete: false,
+    isDeleted: false,
     error: null,
   });
 
@@ -133,8 +136,16 @@ export function useBatchStream(batchId: string | null) {
 
             addEvent(data);
 
-            // Check if batch is complete
-            if (event.event === 'complete' || data.stage === 'completed') {
+            // Deletion ends at stage 'cleanup', so only the event name marks it
+            if (event.event === 'deleted') {
+              setState((prev) => ({
+                ...prev,
+                isComplete: true,
+                isDeleted: true,
+                isConnected: false,
+              }));
+              abortController.abort();
+            } else if (event.event === 'complete' || data.stage === 'completed') {
               /* console.log('[SSE] Batch completed'); */
               setState((prev) => ({
                 ...prev,
@@ -193,9 +193,12 @@ export function useDeleteBatch() {
 
   return useMutation({
     mutationFn: (batchId: string) => batchesAPI.delete(batchId),
-    onSuccess: () => {
-      // Invalidate all batch lists
+    onSuccess: (_job, batchId) => {
+      // The batch is marked 'deleting' at once and lists no longer return it,
+      // even though the background job is still removing its sheets
       queryClient.invalidateQueries({ queryKey: batchQueryKeys.lists() });
+      queryClient.removeQueries({ queryKey: batchQueryKeys.status(batchId) });
+      queryClient.removeQueries({ queryKey: batchQueryKeys.progress(batchId) });
     },
   });
 }
@@ -13,7 +13,8 @@ export type BatchStatus =
   | 'processing' // Processing sheets
   | 'completed' // All sheets processed successfully
   | 'failed' // Processing failed
-  | 'reprocessing'; // Re-running failed sheets
+  | 'reprocessing' // Re-running failed sheets
+  | 'deleting'; // Being deleted in the background (hidden from lists)
 
 /**
  * Upload strategy types